@@ -2,40 +2,52 @@ import asyncio
 import aiohttp
 import requests
 from docx import Document
+from docx.oxml.ns import qn
 import os
 import json
 import re
 import time
 import pdfplumber
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdftypes import resolve1
 import argparse
 from pathlib import Path
 from dotenv import load_dotenv
 from tqdm import tqdm
 import logging
+import logging.handlers
+import queue
+import atexit
 import sys
-import filelock  # 导入文件锁模块
-
-# 配置日志
-logging.basicConfig(
-    level=logging.DEBUG,  # 将日志级别改为DEBUG，以记录更详细的信息
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("translation_debug.log",
-                            encoding='utf-8'),  # 添加encoding参数确保中文正确显示
-        logging.StreamHandler()
-    ]
-)
+import hashlib
+import sqlite3
+import base64
+import threading
+import math
+import random
+import email.utils
+import gzip
+import glob
+import bisect
+import contextlib
+import functools
+import inspect
+import multiprocessing
+import socket
+from collections import Counter, deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pdf_workers  # 进程池中执行的PDF提取函数
+
+# 日志：导入时不配置任何处理器（未调用setup_logging时只有警告以上的消息输出到stderr），
+# 命令行和Web入口调用setup_logging，按子系统设置级别并通过队列在后台线程写日志
 logger = logging.getLogger("translator")
+api_logger = logging.getLogger("translator.api")  # API请求与重试
+batch_logger = logging.getLogger("translator.batch")  # 批次处理与译文对齐
+trace_logger = logging.getLogger("translator.trace")  # 逐段落的原文/译文跟踪（按比例采样）
 
-# 添加一个专门用于段落对照的日志处理器
+# 段落对照日志（对照模式的旧版保存函数使用），由setup_logging写入单独的文件
 paragraph_logger = logging.getLogger("paragraph_comparison")
-paragraph_logger.setLevel(logging.DEBUG)
-paragraph_handler = logging.FileHandler(
-    "paragraph_comparison.log", encoding='utf-8')
-paragraph_handler.setFormatter(logging.Formatter(
-    '%(asctime)s - %(levelname)s - %(message)s'))
-paragraph_logger.addHandler(paragraph_handler)
-paragraph_logger.propagate = False  # 防止日志消息传递到根日志记录器
 
 # 尝试加载环境变量
 try:
@@ -55,10 +67,72 @@ DEFAULT_CONFIG = {
     "max_concurrent_requests": 3,
     "temperature": 0.3,
     "retries": 3,
-    "retry_delay": 2,
-    "paragraphs_per_page": 10
+    "retry_delay": 2,  # 重试退避的基础等待时间（秒）
+    "retry_max_delay": 60,  # 单次重试的最长等待时间（秒）
+    "stream_responses": True,  # 以SSE流式接收译文，逐段推送到进度
+    "alignment_retries": 2,  # 译文缺失或错位的段落最多重新请求的轮数
+    "alignment_ratio_tolerance": 2.0,  # 译文/原文长度比偏离批次中位数的最大倍数
+    "alignment_neighbor_tolerance": 1.1,  # 缺失段落的相邻段落长度比超过中位数的最大倍数（疑似被合并）
+    "alignment_min_chars": 20,  # 短于该长度的原文不做长度比检查
+    "connect_timeout": 10,  # 建立连接超时（秒）
+    "read_timeout": 120,  # 读取响应超时（秒）
+    "dns_cache_ttl": 300,  # DNS解析结果缓存时间（秒）
+    "cache_path": "./outputs/translation_memory.db",  # 翻译记忆数据库
+    "cache_max_entries": 200000,  # 翻译记忆最多保存的段落数
+    "cache_max_age_days": 90,  # 翻译记忆的最长保存天数
+    "document_cache_dir": "./outputs/documents",  # PDF页面文本和分段结果的缓存目录
+    "document_cache_chunk": 256,  # 从文档缓存读取分段结果时每次交给流水线的段落数
+    "checkpoint_interval": 30,  # 中间结果保存间隔（秒）
+    "extract_workers": min(4, os.cpu_count() or 1),  # PDF提取进程数
+    "parallel_min_pages": 40,  # 页数少于该值时使用单进程提取
+    "extract_chunk_pages": 8,  # 每个提取任务包含的页数
+    "extraction_mode": "text",  # PDF提取方式：text使用每页的全部文本，layout按版面位置去除页眉、页脚和页码
+    "header_band": 0.1,  # 页面顶部和底部多大比例的区域内检测页眉页脚
+    "header_window_pages": 12,  # 在前后共多少页的范围内统计重复出现的行
+    "header_min_repeats": 3,  # 同一行在统计范围内至少出现在多少页上时视为页眉页脚
+    "journal_fsync_interval": 1.0,  # 批次日志fsync间隔（秒）
+    "journal_fsync_batches": 20,  # 累计多少条记录后执行fsync
+    "progress_flush_interval": 1.0,  # 进度写盘间隔（秒）
+    "adaptive_concurrency": True,  # 根据API响应自动调整并发数
+    "min_concurrent_requests": 1,  # 自适应并发的下限
+    "max_concurrent_limit": 10,  # 自适应并发的上限
+    "latency_tolerance": 2.0,  # 延迟超过最低延迟的多少倍时停止提高并发
+    "concurrency_decrease_cooldown": 5.0,  # 两次降低并发之间的最小间隔（秒）
+    "global_max_concurrent_requests": 6,  # 所有任务共享的API并发总数（同一个API密钥）
+    "max_active_jobs": 2,  # 同时运行的翻译任务数，其余任务排队
+    "chunk_pages": 100,  # 分块翻译时每个页码范围子任务的页数
+    "chunk_workers": 2,  # 分块翻译时同时运行子任务的进程数
+    "job_store_lease": 60,  # 分片任务的租约时长（秒），工作进程每1/3租约时长续约一次
+    "job_store_poll_interval": 2.0,  # 工作进程没有可领取的分片时的轮询间隔（秒）
+    "job_store_max_attempts": 3,  # 分片最多被领取的次数，仍未完成时标记为失败
+    "job_store_token": os.getenv("JOB_STORE_TOKEN", ""),  # Web端/jobstore接口的共享密钥，为空时不开放该接口
+    "worker_dir": "./outputs/worker",  # 工作进程的本地目录（PDF副本、分片的输出、进度和批次日志）
+    "batching": "tokens",  # 组批方式：tokens按token预算装箱，count按固定段落数
+    "max_input_tokens": 1500,  # 每个请求的原文token预算
+    "max_output_tokens": 3000,  # 每个请求的预计译文token预算（低于模型输出上限）
+    "token_output_ratio": 1.3,  # 译文token数与原文token数的估计比例
+    "max_batch_paragraphs": 30,  # 按token组批时每批最多的段落数
+    "paragraphs_per_page": 10,
+    "paragraph_short_line_ratio": 0.8,  # 句子结束在行尾且该行短于上一行的该比例时视为段落结束
+    "preview_page_size": 3,  # 预览每次返回的页数
+    "preview_max_page_size": 20,  # 预览单次请求最多返回的页数
+    "preview_cache_pages": 256,  # 预览页面文本的LRU缓存页数（所有文件共享）
+    "dedup_segments": True,  # 同一任务中内容相同的段落只翻译一次，写入时回填到每个位置
+    "dedup_max_entries": 100000,  # 去重时最多记住的不同段落数
+    "metrics_enabled": True,  # Web界面为每个任务收集分阶段耗时和计数（进度数据和/metrics接口）
+    "log_level": "INFO",  # 日志级别（translator及未单独设置的子系统）
+    "log_file": "translation_debug.log",  # 日志文件，为空时只输出到控制台
+    "paragraph_log_file": "paragraph_comparison.log",  # 段落对照日志文件
+    "log_levels": {"translator.trace": "WARNING"},  # 各子系统的日志级别（api、batch、trace）
+    "trace_sample_rate": 0.01  # trace开启DEBUG时，逐段落跟踪日志的记录比例
 }
 
+# 提示词版本号：修改翻译提示词后需要递增，使旧的翻译记忆失效
+PROMPT_VERSION = 1
+
+# 文档缓存版本号：修改文本提取或分段逻辑后需要递增，使旧的文档缓存失效
+DOCUMENT_CACHE_VERSION = 2
+
 # 尝试导入自定义配置文件
 try:
     import config
@@ -71,6 +145,95 @@ except ImportError:
     logger.info("未找到自定义配置文件，使用默认配置")
 
 
+class SamplingFilter(logging.Filter):
+    """按比例保留日志记录（确定性地每1/rate条保留一条），用于逐段落的跟踪日志"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.rate >= 1:
+            return True
+        with self._lock:
+            self._credit += self.rate
+            if self._credit >= 1:
+                self._credit -= 1
+                return True
+        return False
+
+
+_log_listener = None
+
+
+def setup_logging(level=None, log_file=None, levels=None, trace_sample_rate=None, console=True):
+    """配置translator的日志（可重复调用，后一次调用替换前一次的配置）
+
+    日志记录由QueueHandler放入队列，由后台线程的QueueListener写入文件和控制台，
+    翻译事件循环不会因写盘而阻塞；进程退出时写完队列中剩余的记录。
+    level为translator的级别，levels为{子系统日志名: 级别}（如{"translator.api": "DEBUG"}），
+    trace_sample_rate为逐段落跟踪日志的记录比例。参数为None时使用默认配置。
+    只配置translator和paragraph_comparison两个日志记录器，不修改根日志记录器。
+    """
+    global _log_listener
+    level = level or DEFAULT_CONFIG['log_level']
+    log_file = DEFAULT_CONFIG['log_file'] if log_file is None else log_file
+    levels = DEFAULT_CONFIG['log_levels'] if levels is None else levels
+    if trace_sample_rate is None:
+        trace_sample_rate = DEFAULT_CONFIG['trace_sample_rate']
+
+    if _log_listener:
+        _log_listener.stop()
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    is_paragraph = logging.Filter(paragraph_logger.name).filter
+    handlers = []
+    if log_file:
+        # delay=True：第一次写入日志时才创建文件
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8', delay=True))
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.addFilter(lambda record: not is_paragraph(record))
+    if DEFAULT_CONFIG['paragraph_log_file']:
+        paragraph_handler = logging.FileHandler(DEFAULT_CONFIG['paragraph_log_file'], encoding='utf-8', delay=True)
+        paragraph_handler.addFilter(is_paragraph)
+        handlers.append(paragraph_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    for configured in (logger, paragraph_logger):
+        for handler in list(configured.handlers):
+            configured.removeHandler(handler)
+        configured.addHandler(queue_handler)
+        configured.propagate = False  # 不再传递到根日志记录器（避免第三方库的配置重复输出）
+    logger.setLevel(level)
+    paragraph_logger.setLevel(logging.DEBUG)
+    for subsystem in (api_logger, batch_logger, trace_logger):
+        subsystem.setLevel(logging.NOTSET)
+    for name, subsystem_level in levels.items():
+        logging.getLogger(name).setLevel(subsystem_level)
+    for old_filter in list(trace_logger.filters):
+        trace_logger.removeFilter(old_filter)
+    trace_logger.addFilter(SamplingFilter(trace_sample_rate))
+
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _log_listener.start()
+    return _log_listener
+
+
+@atexit.register
+def stop_logging():
+    """写完队列中剩余的日志记录并停止后台线程"""
+    global _log_listener
+    if _log_listener:
+        _log_listener.stop()
+        _log_listener = None
+
+
 def show_progress_bar(current, total, width=50):
     """显示漂亮的进度条"""
     progress = min(1.0, current / total)
@@ -80,57 +243,486 @@ def show_progress_bar(current, total, width=50):
     return f"\r进度: |{bar}| {percent:.1f}% 完成 ({current}/{total})"
 
 
-def extract_text_from_pdf(pdf_path):
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            text = ""
-            total_pages = len(pdf.pages)
+# 阶段计时的中文说明（--profile报告使用）
+STAGE_LABELS = {
+    'extract': "PDF页面提取",
+    'segment': "句子分段",
+    'document_cache_read': "读取文档缓存",
+    'batch_queue_wait': "批次排队等待",
+    'semaphore_wait': "等待并发名额",
+    'batch': "批次处理（总计）",
+    'api_request': "API请求",
+    'retry_backoff': "重试退避等待",
+    'postprocess': "译文后处理",
+    'memory_lookup': "查询翻译记忆",
+    'memory_store': "写入翻译记忆",
+    'document_write': "写入文档对象",
+    'document_save': "保存docx",
+    'journal_sync': "批次日志fsync",
+    'progress_flush': "进度写盘",
+}
+
+
+class StageTimer:
+    """Metrics.timer返回的计时上下文，退出时把耗时记录到对应的直方图"""
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+
+
+class Metrics:
+    """翻译任务的轻量指标：计数器、直方图和阶段计时器
+
+    引擎在各阶段调用inc/observe/timer写入指标（可在提取线程、事件循环和写盘线程中同时写入）。
+    enabled为False时这些方法立即返回，timer返回共享的空上下文，几乎没有开销。
+    snapshot()是进度数据中的摘要，render_prometheus()生成Prometheus文本格式，
+    format_report()生成--profile的分阶段耗时表。
+    """
+
+    # 直方图的桶上限（秒）
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    NULL_TIMER = contextlib.nullcontext()
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}  # 名称 -> {'buckets': 各桶计数, 'count', 'sum', 'max'}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {
+                    'buckets': [0] * len(self.BUCKETS), 'count': 0, 'sum': 0.0, 'max': 0.0}
+            position = bisect.bisect_left(self.BUCKETS, value)
+            if position < len(self.BUCKETS):
+                histogram['buckets'][position] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+            if value > histogram['max']:
+                histogram['max'] = value
+
+    def timer(self, name):
+        """with metrics.timer('stage'): ... 把代码块的耗时记录到直方图name"""
+        if not self.enabled:
+            return self.NULL_TIMER
+        return StageTimer(self, name)
+
+    def snapshot(self):
+        """进度数据中使用的摘要：计数器和各阶段的次数、总耗时、平均和最大耗时（秒）"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'stages': {name: {'count': h['count'], 'total': round(h['sum'], 4),
+                                  'mean': round(h['sum'] / h['count'], 4), 'max': round(h['max'], 4)}
+                           for name, h in self.histograms.items()}
+            }
+
+    def format_report(self):
+        """按总耗时排序的分阶段耗时表"""
+        wall = time.perf_counter() - self.started
+        state = self.snapshot()
+        lines = [f"===== 分阶段耗时（总用时 {wall:.2f}s，各阶段可能并行，占比之和可超过100%） =====",
+                 f"{'阶段':<24}{'次数':>8}{'总耗时(s)':>12}{'平均(ms)':>12}{'最大(ms)':>12}{'占比':>8}"]
+        for name, stage in sorted(state['stages'].items(), key=lambda item: -item[1]['total']):
+            label = f"{STAGE_LABELS.get(name, name)} ({name})"
+            lines.append(f"{label:<24}{stage['count']:>8}{stage['total']:>12.3f}"
+                         f"{stage['mean'] * 1000:>12.1f}{stage['max'] * 1000:>12.1f}"
+                         f"{stage['total'] / wall if wall else 0:>8.1%}")
+        if state['counters']:
+            lines.append("计数: " + ", ".join(f"{name}={value}" for name, value in sorted(state['counters'].items())))
+        return "\n".join(lines)
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(jobs, prefix="pdftranslate"):
+    """把{任务名: Metrics}渲染为Prometheus文本格式（每个任务带job_name标签）"""
+    counter_lines = {}
+    histogram_lines = []
+    for job, metrics in jobs.items():
+        label = f'job_name="{escape_label_value(job)}"'
+        with metrics._lock:
+            counters = dict(metrics.counters)
+            histograms = {name: dict(h, buckets=list(h['buckets'])) for name, h in metrics.histograms.items()}
+        for name, value in sorted(counters.items()):
+            counter_lines.setdefault(name, []).append(f"{prefix}_{name}_total{{{label}}} {value}")
+        for name, histogram in sorted(histograms.items()):
+            stage_label = f'{label},stage="{name}"'
+            cumulative = 0
+            for bound, count in zip(Metrics.BUCKETS, histogram['buckets']):
+                cumulative += count
+                histogram_lines.append(f'{prefix}_stage_seconds_bucket{{{stage_label},le="{bound}"}} {cumulative}')
+            histogram_lines.append(f'{prefix}_stage_seconds_bucket{{{stage_label},le="+Inf"}} {histogram["count"]}')
+            histogram_lines.append(f"{prefix}_stage_seconds_sum{{{stage_label}}} {histogram['sum']:.6f}")
+            histogram_lines.append(f"{prefix}_stage_seconds_count{{{stage_label}}} {histogram['count']}")
+
+    lines = []
+    for name, samples in sorted(counter_lines.items()):
+        lines.append(f"# TYPE {prefix}_{name}_total counter")
+        lines.extend(samples)
+    if histogram_lines:
+        lines.append(f"# HELP {prefix}_stage_seconds 翻译流水线各阶段的耗时")
+        lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+        lines.extend(histogram_lines)
+    return "\n".join(lines) + "\n"
+
+
+# 未启用指标时使用的共享实例
+NULL_METRICS = Metrics(enabled=False)
+
+
+def iter_pdf_pages(pdf_path, workers=None, page_filter=None, first_page=0, last_page=None):
+    """逐页生成PDF文本的生成器，不在内存中拼接整本书的文本
+
+    workers大于1且页数不少于parallel_min_pages时，按页码区间分发到进程池并行提取，
+    结果仍按页码顺序返回；页数较少时进程启动开销大于收益，使用单进程提取。
+    page_filter为HeaderFooterFilter时按版面提取（每页的行及其位置），
+    去除页眉、页脚和页码后再生成页面文本。
+    只提取[first_page, last_page)范围内的页面（页码从0开始，last_page为None时到最后一页）。
+    """
+    if page_filter is not None:
+        yield from page_filter.filter(iter_pdf_page_layouts(pdf_path, workers, True, first_page, last_page))
+        return
+    yield from iter_pdf_page_layouts(pdf_path, workers, False, first_page, last_page)
+
+
+def iter_pdf_page_layouts(pdf_path, workers=None, layout=True, first_page=0, last_page=None):
+    """逐页生成pdf_workers.extract_page_layout的结果（layout为False时生成页面文本）"""
+    if workers is None:
+        workers = DEFAULT_CONFIG['extract_workers']
+
+    with pdfplumber.open(pdf_path) as pdf:
+        total_pages = len(pdf.pages)
+        last_page = total_pages if last_page is None else min(last_page, total_pages)
+        first_page = min(max(first_page, 0), last_page)
+        page_count = last_page - first_page
+        if page_count == total_pages:
             logger.info(f"开始从PDF提取文本，共 {total_pages} 页")
+        else:
+            logger.info(f"开始从PDF提取文本，第 {first_page + 1}-{last_page} 页（共 {total_pages} 页）")
+        parallel = workers > 1 and page_count >= DEFAULT_CONFIG['parallel_min_pages']
+
+        if not parallel:
+            for i, page in enumerate(pdf.pages[first_page:last_page]):
+                yield pdf_workers.extract_page_layout(page) if layout else page.extract_text() or ""
+                # 释放已解析页面的缓存对象，保持内存占用平稳
+                page.flush_cache()
+                print_extract_progress(i + 1, page_count)
 
-            for i, page in enumerate(pdf.pages):
-                page_text = page.extract_text() or ""
-                text += page_text + "\n"
+    if parallel:
+        logger.info(f"使用 {workers} 个进程并行提取PDF文本")
+        yield from iter_pdf_pages_parallel(pdf_path, last_page, workers, layout, first_page)
 
-                # 显示进度
-                if i % 5 == 0 or i == total_pages - 1:
-                    print(show_progress_bar(i + 1, total_pages), end='')
+    print()  # 换行
 
-            print()  # 换行
-            logger.info(f"成功从PDF提取文本，长度: {len(text)} 字符")
+
+def iter_pdf_pages_parallel(pdf_path, total_pages, workers, layout=False, first_page=0):
+    """多进程提取[first_page, total_pages)范围内的页面文本，同时在途的任务数有上限，按页码顺序返回"""
+    chunk_pages = DEFAULT_CONFIG['extract_chunk_pages']
+    page_ranges = iter([(first, min(first + chunk_pages, total_pages))
+                        for first in range(first_page, total_pages, chunk_pages)])
+    executor = ProcessPoolExecutor(max_workers=workers)
+    futures = deque()
+
+    def submit_next():
+        page_range = next(page_ranges, None)
+        if page_range:
+            futures.append(executor.submit(
+                pdf_workers.extract_page_range, pdf_path, *page_range, layout))
+
+    try:
+        for _ in range(workers * 2):
+            submit_next()
+
+        done_pages = 0
+        while futures:
+            texts = futures.popleft().result()
+            submit_next()
+            for page_text in texts:
+                yield page_text
+                done_pages += 1
+                print_extract_progress(done_pages, total_pages - first_page)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def print_extract_progress(done_pages, total_pages):
+    """显示提取进度"""
+    if done_pages % 5 == 1 or done_pages == total_pages:
+        print(show_progress_bar(done_pages, total_pages), end='')
+
+
+class HeaderFooterFilter:
+    """版面提取模式：去除每页重复出现的页眉、页脚和页码
+
+    每页的行带有位置信息（pdf_workers.extract_page_layout）。位于页面顶部或底部header_band比例区域内的行，
+    规范化（小写、合并空白、数字替换为#，使“12 Chapter One”与“13 Chapter One”相同）后，
+    若在前后header_window_pages页范围内至少出现在header_min_repeats页上，视为页眉或页脚；
+    区域内只有页码（如“12”、“- 12 -”、“Page 12 of 300”、罗马数字）的行直接去除。
+    奇偶页不同的页眉各自统计，章节不同的页眉在各章内统计，因此都能识别。
+    只向后多读半个窗口的页面，内存占用与文档长度无关。
+
+    去除页眉页脚后，跨页的句子在分段时直接与下一页相接；
+    页面最后一个单词以连字符断开且下一页以小写字母开头时，合并为一个单词。
+    removed_lines/removed_chars为累计去除的行数和字符数。
+    """
+
+    PAGE_NUMBER = re.compile(
+        r'(?:page\s+)?[-–—(\[]?\s*(?:\d+|[ivxlcdm]+)\s*[-–—)\]]?(?:\s*(?:/|of)\s*\d+)?', re.IGNORECASE)
+    DIGITS = re.compile(r'\d+')
+    HYPHENATED = re.compile(r'([A-Za-z]+)-$')
+
+    def __init__(self, band=DEFAULT_CONFIG['header_band'], window_pages=DEFAULT_CONFIG['header_window_pages'],
+                 min_repeats=DEFAULT_CONFIG['header_min_repeats']):
+        self.band = band
+        self.window_pages = window_pages
+        self.min_repeats = min_repeats
+        self.removed_lines = 0
+        self.removed_chars = 0
+
+    def band_key(self, top, bottom, text, height):
+        """页面顶部或底部区域内的行返回(区域, 规范化文本)，其他行返回None"""
+        if top < height * self.band:
+            region = 'top'
+        elif bottom > height * (1 - self.band):
+            region = 'bottom'
+        else:
+            return None
+        return region, self.DIGITS.sub('#', ' '.join(text.lower().split()))
+
+    def filter(self, layouts):
+        """输入逐页的(页高, [(行顶部, 行底部, 行文本)])，按顺序生成去除页眉页脚后的页面文本"""
+        half = self.window_pages // 2
+        window = deque()  # (行, 各行的区域键)，第一个元素是第first页
+        counts = Counter()  # 区域键 -> 窗口内出现的页数
+        first = 0
+        next_page = 0
+        carry = ""  # 上一页末尾被连字符断开的单词
+
+        def page_text(index, last):
+            nonlocal carry
+            lines, keys = window[index - first]
+            kept = []
+            for (_, _, text), key in zip(lines, keys):
+                if key is not None and (counts[key] >= self.min_repeats or self.PAGE_NUMBER.fullmatch(text.strip())):
+                    self.removed_lines += 1
+                    self.removed_chars += len(text)
+                else:
+                    kept.append(text)
+            text = "\n".join(kept)
+            if carry:
+                # 下一页以小写字母开头时是同一个单词的后半部分
+                text = carry[:-1] + text if text[:1].islower() else f"{carry}\n{text}"
+                carry = ""
+            match = None if last else self.HYPHENATED.search(text)
+            if match:
+                carry = text[match.start():]
+                text = text[:match.start()].rstrip()
             return text
+
+        def advance():
+            nonlocal first
+            while first < next_page - half:
+                _, keys = window.popleft()
+                for key in {key for key in keys if key is not None}:
+                    counts[key] -= 1
+                    if not counts[key]:
+                        del counts[key]
+                first += 1
+
+        for height, lines in layouts:
+            keys = [self.band_key(top, bottom, text, height) for top, bottom, text in lines]
+            window.append((lines, keys))
+            counts.update({key for key in keys if key is not None})
+            # 已读到第next_page页之后半个窗口时，该页的统计已完整
+            while next_page <= first + len(window) - 1 - half:
+                yield page_text(next_page, last=False)
+                next_page += 1
+                advance()
+        while next_page < first + len(window):
+            yield page_text(next_page, last=next_page == first + len(window) - 1)
+            next_page += 1
+            advance()
+
+
+def create_page_filter(extraction_mode=DEFAULT_CONFIG['extraction_mode']):
+    """按提取方式返回HeaderFooterFilter（layout）或None（text）"""
+    if extraction_mode not in ('layout', 'text'):
+        raise ValueError(f"未知的提取方式: {extraction_mode}")
+    return HeaderFooterFilter() if extraction_mode == 'layout' else None
+
+
+def extract_text_from_pdf(pdf_path, workers=None, extraction_mode=DEFAULT_CONFIG['extraction_mode']):
+    try:
+        page_filter = create_page_filter(extraction_mode)
+        text = "".join(page_text + "\n" for page_text in iter_pdf_pages(pdf_path, workers, page_filter))
+        logger.info(f"成功从PDF提取文本，长度: {len(text)} 字符")
+        if page_filter:
+            logger.info(f"去除页眉、页脚和页码 {page_filter.removed_lines} 行，共 {page_filter.removed_chars} 字符")
+        return text
     except Exception as e:
         logger.error(f"PDF提取失败: {e}")
         return ""
 
 
-def get_pdf_preview(pdf_path, max_pages=3, max_paragraphs=5):
-    """从PDF中提取预览文本，返回前几页的几个段落"""
+def get_pdf_page_count(pdf_path):
+    """从PDF的页面树读取总页数，不解析页面内容"""
     try:
+        with open(pdf_path, 'rb') as f:
+            document = PDFDocument(PDFParser(f))
+            return int(resolve1(resolve1(document.catalog['Pages'])['Count']))
+    except Exception as e:
+        logger.warning(f"无法从页面树读取页数，改为逐页统计: {e}")
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+
+
+class PdfPreviewer:
+    """按页窗口提供PDF预览
+
+    只提取请求范围内的页面，每页文本按（文件内容哈希, 页码）保存在LRU缓存中，
+    来回翻页时不再重复提取；document_cache（DocumentCache）中已有整本书的页面文本时直接读取。
+    extraction_mode与翻译流水线相同：layout模式下预览的是去除页眉页脚后的文本，
+    读取文档缓存中的layout-pages；未缓存时在请求范围前后各多提取半个识别窗口的页面，用相同的过滤器去除。
+    总页数从PDF的页面树读取。可在多个请求线程中共用。
+    """
+
+    def __init__(self, document_cache=None, max_pages=DEFAULT_CONFIG['preview_cache_pages'],
+                 extraction_mode=DEFAULT_CONFIG['extraction_mode']):
+        self.document_cache = document_cache
+        self.max_pages = max_pages
+        self.extraction_mode = extraction_mode
+        # 检查提取方式是否有效
+        create_page_filter(extraction_mode)
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._page_counts = {}
+        self._lock = threading.Lock()
+
+    def page_count(self, pdf_path):
+        digest = DocumentCache.file_hash(pdf_path)
+        with self._lock:
+            total_pages = self._page_counts.get(digest)
+        if total_pages is None:
+            total_pages = get_pdf_page_count(pdf_path)
+            with self._lock:
+                self._page_counts[digest] = total_pages
+        return total_pages
+
+    def _remember(self, digest, page_index, page_text):
+        with self._lock:
+            self._pages[(digest, page_index)] = page_text
+            self._pages.move_to_end((digest, page_index))
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def pages(self, pdf_path, offset, count):
+        """返回第offset页起（从0开始）最多count页的文本列表"""
+        digest = DocumentCache.file_hash(pdf_path)
+        indices = range(offset, min(offset + count, self.page_count(pdf_path)))
+        texts = {}
+        with self._lock:
+            for page_index in indices:
+                page_text = self._pages.get((digest, page_index))
+                if page_text is not None:
+                    self._pages.move_to_end((digest, page_index))
+                    texts[page_index] = page_text
+            self.hits += len(texts)
+            self.misses += len(indices) - len(texts)
+
+        missing = [page_index for page_index in indices if page_index not in texts]
+        if missing:
+            cached = None
+            if self.document_cache:
+                cached = self.document_cache.read_pages(pdf_path, missing[-1] + 1, first_page=missing[0],
+                                                        page_filter=create_page_filter(self.extraction_mode))
+            if cached is not None:
+                loaded = dict(zip(range(missing[0], missing[-1] + 1), cached[1]))
+            elif self.extraction_mode == 'layout':
+                loaded = self._extract_filtered(pdf_path, missing[0], missing[-1] + 1)
+            else:
+                with pdfplumber.open(pdf_path, pages=[page_index + 1 for page_index in missing]) as pdf:
+                    loaded = {}
+                    for page_index, page in zip(missing, pdf.pages):
+                        loaded[page_index] = page.extract_text() or ""
+                        page.flush_cache()
+            for page_index in missing:
+                texts[page_index] = loaded[page_index]
+                self._remember(digest, page_index, loaded[page_index])
+
+        return [texts[page_index] for page_index in indices]
+
+    def _extract_filtered(self, pdf_path, first, last):
+        """提取[first, last)页去除页眉页脚后的文本：前后各多读半个识别窗口，使重复行的统计与整本提取时相同"""
+        page_filter = create_page_filter(self.extraction_mode)
+        half = page_filter.window_pages // 2
+        start = max(0, first - half)
+        end = min(self.page_count(pdf_path), last + half)
+
+        def layouts():
+            with pdfplumber.open(pdf_path, pages=list(range(start + 1, end + 1))) as pdf:
+                for page in pdf.pages:
+                    yield pdf_workers.extract_page_layout(page)
+                    page.flush_cache()
+
+        return {page_index: text for page_index, text in enumerate(page_filter.filter(layouts()), start=start)
+                if first <= page_index < last}
+
+    def preview(self, pdf_path, offset=0, count=DEFAULT_CONFIG['preview_page_size'], max_paragraphs=5):
+        """返回预览数据：总页数、本次返回的页面及其前几个段落，以及下一页的偏移"""
+        total_pages = self.page_count(pdf_path)
+        offset = max(0, min(offset, total_pages))
         preview_data = {
-            "total_pages": 0,
+            "total_pages": total_pages,
+            "offset": offset,
             "previews": []
         }
 
-        with pdfplumber.open(pdf_path) as pdf:
-            preview_data["total_pages"] = len(pdf.pages)
-            pages_to_preview = min(max_pages, len(pdf.pages))
+        for i, page_text in enumerate(self.pages(pdf_path, offset, count)):
+            # 分割段落
+            paragraphs = [p for p in page_text.split('\n\n') if p.strip()]
 
-            for i in range(pages_to_preview):
-                page = pdf.pages[i]
-                page_text = page.extract_text() or ""
+            # 取前几个段落
+            preview_paragraphs = paragraphs[:max_paragraphs]
 
-                # 分割段落
-                paragraphs = [p for p in page_text.split('\n\n') if p.strip()]
+            preview_data["previews"].append({
+                "page": offset + i + 1,
+                "paragraphs": preview_paragraphs
+            })
 
-                # 取前几个段落
-                preview_paragraphs = paragraphs[:max_paragraphs]
+        next_offset = offset + len(preview_data["previews"])
+        preview_data["next_offset"] = next_offset if next_offset < total_pages else None
+        return preview_data
 
-                preview_data["previews"].append({
-                    "page": i + 1,
-                    "paragraphs": preview_paragraphs
-                })
 
-            return preview_data
+def get_pdf_preview(pdf_path, max_pages=3, max_paragraphs=5, document_cache=None):
+    """从PDF中提取预览文本，返回前几页的几个段落"""
+    try:
+        return PdfPreviewer(document_cache).preview(pdf_path, 0, max_pages, max_paragraphs)
     except Exception as e:
         logger.error(f"PDF预览提取失败: {e}")
         return {"total_pages": 0, "previews": []}
@@ -163,10 +755,308 @@ def extract_text_from_word(word_path):
         return ""
 
 
-async def translate_with_deepseek_async(paragraphs, api_key, api_url, api_model, temperature=0.3, retries=3, delay=2):
-    """异步版本的deepseek翻译函数"""
-    # 改进系统提示以获得更好的翻译并保持段落结构
-    system_prompt = """你是一个专业的翻译助手。请将以下英文文本翻译成中文。
+def create_http_session(max_concurrent_requests=DEFAULT_CONFIG['max_concurrent_requests'],
+                        connect_timeout=DEFAULT_CONFIG['connect_timeout'],
+                        read_timeout=DEFAULT_CONFIG['read_timeout']):
+    """创建共享的HTTP会话
+
+    连接池大小与并发请求数一致，保持keep-alive连接并缓存DNS解析结果，
+    避免每个批次都重新进行TCP/TLS握手。必须在事件循环中调用，用完后需关闭。
+    """
+    connector = aiohttp.TCPConnector(
+        limit=max_concurrent_requests,
+        limit_per_host=max_concurrent_requests,
+        ttl_dns_cache=DEFAULT_CONFIG['dns_cache_ttl'],
+        keepalive_timeout=60
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=None, connect=connect_timeout, sock_read=read_timeout)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD自适应并发控制器，可替代asyncio.Semaphore使用（async with limiter）
+
+    请求成功且延迟正常时，每连续成功“当前上限”次就把上限加1（加性增）；
+    遇到HTTP 429/5xx或超时时把上限减半（乘性减），冷却时间内只减一次，
+    避免同一波失败的并发请求把上限连续砍到底。上限始终在[min_limit, max_limit]之间。
+    """
+
+    def __init__(self, initial_limit, min_limit=DEFAULT_CONFIG['min_concurrent_requests'],
+                 max_limit=DEFAULT_CONFIG['max_concurrent_limit'],
+                 latency_tolerance=DEFAULT_CONFIG['latency_tolerance'],
+                 decrease_cooldown=DEFAULT_CONFIG['concurrency_decrease_cooldown'],
+                 on_change=None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = max(self.min_limit, min(self.max_limit, initial_limit))
+        self.latency_tolerance = latency_tolerance
+        self.decrease_cooldown = decrease_cooldown
+        self.on_change = on_change
+        self.in_flight = 0
+        self.changes = deque(maxlen=20)  # 最近的调整记录
+        self._successes = 0
+        self._base_latency = None
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def record_success(self, latency):
+        """请求成功：延迟未明显高于基线时逐步提高上限"""
+        if self._base_latency is None or latency < self._base_latency:
+            self._base_latency = latency
+        if latency > self._base_latency * self.latency_tolerance:
+            # 延迟明显变高，说明服务端已接近饱和，保持当前上限
+            self._successes = 0
+            return
+
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self._successes = 0
+            self._set_limit(self.limit + 1, f"连续成功且延迟正常（{latency:.2f}s）")
+
+    def record_throttle(self, reason):
+        """请求被限流、服务端错误或超时：上限减半"""
+        self._successes = 0
+        now = time.time()
+        if now - self._last_decrease < self.decrease_cooldown or self.limit <= self.min_limit:
+            return
+        self._last_decrease = now
+        self._set_limit(max(self.min_limit, self.limit // 2), reason)
+
+    def _set_limit(self, new_limit, reason):
+        change = {'time': time.time(), 'from': self.limit, 'to': new_limit, 'reason': reason}
+        self.changes.append(change)
+        self.limit = new_limit
+        logger.info(f"并发上限调整: {change['from']} -> {new_limit}（{reason}）")
+        if self.on_change:
+            self.on_change(self)
+        # 上限提高后唤醒等待的请求
+        asyncio.ensure_future(self._notify())
+
+    async def _notify(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+    def snapshot(self):
+        """供进度数据使用的状态摘要"""
+        return {
+            'concurrency_limit': self.limit,
+            'concurrency_in_flight': self.in_flight,
+            'concurrency_changes': list(self.changes)[-5:]
+        }
+
+
+class FairRequestBudget:
+    """多个翻译任务共享的API并发预算（同一个API密钥的总并发数）
+
+    有空闲名额时直接占用；名额用完后各任务的请求排队，
+    释放的名额按任务轮流分配（每个任务每轮一个请求），大任务不会饿死小任务。
+    只能在同一个事件循环中使用。
+    """
+
+    def __init__(self, limit=DEFAULT_CONFIG['global_max_concurrent_requests']):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self._waiters = {}  # 任务 -> 等待中的请求（Future队列）
+        self._rotation = deque()  # 有请求在等待的任务，按轮转顺序排列
+
+    async def acquire(self, job_id):
+        if self.in_flight < self.limit and not self._rotation:
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(job_id, deque())
+        if not waiters:
+            self._rotation.append(job_id)
+        waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已分配但调用方被取消，归还名额
+                self.release()
+            else:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[job_id]
+                    self._rotation.remove(job_id)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._grant()
+
+    def _grant(self):
+        """把空闲名额按轮转顺序分配给等待中的任务"""
+        while self.in_flight < self.limit and self._rotation:
+            job_id = self._rotation.popleft()
+            waiters = self._waiters[job_id]
+            future = waiters.popleft()
+            if waiters:
+                self._rotation.append(job_id)
+            else:
+                del self._waiters[job_id]
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def snapshot(self):
+        return {
+            'global_limit': self.limit,
+            'global_in_flight': self.in_flight,
+            'global_waiting': sum(len(waiters) for waiters in self._waiters.values())
+        }
+
+
+class BudgetedLimiter:
+    """把单个任务的并发控制器与全局预算组合使用（async with limiter）
+
+    先占用任务自己的名额（Semaphore或AdaptiveConcurrencyLimiter），再按轮转顺序占用全局名额；
+    请求结果反馈给任务自己的自适应控制器。
+    """
+
+    def __init__(self, inner, budget, job_id):
+        self.inner = inner
+        self.budget = budget
+        self.job_id = job_id
+
+    async def __aenter__(self):
+        await self.inner.__aenter__()
+        try:
+            await self.budget.acquire(self.job_id)
+        except BaseException:
+            await self.inner.__aexit__(None, None, None)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.budget.release()
+        await self.inner.__aexit__(exc_type, exc, tb)
+
+    def record_success(self, latency):
+        if isinstance(self.inner, AdaptiveConcurrencyLimiter):
+            self.inner.record_success(latency)
+
+    def record_throttle(self, reason):
+        if isinstance(self.inner, AdaptiveConcurrencyLimiter):
+            self.inner.record_throttle(reason)
+
+
+class TranslationAPIError(Exception):
+    """翻译API调用失败
+
+    status为HTTP状态码（网络错误、超时等为None），retry_after为服务端要求的等待秒数。
+    """
+
+    # 与请求内容无关的错误（密钥、权限、地址错误），拆分批次重试也没有意义
+    NON_BISECTABLE_STATUS = {401, 403, 404}
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        """限流、超时、服务端错误和网络错误可以重试，其余4xx错误重试也不会成功"""
+        return self.status is None or self.status in (408, 409, 429) or self.status >= 500
+
+    @property
+    def bisectable(self):
+        return self.status not in self.NON_BISECTABLE_STATUS
+
+
+def parse_retry_after(value):
+    """解析Retry-After响应头（秒数或HTTP日期），返回等待秒数或None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_backoff(attempt, base_delay, max_delay=DEFAULT_CONFIG['retry_max_delay'], retry_after=None):
+    """计算第attempt次（从0开始）失败后的等待时间
+
+    服务端给出Retry-After时按其要求等待（不超过max_delay），
+    否则使用带完全抖动的指数退避，避免并发请求同时重试。
+    """
+    if retry_after is not None:
+        return min(max_delay, retry_after)
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+async def read_streamed_completion(response, on_paragraph=None):
+    """读取SSE流式响应，返回(译文, 是否完整结束)
+
+    每收到一行完整的“段落N: 译文”就回调on_paragraph(N-1, 译文)。
+    流没有正常结束（缺少[DONE]、因长度限制停止或连接中断）时，
+    丢弃最后一个不完整的行，只返回已完整收到的部分。
+    """
+    lines = []
+    pending = ""
+    finished = False
+
+    def complete(line):
+        lines.append(line)
+        match = TRANSLATION_MARKER.match(line)
+        if on_paragraph and match and line[match.end():].strip():
+            on_paragraph(int(match.group(1)) - 1, line[match.end():].strip())
+
+    try:
+        async for raw_line in response.content:
+            line = raw_line.decode('utf-8').strip()
+            if not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                finished = True
+                break
+            choices = json.loads(payload).get('choices') or [{}]
+            pending += (choices[0].get('delta') or {}).get('content') or ""
+            while '\n' in pending:
+                line, pending = pending.split('\n', 1)
+                complete(line)
+            if choices[0].get('finish_reason') == 'length':
+                api_logger.warning("流式响应达到输出长度上限")
+                break
+        else:
+            api_logger.warning("流式响应在收到[DONE]之前结束")
+    except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+        if not lines:
+            raise
+        api_logger.warning("流式响应中断: %s: %s", type(e).__name__, e)
+
+    if finished and pending.strip():
+        complete(pending)
+    return "\n".join(lines), finished
+
+
+# 改进系统提示以获得更好的翻译并保持段落结构
+TRANSLATION_SYSTEM_PROMPT = """你是一个专业的翻译助手。请将以下英文文本翻译成中文。
     要求：
     1. 保持专业术语的准确性
     2. 确保翻译通顺易读
@@ -178,11 +1068,39 @@ async def translate_with_deepseek_async(paragraphs, api_key, api_url, api_model,
     
     重要：请只输出翻译结果，不要输出任何其他内容，如注释、说明、分析或翻译过程等。
     """
+TRANSLATION_USER_PROMPT = ("请将以下文本翻译成中文，直接给出翻译结果，不要添加任何解释、注释或备注。"
+                           "请确保每个段落都有对应的翻译，并保持段落顺序。每个段落必须单独成行，段落之间使用换行符分隔:\n\n")
+
+
+def translation_fingerprint(api_model, temperature):
+    """模型、温度和提示词的哈希：其中任一项变化后，已有的译文不再适用"""
+    settings = json.dumps([api_model, temperature, TRANSLATION_SYSTEM_PROMPT, TRANSLATION_USER_PROMPT],
+                          ensure_ascii=False)
+    return hashlib.sha256(settings.encode('utf-8')).hexdigest()
+
+
+async def translate_with_deepseek_async(paragraphs, api_key, api_url, api_model, temperature=0.3, retries=3, delay=2, session=None,
+                                        limiter=None, raise_on_failure=False, raw_output=False, stream=False,
+                                        on_paragraph=None, metrics=NULL_METRICS):
+    """异步版本的deepseek翻译函数
+
+    session为共享的aiohttp会话；未提供时临时创建一个，并在返回前关闭。
+    limiter为AdaptiveConcurrencyLimiter时，每次请求的延迟和限流/超时情况会反馈给它。
+    可重试的错误按指数退避（delay为基础等待时间）并遵守Retry-After重试，
+    不可重试的错误立即放弃。全部失败时返回空字符串；
+    raise_on_failure为True时改为抛出TranslationAPIError。
+    raw_output为True时直接返回API输出（保留“段落N:”标记），由parse_numbered_translation逐段对齐。
+    stream为True时以SSE流式接收译文，每收到一个完整的段落行就调用on_paragraph(序号, 译文)；
+    流被截断时不计为成功请求；raw_output为True时只返回已完整收到的行，缺失的段落由调用方重新请求，
+    否则按请求失败处理（重试，全部失败后返回空字符串或抛出异常）。
+    metrics记录每次请求的耗时（api_request）、请求/错误/重试次数和估算的token数。
+    """
 
-    # 记录原始段落数量和内容
-    logger.info(f"待翻译的段落数: {len(paragraphs)}")
-    for i, para in enumerate(paragraphs):
-        logger.debug(f"待翻译-段落{i+1}: {para[:50]}...")
+    # 记录原始段落数量和内容（逐段落的跟踪日志按比例采样）
+    api_logger.debug("待翻译的段落数: %d", len(paragraphs))
+    if trace_logger.isEnabledFor(logging.DEBUG):
+        for i, para in enumerate(paragraphs):
+            trace_logger.debug("待翻译-段落%d: %.50s...", i + 1, para)
 
     # 对每个段落添加标记，以便在响应中更容易识别
     marked_paragraphs = []
@@ -192,8 +1110,8 @@ async def translate_with_deepseek_async(paragraphs, api_key, api_url, api_model,
     paragraph_text = "\n\n".join(marked_paragraphs)
 
     messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"请将以下文本翻译成中文，直接给出翻译结果，不要添加任何解释、注释或备注。请确保每个段落都有对应的翻译，并保持段落顺序。每个段落必须单独成行，段落之间使用换行符分隔:\n\n{paragraph_text}"}
+        {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT},
+        {"role": "user", "content": TRANSLATION_USER_PROMPT + paragraph_text}
     ]
 
     headers = {
@@ -206,31 +1124,72 @@ async def translate_with_deepseek_async(paragraphs, api_key, api_url, api_model,
         "messages": messages,
         "temperature": temperature
     }
+    if stream:
+        data["stream"] = True
 
-    for attempt in range(retries):
-        try:
-            logger.info(f"正在进行第 {attempt + 1} 次翻译尝试...")
-            async with aiohttp.ClientSession() as session:
+    own_session = session is None
+    if own_session:
+        session = create_http_session()
+
+    error = TranslationAPIError("未发送任何请求")
+    try:
+        for attempt in range(retries):
+            try:
+                api_logger.debug("正在进行第 %d 次翻译尝试...", attempt + 1)
+                request_started = time.monotonic()
+                metrics.inc('api_requests')
                 async with session.post(api_url, json=data, headers=headers) as response:
                     if response.status != 200:
                         error_text = await response.text()
-                        logger.error(
-                            f"API响应错误 (HTTP {response.status}): {error_text}")
-                        raise Exception(f"API响应错误: {response.status}")
-
-                    response_json = await response.json()
-                    if "choices" not in response_json or not response_json["choices"]:
-                        logger.error(f"API响应格式错误: {response_json}")
-                        raise Exception("API响应格式错误")
-
-                    translated_text = response_json["choices"][0]["message"]["content"]
-                    logger.debug(f"API原始返回结果: {translated_text[:200]}...")
+                        metrics.observe('api_request', time.monotonic() - request_started)
+                        metrics.inc('api_throttled' if response.status == 429 else 'api_errors')
+                        api_logger.error("API响应错误 (HTTP %d): %.500s", response.status, error_text)
+                        if limiter and (response.status == 429 or response.status >= 500):
+                            limiter.record_throttle(f"HTTP {response.status}")
+                        raise TranslationAPIError(
+                            f"API响应错误: {response.status}", status=response.status,
+                            retry_after=parse_retry_after(response.headers.get('Retry-After')))
+
+                    if stream:
+                        translated_text, finished = await read_streamed_completion(response, on_paragraph)
+                        if finished:
+                            if limiter:
+                                limiter.record_success(time.monotonic() - request_started)
+                        else:
+                            # 被截断的流不算成功，按限流处理，不提高并发上限
+                            if limiter:
+                                limiter.record_throttle("流式响应被截断")
+                            if not translated_text.strip():
+                                raise TranslationAPIError("流式响应中断，未收到完整段落")
+                            if not raw_output:
+                                # 无法逐段对齐时不能把不完整的译文当作完整结果，整批重试（或交给调用方拆分）
+                                raise TranslationAPIError("流式响应被截断，译文不完整")
+                            # 只保留已完整收到的段落，其余段落由调用方重新请求
+                            api_logger.warning("流式响应被截断，只使用已完整收到的 %d 行译文",
+                                               len(translated_text.splitlines()))
+                    else:
+                        response_json = await response.json()
+                        if limiter:
+                            limiter.record_success(time.monotonic() - request_started)
+                        if "choices" not in response_json or not response_json["choices"]:
+                            api_logger.error("API响应格式错误: %.500s", response_json)
+                            raise TranslationAPIError("API响应格式错误")
+
+                        translated_text = response_json["choices"][0]["message"]["content"]
+                    metrics.observe('api_request', time.monotonic() - request_started)
+                    if metrics.enabled:
+                        metrics.inc('input_tokens', estimate_tokens(paragraph_text))
+                        metrics.inc('output_tokens', estimate_tokens(translated_text))
+                    trace_logger.debug("API原始返回结果: %.200s...", translated_text)
+                    if raw_output:
+                        return translated_text
 
                     # 处理返回的文本，尝试恢复段落结构
+                    postprocess_started = time.perf_counter()
                     processed_text = translated_text
 
                     # 删除可能的"段落X:"前缀
-                    logger.debug("正在处理译文，删除段落标记...")
+                    api_logger.debug("正在处理译文，删除段落标记...")
                     processed_text = re.sub(
                         r'^段落\d+[:：]\s*', '', processed_text, flags=re.MULTILINE)
 
@@ -238,24 +1197,24 @@ async def translate_with_deepseek_async(paragraphs, api_key, api_url, api_model,
                     raw_paragraphs = processed_text.split('\n')
                     non_empty_paragraphs = [
                         p for p in raw_paragraphs if p.strip()]
-                    logger.info(
-                        f"API返回段落处理: 总行数={len(raw_paragraphs)}, 非空行数={len(non_empty_paragraphs)}")
+                    api_logger.debug("API返回段落处理: 总行数=%d, 非空行数=%d",
+                                     len(raw_paragraphs), len(non_empty_paragraphs))
 
                     # 确保段落之间有换行符
                     if len(paragraphs) > 1 and "\n\n" not in processed_text and "\n" not in processed_text:
-                        logger.warning("翻译结果未包含段落分隔符，尝试使用原始段落数量分割...")
+                        api_logger.warning("翻译结果未包含段落分隔符，尝试使用原始段落数量分割...")
 
                         # 如果没有换行符，尝试按句子分割并重组为与原段落数相匹配的结构
                         sentences = re.split(
                             r'(?<=[。！？.!?])\s*', processed_text)
                         sentences = [s for s in sentences if s.strip()]
-                        logger.debug(f"分割得到 {len(sentences)} 个句子")
+                        api_logger.debug("分割得到 %d 个句子", len(sentences))
 
                         if len(sentences) >= len(paragraphs):
                             # 估算每个段落的句子数
                             sentences_per_para = max(
                                 1, len(sentences) // len(paragraphs))
-                            logger.debug(f"估算每个段落包含 {sentences_per_para} 个句子")
+                            api_logger.debug("估算每个段落包含 %d 个句子", sentences_per_para)
 
                             new_paragraphs = []
                             for i in range(0, len(sentences), sentences_per_para):
@@ -266,38 +1225,54 @@ async def translate_with_deepseek_async(paragraphs, api_key, api_url, api_model,
                             # 确保段落数量不超过原文
                             new_paragraphs = new_paragraphs[:len(paragraphs)]
                             processed_text = "\n\n".join(new_paragraphs)
-                            logger.info(
-                                f"重新格式化翻译结果为 {len(new_paragraphs)} 个段落")
+                            api_logger.info("重新格式化翻译结果为 %d 个段落", len(new_paragraphs))
 
                             # 记录重组后的段落
-                            for i, para in enumerate(new_paragraphs):
-                                logger.debug(f"重组后-段落{i+1}: {para[:50]}...")
+                            if trace_logger.isEnabledFor(logging.DEBUG):
+                                for i, para in enumerate(new_paragraphs):
+                                    trace_logger.debug("重组后-段落%d: %.50s...", i + 1, para)
                     else:
                         # 规范化段落分隔符
                         processed_text = re.sub(r'\n+', '\n\n', processed_text)
-                        logger.debug("使用规范化的段落分隔符处理文本")
+                        api_logger.debug("使用规范化的段落分隔符处理文本")
 
                     # 最终检查段落数量
                     final_paragraphs = [
                         p for p in processed_text.split('\n\n') if p.strip()]
-                    logger.info(
-                        f"最终段落数: {len(final_paragraphs)}, 原始段落数: {len(paragraphs)}")
+                    api_logger.debug("最终段落数: %d, 原始段落数: %d", len(final_paragraphs), len(paragraphs))
 
-                    for i, para in enumerate(final_paragraphs):
-                        logger.debug(f"最终-段落{i+1}: {para[:50]}...")
+                    if trace_logger.isEnabledFor(logging.DEBUG):
+                        for i, para in enumerate(final_paragraphs):
+                            trace_logger.debug("最终-段落%d: %.50s...", i + 1, para)
 
-                    preview = processed_text[:100] + "..." if len(
-                        processed_text) > 100 else processed_text
-                    logger.info(f"翻译成功，结果预览: {preview}")
+                    api_logger.debug("翻译成功，结果预览: %.100s", processed_text)
+                    metrics.observe('postprocess', time.perf_counter() - postprocess_started)
                     return processed_text
-        except Exception as e:
-            logger.error(f"翻译请求失败 (尝试 {attempt + 1}): {e}")
-            if attempt < retries - 1:
-                logger.info(f"等待 {delay} 秒后重试...")
-                await asyncio.sleep(delay)
-            else:
-                logger.error("所有重试都失败，跳过当前段落")
-                return ""
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.inc('api_timeouts')
+                    if limiter:
+                        limiter.record_throttle("请求超时")
+                error = e if isinstance(e, TranslationAPIError) else TranslationAPIError(
+                    f"{type(e).__name__}: {e}")
+                api_logger.error("翻译请求失败 (尝试 %d): %s", attempt + 1, error)
+                if not error.retryable:
+                    api_logger.error("错误不可重试，放弃当前请求")
+                    break
+                if attempt < retries - 1:
+                    wait = compute_backoff(attempt, delay, retry_after=error.retry_after)
+                    api_logger.info("等待 %.1f 秒后重试...", wait)
+                    metrics.inc('api_retries')
+                    with metrics.timer('retry_backoff'):
+                        await asyncio.sleep(wait)
+
+        api_logger.error("所有重试都失败，跳过当前段落")
+        if raise_on_failure:
+            raise error
+        return ""
+    finally:
+        if own_session:
+            await session.close()
 
 
 def translate_with_deepseek(paragraphs, api_key, api_url, api_model, temperature=0.3, retries=3, delay=2):
@@ -437,6 +1412,9 @@ def save_to_word_with_comparison(original_paragraphs, translated_texts, output_p
         # 确定实际可以构建的对照段落数量 - 使用最小值以避免索引越界
         usable_paragraphs = min(original_count, translated_count)
         paragraph_logger.info(f"将创建 {usable_paragraphs} 对翻译对照")
+        if original_count != translated_count:
+            logger.warning(f"原文与译文段落数不一致（{original_count} / {translated_count}），"
+                           f"{abs(original_count - translated_count)} 个段落无法对照")
         
         # 写入段落对照详细日志
         comparison_log_path = output_path.replace('.docx', '_段落对照.log')
@@ -490,6 +1468,190 @@ def save_to_word_with_comparison(original_paragraphs, translated_texts, output_p
         raise
 
 
+class StreamingDocumentWriter:
+    """按批次顺序把译文逐步追加到Word文档
+
+    批次完成后立即写入文档对象，并定期保存到临时文件（output_path.partial），
+    全部完成后再保存为正式的输出文件，避免前端把未完成的文档当作结果。
+    对照模式下逐批次对齐原文和译文，并同步写入段落对照日志。
+    """
+
+    def __init__(self, output_path, comparison_mode=False,
+                 checkpoint_interval=DEFAULT_CONFIG['checkpoint_interval']):
+        self.output_path = output_path
+        self.partial_path = f"{output_path}.partial"
+        self.comparison_mode = comparison_mode
+        self.checkpoint_interval = checkpoint_interval
+        self.paragraph_count = 0
+        self.batch_count = 0
+        self._last_checkpoint = time.time()
+        self.doc = Document()
+        self.comparison_log = None
+
+        if comparison_mode:
+            self.doc.add_heading('翻译对照文档', 0)
+            comparison_log_path = output_path.replace('.docx', '_段落对照.log')
+            self.comparison_log = open(comparison_log_path, 'w', encoding='utf-8')
+            self.comparison_log.write("===== 段落对照详细日志 =====\n\n")
+
+    def add_batch(self, original_paragraphs, translated_text):
+        """追加一个批次的翻译结果"""
+        translated_paragraphs = [p.strip() for p in translated_text.split('\n') if p.strip()]
+        self.batch_count += 1
+
+        if not self.comparison_mode:
+            for para in translated_paragraphs:
+                self.doc.add_paragraph(para)
+            self.paragraph_count += len(translated_paragraphs)
+            return
+
+        usable_paragraphs = min(len(original_paragraphs), len(translated_paragraphs))
+        log_file = self.comparison_log
+        for i in range(usable_paragraphs):
+            number = self.paragraph_count + 1
+            # 添加分隔线（第一段之前不加）
+            if self.paragraph_count:
+                self.doc.add_paragraph('---')
+            original = original_paragraphs[i]
+            self.doc.add_heading(f'段落 {number} - 原文', level=2)
+            self.doc.add_paragraph(original)
+            self.doc.add_heading(f'段落 {number} - 译文', level=2)
+            self.doc.add_paragraph(translated_paragraphs[i])
+            self.paragraph_count += 1
+
+            log_file.write(f"------ 段落 {number} ------\n")
+            log_file.write(f"原文: {original}\n\n")
+            log_file.write(f"译文: {translated_paragraphs[i]}\n\n")
+
+        # 记录本批次未匹配的原文或多余的译文
+        for i in range(usable_paragraphs, len(original_paragraphs)):
+            log_file.write(f"未翻译段落 (批次{self.batch_count}): {original_paragraphs[i]}\n\n")
+        for i in range(usable_paragraphs, len(translated_paragraphs)):
+            log_file.write(f"多余译文段落 (批次{self.batch_count}): {translated_paragraphs[i]}\n\n")
+
+    def checkpoint_due(self):
+        return time.time() - self._last_checkpoint >= self.checkpoint_interval
+
+    def checkpoint(self):
+        """把当前已写入的内容保存到临时文件"""
+        self.doc.save(self.partial_path)
+        self._last_checkpoint = time.time()
+        logger.info(f"已保存中间结果: {self.partial_path} ({self.paragraph_count} 个段落)")
+
+    def abandon(self):
+        """任务出错中止：已写入的译文只保存到临时文件，不生成最终文档"""
+        if self.comparison_log:
+            self.comparison_log.close()
+            self.comparison_log = None
+        if self.paragraph_count:
+            self.checkpoint()
+
+    def close(self):
+        """保存最终文档，没有任何译文时返回False"""
+        if self.comparison_log:
+            self.comparison_log.write(f"\n实际对照段落数: {self.paragraph_count}\n")
+            self.comparison_log.close()
+            self.comparison_log = None
+
+        if not self.paragraph_count:
+            return False
+
+        self.doc.save(self.output_path)
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+        logger.info(f"成功保存翻译结果到: {self.output_path}")
+        logger.info(f"文档包含 {self.paragraph_count} 个翻译段落")
+        return True
+
+
+# 中日韩字符（粗略估算token时按每字1个token计）
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """粗略估算文本的token数：中日韩字符每字约1个token，其余字符约4个字符1个token"""
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class FixedCountBatcher:
+    """按固定段落数组成批次（原有的batch_size方式）"""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self._current = []
+
+    def add(self, paragraph):
+        """加入一个段落，返回已装满的批次列表"""
+        self._current.append(paragraph)
+        if len(self._current) >= self.batch_size:
+            batch, self._current = self._current, []
+            return [batch]
+        return []
+
+    def flush(self):
+        """返回剩余未满的批次（可能为空列表）"""
+        batch, self._current = self._current, []
+        return [batch] if batch else []
+
+
+class TokenBudgetBatcher:
+    """按估算的token数装箱组成批次
+
+    段落长度差异很大时，按段落数分批会让有的请求很小、有的接近模型输出上限而被截断。
+    这里累计每个段落的输入token（含段落标记的开销）和预计输出token，
+    任一预算将被超出时就开始新批次；单个段落超出预算时单独成批。
+    """
+
+    # 每个段落的“段落N: ”标记和换行的token开销
+    PARAGRAPH_OVERHEAD = 4
+
+    def __init__(self, max_input_tokens=DEFAULT_CONFIG['max_input_tokens'],
+                 max_output_tokens=DEFAULT_CONFIG['max_output_tokens'],
+                 output_ratio=DEFAULT_CONFIG['token_output_ratio'],
+                 max_paragraphs=DEFAULT_CONFIG['max_batch_paragraphs']):
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.output_ratio = output_ratio
+        self.max_paragraphs = max_paragraphs
+        self._current = []
+        self._input_tokens = 0
+        self._output_tokens = 0
+
+    def add(self, paragraph):
+        """加入一个段落，返回因预算已满而完成的批次列表"""
+        input_tokens = estimate_tokens(paragraph) + self.PARAGRAPH_OVERHEAD
+        output_tokens = int(input_tokens * self.output_ratio)
+        batches = []
+
+        if self._current and (
+                self._input_tokens + input_tokens > self.max_input_tokens
+                or self._output_tokens + output_tokens > self.max_output_tokens
+                or len(self._current) >= self.max_paragraphs):
+            batches = self.flush()
+
+        self._current.append(paragraph)
+        self._input_tokens += input_tokens
+        self._output_tokens += output_tokens
+        return batches
+
+    def flush(self):
+        """返回剩余的批次（可能为空列表）"""
+        batch, self._current = self._current, []
+        self._input_tokens = self._output_tokens = 0
+        return [batch] if batch else []
+
+
+def create_batcher(batching='tokens', batch_size=DEFAULT_CONFIG['batch_size'],
+                   max_input_tokens=None, max_output_tokens=None):
+    """根据组批方式创建批次生成器，token预算未指定时使用默认配置"""
+    if batching == 'count':
+        return FixedCountBatcher(batch_size)
+    return TokenBudgetBatcher(
+        max_input_tokens or DEFAULT_CONFIG['max_input_tokens'],
+        max_output_tokens or DEFAULT_CONFIG['max_output_tokens'])
+
+
 def split_text_into_batches(text, batch_size):
     """将文本分割成多个批次"""
     paragraphs = text.split("\n\n")
@@ -531,179 +1693,1144 @@ def split_paragraphs_optimized(text, min_length=50):
     return optimized_paragraphs
 
 
+class SentenceSegmenter:
+    """增量式句子分割器
+
+    文本可以分多次输入（例如逐页输入），每次返回已经可以确定的完整段落，
+    跨页的句子会保留在缓冲区中，与下一次输入的文本拼接后继续分割。
+
+    单次扫描：正则只匹配候选断点（句末标点后跟非小写字母开头的下一句），
+    已扫描过的文本不会重复扫描；句子和段落在内部以偏移量表示，只在输出段落时切片一次。
+    以下情况不视为句子结束：常见缩写（e.g.、Dr.、Fig.等）、单个大写字母的姓名缩写、
+    句号后下一个字符为小写字母（小数如3.5本身不会被匹配）。
+    段落在满sentences_per_paragraph句、遇到空行，或句末标点位于行尾且该行明显短于上一行
+    （段落的最后一行）时结束。输出的段落去掉首尾空白，段落内PDF的换行替换为空格。
+    """
+
+    # 候选断点：句末标点（可跟右引号或右括号）后的空白之后是非小写字母。
+    # 三种标点各用一个以该字符开头的正则查找：以字面字符开头时正则引擎可以直接跳到该字符，
+    # 比以字符集[.!?]开头的正则快数倍
+    BOUNDARIES = tuple(re.compile(re.escape(mark) + r'[.!?]*["\'”’)\]]*(?=\s+[^\sa-z])')
+                       for mark in '.!?')
+    BLANK_LINE = re.compile(r'\n[ \t]*\n')
+    # 缓冲区末尾暂时无法判断的字符（标点、引号和空白），下次输入后从这里继续扫描
+    PENDING_CHARS = frozenset('.!?"\'”’)] \t\n')
+    NON_SPACE = re.compile(r'\S')
+    LINE = re.compile(r'\S(?:[^\n]*\S)?')
+    # 缩写前可能出现的左括号和左引号
+    OPENING_CHARS = '("\'“‘['
+    # 句号后不断句的缩写（小写，不含末尾句号）
+    ABBREVIATIONS = frozenset({
+        'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'mt', 'rev', 'gen', 'col', 'capt', 'lt',
+        'gov', 'sen', 'rep', 'vs', 'cf', 'viz', 'ca', 'approx', 'e.g', 'i.e', 'al', 'fig', 'figs',
+        'eq', 'eqs', 'ref', 'refs', 'no', 'nos', 'vol', 'vols', 'ch', 'sec', 'p', 'pp', 'ed', 'eds',
+        'dept', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+    })
+
+    def __init__(self, sentences_per_paragraph=4,
+                 short_line_ratio=DEFAULT_CONFIG['paragraph_short_line_ratio']):
+        self.sentences_per_paragraph = sentences_per_paragraph
+        self.short_line_ratio = short_line_ratio
+        self.sentence_count = 0
+        self._buffer = ""
+        self._offset = 0  # 缓冲区开头在全部输入中的偏移
+        self._scan_pos = 0  # 以下位置均为缓冲区内的偏移
+        self._paragraph_start = 0
+        self._sentence_start = 0
+        self._sentences = 0  # 当前段落已有的句子数
+        self._found_break = False
+
+    def feed(self, chunk):
+        """输入一段文本，返回其中已完整的段落"""
+        return self._texts(self._scan(chunk, final=False))
+
+    def finish(self):
+        """输入结束，返回剩余的段落"""
+        return self._texts(self._scan("", final=True))
+
+    def feed_spans(self, chunk):
+        """与feed相同，但返回段落在全部输入中的(起点, 终点)偏移，不复制文本"""
+        return self._spans(self._scan(chunk, final=False))
+
+    def finish_spans(self):
+        return self._spans(self._scan("", final=True))
+
+    def _texts(self, spans):
+        buffer = self._buffer
+        paragraphs = [buffer[start:end].strip().replace('\n', ' ') for start, end in spans]
+        self._trim()
+        return paragraphs
+
+    def _spans(self, spans):
+        """去掉段落首尾的空白，并换算为全部输入中的偏移"""
+        buffer = self._buffer
+        offset = self._offset
+        stripped = []
+        for start, end in spans:
+            start = self.NON_SPACE.search(buffer, start, end).start()
+            while buffer[end - 1].isspace():
+                end -= 1
+            stripped.append((offset + start, offset + end))
+        self._trim()
+        return stripped
+
+    def _trim(self):
+        """丢弃已输出段落的文本
+
+        保留当前段落起点所在行和上一行的完整文本，使判断段落最后一行时比较的行长
+        与一次输入全部文本时相同，分多次输入的结果不受分块位置影响。
+        """
+        line_start = self._buffer.rfind('\n', 0, self._paragraph_start)
+        cut = self._buffer.rfind('\n', 0, line_start) + 1 if line_start > 0 else 0
+        if cut:
+            self._buffer = self._buffer[cut:]
+            self._offset += cut
+            self._scan_pos -= cut
+            self._sentence_start -= cut
+            self._paragraph_start -= cut
+
+    def _scan(self, chunk, final):
+        if chunk:
+            self._buffer += chunk.replace('\r\n', '\n')
+        buffer = self._buffer
+        spans = []
+        position = self._scan_pos
+        # 热循环中使用局部变量，结束后写回
+        rfind = buffer.rfind
+        blank_line = self.BLANK_LINE.search
+        abbreviations = self.ABBREVIATIONS
+        opening_chars = self.OPENING_CHARS
+        short_line_ratio = self.short_line_ratio
+        limit = self.sentences_per_paragraph
+        sentences = self._sentences
+        sentence_start = self._sentence_start
+        paragraph_start = self._paragraph_start
+        # 下一个空行的位置，没有空行时不必在每个断点处查找
+        next_blank = blank_line(buffer, sentence_start)
+        count = 0
+
+        period, exclamation, question = self.BOUNDARIES
+        candidates = [match.span() for match in period.finditer(buffer, position)]
+        for pattern in (exclamation, question):
+            others = [match.span() for match in pattern.finditer(buffer, position)]
+            if others:
+                candidates = sorted(candidates + others)
+
+        for start, end in candidates:
+            if end <= position:
+                continue  # “?!”等连续标点会被多个正则匹配到，同一个断点只处理一次
+            position = end
+            if buffer[start] == '.' and buffer[start + 1] not in '.!?':
+                # 句号前的单词是缩写或单个大写字母（姓名缩写，如 J. K. Rowling）时不断句；
+                # 缩写连同左括号最多7个字符，前8个字符内没有空白说明是普通单词
+                low = start - 8 if start > 8 else 0
+                word_start = max(rfind(' ', low, start), rfind('\n', low, start))
+                if word_start >= 0 or not low:
+                    word = buffer[word_start + 1:start].lstrip(opening_chars)
+                    if (len(word) == 1 and word.isupper() and word != 'I') or word.lower() in abbreviations:
+                        continue
+
+            if next_blank is not None and next_blank.start() < start:
+                # 句子中间有空行（少见）：先在空行处结束段落
+                self._sentences, self._sentence_start, self._paragraph_start = (
+                    sentences, sentence_start, paragraph_start)
+                self._end_blank_lines(start, spans)
+                sentences, sentence_start, paragraph_start = (
+                    self._sentences, self._sentence_start, self._paragraph_start)
+                next_blank = blank_line(buffer, sentence_start)
+
+            sentences += 1
+            count += 1
+            sentence_start = position
+            paragraph_end = False
+            if buffer[position] == '\n':
+                # 句末标点位于行尾：该行明显短于上一行时视为段落的最后一行
+                line_start = rfind('\n', 0, start) + 1
+                if line_start:
+                    previous_start = rfind('\n', 0, line_start - 1) + 1
+                    paragraph_end = position - line_start < short_line_ratio * (line_start - 1 - previous_start)
+            if paragraph_end or sentences >= limit:
+                spans.append((paragraph_start, position))
+                paragraph_start = position
+                sentences = 0
+
+        self._sentences = sentences
+        self._sentence_start = sentence_start
+        self._paragraph_start = paragraph_start
+        self.sentence_count += count
+        if count:
+            self._found_break = True
+
+        if not final:
+            pending = len(buffer)
+            while pending > position and buffer[pending - 1] in self.PENDING_CHARS:
+                pending -= 1
+            self._scan_pos = pending
+            return spans
+
+        # 输入结束
+        self._end_blank_lines(len(buffer), spans)
+        if self._found_break:
+            self._end_sentence(len(buffer), spans)
+        else:
+            # 如果没找到句子断点，使用换行符作为备选
+            logger.warning("未检测到有效句子断点，尝试使用换行符分割...")
+            lines = [line.span() for line in self.LINE.finditer(buffer, self._paragraph_start)]
+            spans.extend(lines)
+            self._paragraph_start = len(buffer)
+            logger.info(f"使用换行符分割结果: {len(lines)} 行")
+        self._scan_pos = len(buffer)
+        return spans
+
+    def _end_blank_lines(self, end, spans):
+        """当前句子开头到end之间的每个空行处，句子和段落都结束"""
+        blank = self.BLANK_LINE.search(self._buffer, self._sentence_start, end)
+        while blank:
+            self._found_break = True
+            self._end_sentence(blank.start(), spans)
+            self._sentence_start = self._paragraph_start = blank.end()
+            blank = self.BLANK_LINE.search(self._buffer, self._sentence_start, end)
+
+    def _end_sentence(self, end, spans):
+        """在end处结束当前句子（为空时不计）和当前段落"""
+        if self.NON_SPACE.search(self._buffer, self._sentence_start, end):
+            self._sentences += 1
+            self.sentence_count += 1
+        if self._sentences:
+            spans.append((self._paragraph_start, end))
+        self._sentence_start = self._paragraph_start = end
+        self._sentences = 0
+
+
 def split_paragraphs_by_sentences(text, sentences_per_paragraph=4):
-    """根据句号分割文本，并按照指定规则形成段落
+    """根据句末标点分割文本，并按照指定规则形成段落
 
     规则：
-    1. 以句号（.）作为句子的基本断点
-    2. 如果句号后面紧跟换行符，则该句子单独成为一个段落
-    3. 否则，按照每四句一个段落进行分组
+    1. 以句号、问号、感叹号作为句子的基本断点（跳过缩写和姓名缩写）
+    2. 遇到空行，或句子结束在一行末尾且该行明显短于上一行时，段落结束
+    3. 否则，按照每四句（sentences_per_paragraph）一个段落进行分组
     """
     logger.info("使用基于句号的段落分割逻辑...")
 
-    # 预处理文本，规范化换行符
-    text = text.replace('\r\n', '\n')
-
-    # 定义英文句子结束的模式：句号、问号或感叹号，后跟空格或换行
-    sentence_end_pattern = r'[.!?][\s\n]'
-
-    # 查找所有可能的句子断点
-    sentence_breaks = []
-    for match in re.finditer(sentence_end_pattern, text):
-        sentence_breaks.append(match.end() - 1)  # 减1是为了指向空格或换行符前的标点
-
-    # 如果没找到句子断点，尝试使用换行符作为备选
-    if not sentence_breaks:
-        logger.warning("未检测到有效句子断点，尝试使用换行符分割...")
-        lines = text.split('\n')
-        filtered_lines = [line.strip() for line in lines if line.strip()]
-        logger.info(f"使用换行符分割结果: {len(filtered_lines)} 行")
-        return filtered_lines
-
-    # 根据句子断点分割文本
-    sentences = []
-    prev_end = 0
-
-    for end in sentence_breaks:
-        # 从上一个断点到当前断点形成一个句子
-        sentence = text[prev_end:end + 1].strip()
-        if sentence:
-            sentences.append(sentence)
-        prev_end = end + 1
-
-    # 添加最后一部分（如果有）
-    if prev_end < len(text):
-        last_sentence = text[prev_end:].strip()
-        if last_sentence:
-            sentences.append(last_sentence)
-
-    logger.info(f"检测到 {len(sentences)} 个句子")
-
-    # 形成段落
-    paragraphs = []
-    current_paragraph = []
-
-    for sentence in sentences:
-        current_paragraph.append(sentence)
-
-        # 如果句子结尾有换行符，或者已经达到指定的句子数量，则形成一个段落
-        if sentence.endswith('\n') or len(current_paragraph) >= sentences_per_paragraph:
-            paragraph_text = ' '.join(current_paragraph).strip()
-            if paragraph_text:
-                paragraphs.append(paragraph_text)
-            current_paragraph = []
-
-    # 处理剩余的句子（如果有）
-    if current_paragraph:
-        paragraph_text = ' '.join(current_paragraph).strip()
-        if paragraph_text:
-            paragraphs.append(paragraph_text)
+    segmenter = SentenceSegmenter(sentences_per_paragraph)
+    paragraphs = segmenter.feed(text) + segmenter.finish()
 
+    logger.info(f"检测到 {segmenter.sentence_count} 个句子")
     logger.info(f"生成了 {len(paragraphs)} 个段落")
+    return paragraphs
 
-    # 过滤空段落并返回
-    result = [p for p in paragraphs if p.strip()]
-    return result
 
+def paragraph_spans(text, sentences_per_paragraph=4):
+    """与split_paragraphs_by_sentences的规则相同，返回各段落在text中的(起点, 终点)偏移"""
+    segmenter = SentenceSegmenter(sentences_per_paragraph)
+    return segmenter.feed_spans(text) + segmenter.finish_spans()
 
-async def translate_batch_async(batch, api_key, api_url, api_model, semaphore, progress_data, progress_file):
-    """异步翻译一个批次的段落"""
-    async with semaphore:
+
+def iter_paragraph_chunks(pages, sentences_per_paragraph=4, metrics=NULL_METRICS):
+    """对逐页输入的文本增量分段，每输入一页生成一个段落列表（可能为空），最后生成剩余的段落
+
+    metrics分别记录取得每页文本（extract）和分段（segment）的耗时。
+    """
+    segmenter = SentenceSegmenter(sentences_per_paragraph)
+    try:
+        while True:
+            with metrics.timer('extract'):
+                page_text = next(pages, None)
+            if page_text is None:
+                break
+            metrics.inc('pages')
+            with metrics.timer('segment'):
+                paragraphs = segmenter.feed(page_text + "\n")
+            yield paragraphs
+        with metrics.timer('segment'):
+            paragraphs = segmenter.finish()
+        yield paragraphs
+    finally:
+        pages.close()
+
+
+class DocumentCache:
+    """按PDF文件内容缓存页面文本和分段结果
+
+    以文件内容的SHA-256为键，页面文本和每种分段参数（每段句子数）的分段结果
+    各保存为一个gzip压缩的JSON Lines文件（每行一个字符串），另有一个小的元数据文件
+    记录页数和段落数。预览、启动翻译和翻译流水线都从这里读取，同一个文件只提取一次。
+    版面提取模式（page_filter）去除页眉页脚后的页面文本和分段结果另外保存（前缀layout-），
+    去除的行数和字符数记录在元数据中，读取缓存时同样可以报告。
+    缓存在提取过程中边生成边写入临时文件，全部完成后才替换为正式文件，
+    中途失败或被取消时不会留下不完整的缓存。
+    """
+
+    # 文件哈希的进程内缓存：{(绝对路径, 大小, 修改时间): 哈希值}
+    _hashes = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir=DEFAULT_CONFIG['document_cache_dir']):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def file_hash(cls, pdf_path):
+        """计算文件内容的SHA-256，文件未改动时复用上次的结果"""
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+        with cls._lock:
+            digest = cls._hashes.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(pdf_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            with cls._lock:
+                cls._hashes[key] = digest
+        return digest
+
+    @classmethod
+    def remember_hash(cls, pdf_path, digest):
+        """记录已知的文件哈希（例如上传时边接收边计算的），之后的file_hash不再读取文件"""
+        stat = os.stat(pdf_path)
+        with cls._lock:
+            cls._hashes[(os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)] = digest
+
+    def _path(self, digest, kind):
+        return os.path.join(self.cache_dir, f"{digest}.v{DOCUMENT_CACHE_VERSION}.{kind}")
+
+    @staticmethod
+    def _pages_kind(page_filter=None):
+        return "layout-pages" if page_filter else "pages"
+
+    @staticmethod
+    def _segments_kind(sentences_per_paragraph, page_filter=None):
+        return f"layout-s{sentences_per_paragraph}" if page_filter else f"s{sentences_per_paragraph}"
+
+    def _restore_removed(self, digest, page_filter):
+        """从元数据恢复版面提取时去除的行数和字符数"""
+        removed = self._read_meta(digest).get('layout-removed')
+        if page_filter and removed:
+            page_filter.removed_lines, page_filter.removed_chars = removed
+
+    def _read_meta(self, digest):
         try:
-            # 记录批次信息用于调试
-            batch_info = f"批次索引: {progress_data.get('batch_index', 'N/A')}, 批次大小: {len(batch)}"
-            logger.info(f"开始处理{batch_info}")
+            with open(self._path(digest, 'json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _update_meta(self, digest, **values):
+        with self._lock:
+            meta = self._read_meta(digest)
+            meta.update(values)
+            path = self._path(digest, 'json')
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, path)
+
+    @staticmethod
+    def _read(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _store(self, digest, kind, chunks):
+        """边转发chunks（字符串列表）边写入缓存，全部写完后记录条数到元数据"""
+        path = self._path(digest, f"{kind}.jsonl.gz")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        count = 0
+        completed = False
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+                for chunk in chunks:
+                    f.writelines(json.dumps(item, ensure_ascii=False) + "\n" for item in chunk)
+                    count += len(chunk)
+                    yield chunk
+            os.replace(tmp_path, path)
+            completed = True
+            self._update_meta(digest, **{kind: count})
+        finally:
+            chunks.close()
+            if not completed and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def read_pages(self, pdf_path, max_pages=None, first_page=0, page_filter=None):
+        """返回(总页数, 第first_page页到第max_pages页之前的文本)，页码从0开始，未缓存时返回None
+
+        page_filter不为None时读取版面提取模式（去除页眉页脚后）的页面文本。
+        """
+        digest = self.file_hash(pdf_path)
+        path = self._path(digest, f"{self._pages_kind(page_filter)}.jsonl.gz")
+        total_pages = self._read_meta(digest).get(self._pages_kind(page_filter))
+        if total_pages is None or not os.path.exists(path):
+            return None
+        pages = []
+        for page_index, page_text in enumerate(self._read(path)):
+            if max_pages is not None and page_index >= max_pages:
+                break
+            if page_index >= first_page:
+                pages.append(page_text)
+        return total_pages, pages
+
+    def paragraph_count(self, pdf_path, sentences_per_paragraph=4, page_filter=None):
+        """返回已缓存的分段结果中的段落数，未缓存时返回None"""
+        digest = self.file_hash(pdf_path)
+        return self._read_meta(digest).get(self._segments_kind(sentences_per_paragraph, page_filter))
+
+    def iter_pages(self, pdf_path, workers=None, page_filter=None):
+        """逐页生成文本：有缓存时读取缓存，否则提取PDF并同时写入缓存"""
+        digest = self.file_hash(pdf_path)
+        kind = self._pages_kind(page_filter)
+        path = self._path(digest, f"{kind}.jsonl.gz")
+        if os.path.exists(path):
+            logger.info(f"从文档缓存读取页面文本: {os.path.basename(pdf_path)}")
+            self._restore_removed(digest, page_filter)
+            yield from self._read(path)
+            return
+        pages = iter_pdf_pages(pdf_path, workers, page_filter)
+        for chunk in self._store(digest, kind, ([page_text] for page_text in pages)):
+            yield chunk[0]
+        if page_filter:
+            self._update_meta(digest, **{'layout-removed': [page_filter.removed_lines, page_filter.removed_chars]})
+
+    def prefetch(self, pdf_path, sentences_per_paragraph=4, workers=None, page_filter=None):
+        """提取并分段（未缓存时）写入缓存，返回段落数；供批量翻译在后台预先提取下一个文档"""
+        count = self.paragraph_count(pdf_path, sentences_per_paragraph, page_filter)
+        if count is None:
+            count = sum(len(chunk) for chunk in self.iter_paragraph_chunks(
+                pdf_path, sentences_per_paragraph, workers, page_filter=page_filter))
+        return count
+
+    def iter_paragraph_chunks(self, pdf_path, sentences_per_paragraph=4, workers=None, metrics=NULL_METRICS,
+                              page_filter=None):
+        """按块生成段落列表：有缓存时读取缓存，否则（从缓存的页面文本或PDF）分段并同时写入缓存"""
+        digest = self.file_hash(pdf_path)
+        kind = self._segments_kind(sentences_per_paragraph, page_filter)
+        path = self._path(digest, f"{kind}.jsonl.gz")
+        if os.path.exists(path):
+            logger.info(f"从文档缓存读取分段结果: {os.path.basename(pdf_path)}（每段 {sentences_per_paragraph} 句）")
+            self._restore_removed(digest, page_filter)
+            paragraphs = self._read(path)
+            chunk_size = DEFAULT_CONFIG['document_cache_chunk']
+            while True:
+                with metrics.timer('document_cache_read'):
+                    chunk = [p for _, p in zip(range(chunk_size), paragraphs)]
+                if not chunk:
+                    return
+                yield chunk
+        chunks = iter_paragraph_chunks(self.iter_pages(pdf_path, workers, page_filter), sentences_per_paragraph,
+                                       metrics)
+        yield from self._store(digest, kind, chunks)
+
+
+class TranslationMemory:
+    """基于SQLite的持久化翻译记忆
+
+    以（规范化原文、模型、温度、提示词版本）的哈希值为键保存单个段落的译文，
+    同一本书换参数重译或他人上传相同PDF时可直接复用，不再调用API。
+    超过保存天数或总条数上限的条目会被淘汰（按最近使用时间）。
+    """
 
-            # 记录原文内容，便于调试
-            batch_idx = progress_data.get('batch_index', 'unknown')
-            for i, para in enumerate(batch):
-                logger.debug(f"[批次{batch_idx}-段落{i}] 原文: {para[:100]}...")
+    def __init__(self, db_path, max_entries=DEFAULT_CONFIG['cache_max_entries'],
+                 max_age_days=DEFAULT_CONFIG['cache_max_age_days']):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS memory ("
+            "key TEXT PRIMARY KEY, translation TEXT NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_memory_last_used ON memory(last_used)")
+        self.conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(text, model, temperature):
+        """计算段落的缓存键，原文中的空白字符会被规范化"""
+        normalized = ' '.join(text.split())
+        raw = f"{PROMPT_VERSION}\x1f{model}\x1f{float(temperature):.3f}\x1f{normalized}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, paragraphs, model, temperature):
+        """查询一批段落，返回 {段落下标: 译文}"""
+        keys = [self.make_key(p, model, temperature) for p in paragraphs]
+        placeholders = ','.join('?' * len(keys))
+        rows = self.conn.execute(
+            f"SELECT key, translation FROM memory WHERE key IN ({placeholders})", keys).fetchall()
+        found = dict(rows)
+
+        if found:
+            self.conn.execute(
+                f"UPDATE memory SET last_used = ? WHERE key IN ({placeholders})",
+                [time.time()] + list(found))
+            self.conn.commit()
+
+        result = {i: found[key] for i, key in enumerate(keys) if key in found}
+        self.hits += len(result)
+        self.misses += len(keys) - len(result)
+        return result
+
+    def store(self, paragraphs, translations, model, temperature):
+        """保存一一对应的原文与译文"""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO memory (key, translation, created, last_used) VALUES (?, ?, ?, ?)",
+            [(self.make_key(p, model, temperature), t, now, now)
+             for p, t in zip(paragraphs, translations)])
+        self.conn.commit()
+
+    def evict(self):
+        """淘汰过期条目，并将总条数控制在上限以内"""
+        cutoff = time.time() - self.max_age_days * 86400
+        removed = self.conn.execute(
+            "DELETE FROM memory WHERE created < ?", (cutoff,)).rowcount
+        count = self.conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+        if count > self.max_entries:
+            removed += self.conn.execute(
+                "DELETE FROM memory WHERE key IN "
+                "(SELECT key FROM memory ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)).rowcount
+        self.conn.commit()
+        if removed:
+            logger.info(f"翻译记忆淘汰了 {removed} 条记录")
+        return removed
+
+    def close(self):
+        self.evict()
+        self.conn.close()
+
+
+class ProgressTracker:
+    """进程内的翻译进度记录器
+
+    已完成的段落记录在位图中，标记和查询都是O(1)；进度由定时任务原子地写入磁盘
+    （先写临时文件再替换），翻译批次之间不再争抢文件锁。
+
+    进度文件格式：第一行是JSON摘要（总数、已完成数及各项计数），
+    第二行是base64编码的位图。读取进度时只需解析第一行，见read_progress_summary。
+    metrics启用时，推送给on_update的状态中附带指标摘要（metrics字段，不写入进度文件）。
+    """
 
-            # 执行翻译
-            translated_text = await translate_with_deepseek_async(
-                batch, api_key, api_url, api_model
-            )
+    def __init__(self, progress_file=None, flush_interval=DEFAULT_CONFIG['progress_flush_interval'],
+                 load=True, on_update=None, metrics=NULL_METRICS):
+        self.progress_file = progress_file
+        self.flush_interval = flush_interval
+        self.on_update = on_update
+        self.metrics = metrics
+        self.summary = {'total': 0, 'completed': 0, 'segmenting': False}
+        self._bitmap = bytearray()
+        self._dirty = False
+        if load and progress_file and os.path.exists(progress_file):
+            self._load()
+        # 用于计算本次运行的速度（恢复任务时不计入之前已完成的段落）
+        self._started = time.monotonic()
+        self._completed_at_start = self.completed
+
+    def _load(self):
+        try:
+            with open(self.progress_file, 'r', encoding='utf-8') as f:
+                summary = json.loads(f.readline())
+                bitmap_line = f.readline().strip()
+        except (OSError, ValueError):
+            logger.warning("进度文件损坏或无法读取，创建新的进度文件")
+            return
+
+        if 'processed' in summary:
+            # 兼容旧版本的进度文件（processed为段落索引列表）
+            self.mark_done(summary.pop('processed'))
+        else:
+            self._bitmap = bytearray(base64.b64decode(bitmap_line)) if bitmap_line else bytearray()
+            self.summary['completed'] = sum(bin(byte).count('1') for byte in self._bitmap)
+        summary['completed'] = self.summary['completed']
+        self.summary.update(summary)
+        logger.info(f"已加载翻译进度，已处理 {self.completed} 个段落")
+
+    @property
+    def total(self):
+        return self.summary['total']
+
+    @property
+    def completed(self):
+        return self.summary['completed']
+
+    def is_done(self, index):
+        byte = index >> 3
+        return byte < len(self._bitmap) and bool(self._bitmap[byte] & (1 << (index & 7)))
+
+    def mark_done(self, indices):
+        """标记段落已完成，返回新增的完成数"""
+        added = 0
+        for index in indices:
+            byte = index >> 3
+            if byte >= len(self._bitmap):
+                self._bitmap.extend(bytes(byte + 1 - len(self._bitmap)))
+            bit = 1 << (index & 7)
+            if not self._bitmap[byte] & bit:
+                self._bitmap[byte] |= bit
+                added += 1
+        if added:
+            self.summary['completed'] += added
+            self._dirty = True
+        return added
+
+    def set_total(self, total, segmenting=False):
+        self.summary['total'] = total
+        self.summary['segmenting'] = segmenting
+        self._dirty = True
+
+    def update(self, **values):
+        """设置摘要中的其他字段（如batch_size）"""
+        self.summary.update(values)
+        self._dirty = True
+
+    def add_counter(self, name, amount=1):
+        """累加摘要中的计数（如cache_hits）"""
+        self.summary[name] = self.summary.get(name, 0) + amount
+        self._dirty = True
+
+    def percentage(self):
+        return (self.completed / self.total) * 100 if self.total > 0 else 0
+
+    def snapshot(self):
+        """返回进度摘要的副本，附带本次运行的速度（段落/秒）和预计剩余时间（秒）"""
+        state = dict(self.summary)
+        elapsed = time.monotonic() - self._started
+        done = self.completed - self._completed_at_start
+        throughput = done / elapsed if elapsed > 0 else 0.0
+        state['throughput'] = round(throughput, 3)
+        state['eta_seconds'] = round((self.total - self.completed) / throughput, 1) if throughput > 0 else None
+        if self.metrics.enabled:
+            state['metrics'] = self.metrics.snapshot()
+        return state
+
+    def flush(self, force=False):
+        """把进度原子地写入磁盘，并把最新状态推送给on_update回调"""
+        if not (self._dirty or force):
+            return
+        if self.progress_file:
+            with self.metrics.timer('progress_flush'):
+                temp_path = f"{self.progress_file}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(self.summary))
+                    f.write('\n')
+                    f.write(base64.b64encode(bytes(self._bitmap)).decode('ascii'))
+                    f.write('\n')
+                os.replace(temp_path, self.progress_file)
+        self._dirty = False
+        if self.on_update:
+            self.on_update(self.snapshot())
+
+    async def run_flusher(self):
+        """定时写盘的后台任务，取消时最后写一次"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                self.flush()
+        finally:
+            self.flush()
+
+
+def read_progress_summary(progress_file):
+    """只读取进度文件第一行的摘要，不解析位图"""
+    with open(progress_file, 'r', encoding='utf-8') as f:
+        summary = json.loads(f.readline())
+    if 'processed' in summary:
+        # 旧版本的进度文件
+        summary['completed'] = len(summary.pop('processed'))
+    return summary
+
+
+def failure_reason(ok, summary):
+    """main_async没有生成文档时的错误说明，summary为进度摘要"""
+    if summary.get('extraction_error'):
+        return f"PDF提取失败: {summary['extraction_error']}"
+    return "PDF文本提取失败" if not ok else "没有生成翻译结果"
+
+
+async def translate_with_bisection(paragraphs, offsets, api_key, api_url, api_model, temperature, session,
+                                   request_options, dead_letters):
+    """翻译一组段落，失败时二分拆分后分别重试
+
+    offsets为各段落在批次中的位置。返回[(offsets, 译文)]列表，
+    每一项对应一次成功的请求；单个段落仍然失败（或错误与内容无关，拆分无意义）时，
+    把这些段落记录到dead_letters中，不再拖累同批次的其他段落。
+    """
+    try:
+        text = await translate_with_deepseek_async(
+            paragraphs, api_key, api_url, api_model, temperature, session=session,
+            raise_on_failure=True, raw_output=True, **request_options
+        )
+        if not text.strip():
+            raise TranslationAPIError("API返回空译文")
+        return [(offsets, text)]
+    except TranslationAPIError as e:
+        if len(paragraphs) > 1 and e.bisectable:
+            half = len(paragraphs) // 2
+            batch_logger.warning("%d 个段落翻译失败 (%s)，拆分为 %d + %d 个段落重试",
+                                 len(paragraphs), e, half, len(paragraphs) - half)
+            first = await translate_with_bisection(
+                paragraphs[:half], offsets[:half], api_key, api_url, api_model, temperature, session,
+                request_options, dead_letters)
+            second = await translate_with_bisection(
+                paragraphs[half:], offsets[half:], api_key, api_url, api_model, temperature, session,
+                request_options, dead_letters)
+            return first + second
+
+        for offset, para in zip(offsets, paragraphs):
+            batch_logger.error("段落翻译失败，记录到失败队列: %.50s...", para)
+            dead_letters.append({'offset': offset, 'paragraph': para, 'status': e.status, 'error': str(e)})
+        return []
+
+
+TRANSLATION_MARKER = re.compile(r'^[ \t]*段落[ \t]*(\d+)[ \t]*[:：][ \t]*', re.MULTILINE)
+
+
+def parse_numbered_translation(text, count):
+    """按“段落N:”标记把API输出拆分为count个译文，缺失的段落为None
+
+    同一标记下的多行合并为一段；输出中完全没有标记时，只有行数与原文一致才按顺序对应。
+    """
+    translations = [None] * count
+    parts = TRANSLATION_MARKER.split(text)
+    if len(parts) == 1:
+        lines = [line.strip() for line in text.split('\n') if line.strip()]
+        if count == 1 and lines:
+            translations[0] = " ".join(lines)
+        elif len(lines) == count:
+            translations = lines
+        return translations
+
+    for i in range(1, len(parts) - 1, 2):
+        number = int(parts[i])
+        content = " ".join(line.strip() for line in parts[i + 1].split('\n') if line.strip())
+        if not content or not 1 <= number <= count:
+            batch_logger.warning("忽略无法对应的译文段落%d: %.50s...", number, content)
+            continue
+        if translations[number - 1] is None:
+            translations[number - 1] = content
+        else:
+            # 同一编号出现多次，说明模型拆分了段落
+            translations[number - 1] += " " + content
+    return translations
+
+
+def length_ratio_outliers(sources, translations, reference=None, neighbors=(),
+                          tolerance=DEFAULT_CONFIG['alignment_ratio_tolerance'],
+                          neighbor_tolerance=DEFAULT_CONFIG['alignment_neighbor_tolerance'],
+                          min_chars=DEFAULT_CONFIG['alignment_min_chars']):
+    """按译文/原文长度比找出疑似错位的段落
+
+    一次计算整批段落的对数长度比，以批次中位数（或给定的reference）为基准，
+    偏离超过tolerance倍的段落视为错位。neighbors中的位置与缺失段落相邻，
+    译文偏长超过neighbor_tolerance倍即视为吞并了缺失段落。
+    可检查的段落少于3个且没有reference时无法比较长度，neighbors中的位置全部视为疑似错位。
+    返回(疑似错位的位置列表, 批次长度比中位数)。
+    """
+    log_ratios = [math.log(max(len(t), 1) / max(len(s), 1)) for s, t in zip(sources, translations)]
+    checked = [r for r, s in zip(log_ratios, sources) if len(s) >= min_chars]
+    if reference is None:
+        if len(checked) < 3:
+            # 没有基准长度比时无法判断相邻段落是否吞并了缺失段落，与缺失段落一起重新请求
+            return sorted(neighbors), None
+        checked.sort()
+        reference = checked[len(checked) // 2]
+    limit = math.log(tolerance)
+    neighbor_limit = math.log(neighbor_tolerance)
+    outliers = [i for i, (r, s) in enumerate(zip(log_ratios, sources))
+                if len(s) >= min_chars and (abs(r - reference) > limit
+                                            or (i in neighbors and r - reference > neighbor_limit))]
+    return outliers, reference
+
+
+async def translate_verified(paragraphs, offsets, api_key, api_url, api_model, temperature, session,
+                             request_options, dead_letters, alignment_stats):
+    """翻译一组段落并逐段校验对齐，只重新请求缺失或疑似错位的段落
+
+    返回{位置: 译文}。经过alignment_retries轮重新请求仍缺失的段落，以及仍疑似吞并了相邻缺失段落的段落
+    记入dead_letters；其他仍疑似错位但有译文的段落照常使用。alignment_stats累计检查数、错位数和重新请求数。
+    """
+    source = dict(zip(offsets, paragraphs))
+    results = {}
+    pending = list(offsets)
+    reference = None
+    rounds = DEFAULT_CONFIG['alignment_retries']
+    metrics = request_options.get('metrics', NULL_METRICS)
+
+    for round_index in range(rounds + 1):
+        if round_index:
+            alignment_stats['rerequested'] += len(pending)
+            batch_logger.info("重新请求 %d 个缺失或错位的段落（第 %d 轮）", len(pending), round_index)
+        pieces = await translate_with_bisection(
+            [source[o] for o in pending], pending, api_key, api_url, api_model, temperature, session,
+            request_options, dead_letters)
+
+        with metrics.timer('postprocess'):
+            candidates = {}
+            for piece_offsets, text in pieces:
+                candidates.update(zip(piece_offsets, parse_numbered_translation(text, len(piece_offsets))))
+            missing = [o for o, t in candidates.items() if t is None]
+            present = [o for o, t in candidates.items() if t is not None]
+            neighbors = {i for i, o in enumerate(present)
+                         if candidates.get(o - 1, "") is None or candidates.get(o + 1, "") is None}
+            outlier_positions, median = length_ratio_outliers(
+                [source[o] for o in present], [candidates[o] for o in present], reference, neighbors)
+        reference = reference if reference is not None else median
+        suspicious = [present[i] for i in outlier_positions]
+
+        alignment_stats['checked'] += len(candidates)
+        alignment_stats['mismatched'] += len(missing) + len(suspicious)
+        if missing or suspicious:
+            batch_logger.warning("译文对齐检查: 缺失 %d 个段落, 长度比异常 %d 个段落", len(missing), len(suspicious))
+
+        last_round = round_index == rounds
+        # 最后一轮仍疑似吞并了缺失段落的译文不写入文档，与缺失段落一起记入失败队列
+        swallowed = {present[i] for i in outlier_positions if i in neighbors} if last_round else set()
+        for o in present:
+            if (last_round and o not in swallowed) or o not in suspicious:
+                results[o] = candidates[o]
+        pending = sorted(missing + list(swallowed) if last_round else missing + suspicious)
+        if not pending:
+            break
+
+    for o in pending:
+        batch_logger.error("段落译文多次无法对齐，记录到失败队列: %.50s...", source[o])
+        dead_letters.append({'offset': o, 'paragraph': source[o], 'status': None, 'error': "译文段落无法对齐"})
+    return results
+
+
+async def translate_batch_async(batch, api_key, api_url, api_model, semaphore, progress_data, tracker=None, session=None,
+                                memory=None, temperature=DEFAULT_CONFIG['temperature'], dead_letters=None,
+                                stream=DEFAULT_CONFIG['stream_responses'], metrics=NULL_METRICS):
+    """异步翻译一个批次的段落
+
+    semaphore可以是asyncio.Semaphore、AdaptiveConcurrencyLimiter（自适应并发）或BudgetedLimiter；
+    progress_data包含批次索引及起始段落索引（或各段落在文档中的位置positions），tracker为ProgressTracker；
+    session为main_async创建的共享HTTP会话；memory为翻译记忆，
+    命中的段落直接使用缓存译文，只把未命中的段落发送给API。
+    请求失败时逐步拆分批次，最终仍失败的段落追加到dead_letters列表
+    （包含段落全局索引index），其余段落照常返回译文。
+    处理过程中出现意外错误时整个批次记入dead_letters并返回空字符串；未提供dead_letters时抛出异常。
+    译文按“段落N:”编号逐段对齐，返回的文本每行对应一个成功翻译的段落。
+    stream为True时流式接收译文，每收到一个段落就更新tracker中的最新译文预览。
+    metrics记录等待并发名额（semaphore_wait）、批次总耗时（batch）和翻译记忆读写的耗时。
+    """
+    waiting_started = time.perf_counter()
+    async with semaphore:
+        batch_started = time.perf_counter()
+        metrics.observe('semaphore_wait', batch_started - waiting_started)
+        batch_idx = progress_data.get('batch_index', 'N/A')
+        # 段落在文档中的位置：去重后同一批次的段落不一定连续，由调用方给出positions
+        positions = progress_data.get('positions')
+        if positions is None:
+            start_index = progress_data.get(
+                'start_index', progress_data.get('batch_index', 0) * progress_data.get('batch_size', len(batch)))
+            positions = range(start_index, start_index + len(batch))
+        reported = len(dead_letters) if dead_letters is not None else 0
+        failed_counted = 0
+        try:
+            # 记录批次信息用于调试
+            batch_logger.debug("开始处理批次索引: %s, 批次大小: %d", batch_idx, len(batch))
+
+            # 记录原文内容，便于调试（逐段落的跟踪日志按比例采样）
+            if trace_logger.isEnabledFor(logging.DEBUG):
+                for i, para in enumerate(batch):
+                    trace_logger.debug("[批次%s-段落%d] 原文: %.100s...", batch_idx, i, para)
+
+            def on_paragraph(index, text):
+                # 流式收到的段落先推送到进度，校验对齐后再写入文档
+                tracker.add_counter('streamed_paragraphs')
+                tracker.update(latest_translation=text[:200])
+
+            request_options = {
+                'retries': DEFAULT_CONFIG['retries'],
+                'delay': DEFAULT_CONFIG['retry_delay'],
+                'limiter': semaphore if isinstance(semaphore, (AdaptiveConcurrencyLimiter, BudgetedLimiter)) else None,
+                'stream': stream,
+                'on_paragraph': on_paragraph if tracker else None,
+                'metrics': metrics
+            }
+            # 先查询翻译记忆
+            cached = {}
+            if memory:
+                with metrics.timer('memory_lookup'):
+                    cached = memory.lookup(batch, api_model, temperature)
+            missing = [i for i in range(len(batch)) if i not in cached]
+            if cached:
+                batch_logger.info("[批次%s] 翻译记忆命中 %d/%d 个段落", batch_idx, len(cached), len(batch))
+
+            # 翻译未命中的段落：失败时拆分重试，缺失或错位的段落单独重新请求
+            failed = []
+            alignment_stats = {'checked': 0, 'mismatched': 0, 'rerequested': 0}
+            translations = dict(cached)
+            if missing:
+                verified = await translate_verified(
+                    [batch[i] for i in missing], missing, api_key, api_url, api_model, temperature,
+                    session, request_options, failed, alignment_stats)
+                translations.update(verified)
+                if memory and verified:
+                    offsets = sorted(verified)
+                    with metrics.timer('memory_store'):
+                        memory.store([batch[i] for i in offsets], [verified[i] for i in offsets],
+                                     api_model, temperature)
+
+            # 按原始顺序合并缓存译文和新译文（每个段落一行）
+            translated_text = "\n".join(translations[i] for i in sorted(translations))
+
+            failed_offsets = {entry['offset'] for entry in failed}
+            if failed:
+                batch_logger.warning("[批次%s] %d 个段落翻译失败", batch_idx, len(failed))
+                if dead_letters is not None:
+                    for entry in failed:
+                        dead_letters.append({
+                            'index': positions[entry['offset']],
+                            'batch_index': progress_data.get('batch_index'),
+                            'paragraph': entry['paragraph'],
+                            'status': entry['status'],
+                            'error': entry['error']
+                        })
 
             # 记录译文并与原文对照
             if translated_text:
                 # 分割译文为段落
-                translated_paragraphs = []
-                for p in translated_text.split('\n'):
-                    if p.strip():
-                        translated_paragraphs.append(p.strip())
+                translated_paragraphs = [p.strip() for p in translated_text.split('\n') if p.strip()]
 
                 # 记录译文段落数与原文段落数的差异
-                logger.info(
-                    f"[批次{batch_idx}] 原文段落数: {len(batch)}, 译文段落数: {len(translated_paragraphs)}")
+                batch_logger.debug("[批次%s] 原文段落数: %d, 译文段落数: %d",
+                                   batch_idx, len(batch), len(translated_paragraphs))
 
                 # 记录译文内容与原文对照
-                min_len = min(len(batch), len(translated_paragraphs))
-                for i in range(min_len):
-                    logger.debug(
-                        f"[批次{batch_idx}-段落{i}] 原文: {batch[i][:50]}...")
-                    logger.debug(
-                        f"[批次{batch_idx}-段落{i}] 译文: {translated_paragraphs[i][:50]}...")
+                if trace_logger.isEnabledFor(logging.DEBUG):
+                    for i in range(min(len(batch), len(translated_paragraphs))):
+                        trace_logger.debug("[批次%s-段落%d] 原文: %.50s...", batch_idx, i, batch[i])
+                        trace_logger.debug("[批次%s-段落%d] 译文: %.50s...", batch_idx, i, translated_paragraphs[i])
 
                 # 记录多余段落
                 if len(translated_paragraphs) > len(batch):
                     for i in range(len(batch), len(translated_paragraphs)):
-                        logger.warning(
-                            f"[批次{batch_idx}] 多余译文段落{i}: {translated_paragraphs[i][:50]}...")
+                        batch_logger.warning("[批次%s] 多余译文段落%d: %.50s...", batch_idx, i, translated_paragraphs[i])
                 elif len(translated_paragraphs) < len(batch):
                     for i in range(len(translated_paragraphs), len(batch)):
-                        logger.warning(
-                            f"[批次{batch_idx}] 未翻译原文段落{i}: {batch[i][:50]}...")
-
-            # 使用文件锁确保多任务共享进度数据的一致性
-            lock_file = f"{progress_file}.lock"
-            lock = filelock.FileLock(lock_file, timeout=30)  # 30秒超时
-
-            try:
-                with lock:
-                    # 重新读取最新的进度数据
-                    try:
-                        with open(progress_file, 'r', encoding='utf-8') as f:
-                            current_progress = json.load(f)
-                    except (FileNotFoundError, json.JSONDecodeError):
-                        # 如果文件不存在或格式错误，初始化进度数据
-                        current_progress = {
-                            'total': progress_data['total'],
-                            'processed': [],
-                            'batch_size': progress_data.get('batch_size', len(batch))
-                        }
-
-                    # 更新进度
-                    batch_index = progress_data.get('batch_index', 0)
-                    batch_size = progress_data.get('batch_size', len(batch))
-
-                    # 计算要更新的索引
-                    indices_to_add = []
-                    for i in range(len(batch)):
-                        index = batch_index * batch_size + i
-                        if index < current_progress['total'] and index not in current_progress['processed']:
-                            indices_to_add.append(index)
-
-                    # 添加新处理的索引
-                    current_progress['processed'].extend(indices_to_add)
-
-                    # 保存进度数据
-                    with open(progress_file, 'w', encoding='utf-8') as f:
-                        json.dump(current_progress, f)
-
-                    # 输出进度信息
-                    completed = len(current_progress['processed'])
-                    total = current_progress['total']
-                    percentage = (completed / total) * 100 if total > 0 else 0
-                    logger.info(
-                        f"进度更新: {completed}/{total} ({percentage:.1f}%) - {batch_info}")
-            except filelock.Timeout:
-                logger.warning(f"无法获取进度文件锁，跳过进度更新 - {batch_info}")
+                        batch_logger.warning("[批次%s] 未翻译原文段落%d: %.50s...", batch_idx, i, batch[i])
+
+            metrics.inc('paragraphs_translated', len(translations))
+            metrics.inc('paragraphs_failed', len(failed))
+            failed_counted = len(failed)
+            metrics.inc('memory_hits', len(cached))
+
+            # 更新进度（仅记录在内存中，由定时任务写盘）
+            if tracker and translated_text:
+                tracker.mark_done(positions[i] for i in range(len(batch)) if i not in failed_offsets)
+                # 累计翻译记忆的命中/未命中数
+                if memory:
+                    tracker.add_counter('cache_hits', len(cached))
+                    tracker.add_counter('cache_misses', len(missing))
+            if tracker:
+                # 累计译文对齐检查结果
+                tracker.add_counter('alignment_checked', alignment_stats['checked'])
+                tracker.add_counter('alignment_mismatched', alignment_stats['mismatched'])
+                tracker.add_counter('alignment_rerequested', alignment_stats['rerequested'])
+                if batch_logger.isEnabledFor(logging.DEBUG):
+                    batch_logger.debug("进度更新: %d/%d (%.1f%%) - 批次索引: %s",
+                                       tracker.completed, tracker.total, tracker.percentage(), batch_idx)
 
             return translated_text
         except Exception as e:
-            logger.error(
-                f"批次处理失败: {e} - {batch_info if 'batch_info' in locals() else '未知批次'}")
+            if dead_letters is None:
+                raise
+            # 意外错误：整个批次记入失败队列（替换本批次已记录的条目），不静默丢弃段落
+            batch_logger.exception("批次处理失败，%d 个段落记入失败队列 - 批次索引: %s", len(batch), batch_idx)
+            del dead_letters[reported:]
+            dead_letters.extend(batch_failure_entries(batch, positions, progress_data.get('batch_index'), e))
+            metrics.inc('paragraphs_failed', len(batch) - failed_counted)
             return ""
+        finally:
+            metrics.observe('batch', time.perf_counter() - batch_started)
+
+
+def batch_failure_entries(batch, positions, batch_index, error):
+    """整个批次意外失败时，每个段落对应的失败队列条目"""
+    return [{'index': position, 'batch_index': batch_index, 'paragraph': paragraph,
+             'status': getattr(error, 'status', None), 'error': f"{type(error).__name__}: {error}"}
+            for position, paragraph in zip(positions, batch)]
+
+
+def dead_letter_file_for(path):
+    """返回与进度文件（或输出文件）对应的失败队列文件路径"""
+    return f"{os.path.splitext(path)[0]}.deadletter.jsonl"
+
+
+class SegmentDeduplicator:
+    """作业内重复段落的去重与按文档顺序回填
+
+    分段结果按文档顺序经过add：首次出现的段落返回True，进入组批并调用API；
+    内容相同（规范化空白后哈希相同）的段落返回False，只记录位置，不再发送。
+    写入阶段按批次顺序调用resolve填入每个批次的译文，再用drain按文档顺序取出可以写入的段落，
+    重复段落直接使用首次出现时的译文。最多记住max_entries个不同段落（先进先出），
+    更早的段落再次出现时按新段落翻译；等待写入的段落数受流水线窗口限制，内存有界。
+    enabled为False时所有段落都按新段落处理。
+    """
+
+    PENDING = object()  # 译文尚未返回
+
+    def __init__(self, enabled=True, max_entries=DEFAULT_CONFIG['dedup_max_entries']):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.duplicates = 0
+        self.saved_tokens = 0
+        self._seen = OrderedDict()  # 内容哈希 -> 译文槽位（单元素列表）
+        self._layout = deque()  # (位置, 原文, 译文槽位, 是否重复)，按文档顺序
+        self._unfilled = deque()  # 新段落的译文槽位，与组批顺序一致
+        self._positions = deque()  # 新段落的文档位置，与组批顺序一致
+
+    @staticmethod
+    def segment_key(paragraph):
+        return hashlib.blake2b(' '.join(paragraph.split()).encode('utf-8'), digest_size=16).digest()
+
+    def add(self, position, paragraph):
+        """登记第position个段落，返回是否需要翻译"""
+        key = self.segment_key(paragraph) if self.enabled else None
+        slot = self._seen.get(key) if self.enabled else None
+        if slot is not None:
+            self._layout.append((position, paragraph, slot, True))
+            self.duplicates += 1
+            # 省下的原文token及按比例估算的译文token
+            self.saved_tokens += round(estimate_tokens(paragraph) * (1 + DEFAULT_CONFIG['token_output_ratio']))
+            return False
+        slot = [self.PENDING]
+        if self.enabled:
+            self._seen[key] = slot
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+        self._layout.append((position, paragraph, slot, False))
+        self._unfilled.append(slot)
+        self._positions.append(position)
+        return True
+
+    def take_positions(self, count):
+        """返回接下来count个新段落（即一个批次）的文档位置"""
+        return [self._positions.popleft() for _ in range(count)]
+
+    def resolve(self, translations):
+        """按组批顺序填入一个批次的译文（失败的段落为None）"""
+        for translation in translations:
+            self._unfilled.popleft()[0] = translation
+
+    def drain(self):
+        """按文档顺序取出译文已确定的段落，返回[(位置, 原文, 译文或None, 是否重复)]"""
+        ready = []
+        layout = self._layout
+        while layout and layout[0][2][0] is not self.PENDING:
+            position, paragraph, slot, duplicate = layout.popleft()
+            ready.append((position, paragraph, slot[0], duplicate))
+        return ready
+
+
+class BatchJournal:
+    """追加写入的批次结果日志（JSON Lines）
+
+    每个批次翻译完成后立即追加一条记录（批次索引、原文哈希、译文），
+    恢复任务时重放日志即可重建完整输出而无需重复调用API。
+    fingerprint（translation_fingerprint：模型、温度和提示词）写在日志的第一行，
+    与本次任务不同的日志整个丢弃，不会把其他设置下的译文重放到输出中。
+    fsync按时间间隔/条数成组执行，不拖慢翻译主流程。
+    内存中只保存每个批次记录在文件中的偏移量，译文在需要时才读取。
+    """
+
+    def __init__(self, path, fingerprint=None, fsync_interval=DEFAULT_CONFIG['journal_fsync_interval'],
+                 fsync_batches=DEFAULT_CONFIG['journal_fsync_batches']):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.fsync_interval = fsync_interval
+        self.fsync_batches = fsync_batches
+        self.index = {}  # 批次索引 -> (原文哈希, 记录偏移量)
+        self._replay()
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(json.dumps({'fingerprint': fingerprint}).encode('utf-8') + b'\n')
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    @staticmethod
+    def source_hash(batch):
+        return hashlib.sha256('\x1e'.join(batch).encode('utf-8')).hexdigest()
+
+    def _replay(self):
+        """读取已有日志建立索引，截断崩溃时写了一半的最后一条记录；设置不同的日志整个清空"""
+        if not os.path.exists(self.path):
+            return
+        valid_end = 0
+        with open(self.path, 'rb') as f:
+            header = f.readline()
+            try:
+                matches = header.endswith(b'\n') and json.loads(header)['fingerprint'] == self.fingerprint
+            except (ValueError, KeyError, TypeError):
+                matches = False
+            if matches:
+                valid_end = len(header)
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    self.index[record['batch']] = (record['hash'], valid_end)
+                    valid_end += len(line)
+            elif header:
+                logger.warning(f"批次日志的模型、温度或提示词与本次任务不同，已丢弃: {self.path}")
+        if valid_end < os.path.getsize(self.path):
+            if matches:
+                logger.warning(f"批次日志末尾记录不完整，已截断: {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+        logger.info(f"已从批次日志恢复 {len(self.index)} 个批次")
+
+    def lookup(self, batch_index, batch):
+        """返回日志中该批次的译文；批次不存在或原文已变化时返回None"""
+        entry = self.index.get(batch_index)
+        if not entry or entry[0] != self.source_hash(batch):
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(entry[1])
+            return json.loads(f.readline())['text']
+
+    def append(self, batch_index, batch, translated_text):
+        """追加一条记录，返回是否需要执行fsync"""
+        source_hash = self.source_hash(batch)
+        record = {'batch': batch_index, 'hash': source_hash, 'text': translated_text}
+        offset = self.file.tell()
+        self.file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.index[batch_index] = (source_hash, offset)
+        self._unsynced += 1
+        return (self._unsynced >= self.fsync_batches
+                or time.time() - self._last_sync >= self.fsync_interval)
+
+    def sync(self):
+        """把缓冲区写入磁盘并fsync"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def close(self):
+        if self._unsynced:
+            self.sync()
+        self.file.close()
+
+    def remove(self):
+        """输出文档已保存，不再需要日志"""
+        if not self.file.closed:
+            self.file.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
 
 
 async def main_async(pdf_path, api_key, output_path, progress_file=None,
@@ -711,142 +2838,1255 @@ async def main_async(pdf_path, api_key, output_path, progress_file=None,
                      batch_size=3, max_concurrent_requests=3,
                      api_url=DEFAULT_CONFIG['api_url'],
                      api_model=DEFAULT_CONFIG['api_model'],
-                     sentences_per_paragraph=4):
-    """主异步翻译函数"""
-    # 提取文本
-    text = extract_text_from_pdf(pdf_path)
-    if not text:
+                     sentences_per_paragraph=4,
+                     temperature=DEFAULT_CONFIG['temperature'],
+                     use_cache=True, cache_path=DEFAULT_CONFIG['cache_path'],
+                     extract_workers=DEFAULT_CONFIG['extract_workers'],
+                     adaptive_concurrency=DEFAULT_CONFIG['adaptive_concurrency'],
+                     max_concurrent_limit=DEFAULT_CONFIG['max_concurrent_limit'],
+                     batching=DEFAULT_CONFIG['batching'],
+                     max_input_tokens=None, max_output_tokens=None,
+                     stream_responses=DEFAULT_CONFIG['stream_responses'],
+                     on_progress=None, request_budget=None, job_id=None, session=None,
+                     document_cache_dir=None, metrics=None, dedup=DEFAULT_CONFIG['dedup_segments'],
+                     extraction_mode=DEFAULT_CONFIG['extraction_mode']):
+    """主异步翻译函数
+
+    采用流水线方式：逐页提取 → 增量分段 → 组成批次 → 并发翻译 → 按顺序写入文档。
+    各阶段之间通过有界队列连接，第一个批次分好后即开始调用API，
+    内存占用不随页数增长。use_cache控制是否使用持久化翻译记忆（cache_path），
+    extract_workers为PDF提取使用的进程数。
+    adaptive_concurrency为True时，max_concurrent_requests作为初始并发数，
+    由AIMD控制器在[min_concurrent_requests, max_concurrent_limit]之间自动调整。
+    batching为'tokens'时按token预算（max_input_tokens/max_output_tokens，
+    未指定时使用默认配置）组批，为'count'时每批batch_size个段落。
+    stream_responses为True时流式接收译文，收到的段落即时显示在进度中。
+    on_progress(state)在每次进度写盘时被调用（在翻译线程中），
+    state为包含速度和预计剩余时间的进度摘要，供Web界面推送进度。
+    request_budget为多个任务共享的FairRequestBudget（job_id用于轮转分配，默认为输出路径），
+    session为共享的HTTP会话，二者由JobScheduler提供；未提供时任务单独使用自己的并发数和会话。
+    document_cache_dir不为None时通过DocumentCache读取（或写入）该文件的页面文本和分段结果，
+    同一个文件再次翻译时不再提取PDF。
+    metrics为Metrics时记录各阶段耗时和计数（见STAGE_LABELS），并附带在推送的进度状态中；
+    为None时不收集指标。
+    dedup为True时内容相同的段落只发送一次，写入文档时把译文回填到每个出现位置，
+    省下的段落数和估算token数记录在进度的dedup_segments/dedup_tokens_saved中。
+    extraction_mode为'layout'时按版面位置去除页眉、页脚和页码（HeaderFooterFilter），
+    去除的行数和字符数记录在进度的header_lines_removed/header_chars_removed中；为'text'时使用每页的全部文本。
+    start_page/end_page为要翻译的页码范围（从1开始，包含两端，end_page为None时到最后一页），
+    进度和输出文档只包含该范围内的段落；只翻译部分页面时不使用文档缓存，直接提取这些页面。
+    """
+    metrics = metrics or NULL_METRICS
+    page_filter = create_page_filter(extraction_mode)
+    first_page = max(start_page or 1, 1) - 1
+    whole_document = first_page == 0 and end_page is None
+    # 加载进度（内存中记录，定时写盘）
+    tracker = ProgressTracker(progress_file, on_update=on_progress, metrics=metrics)
+    known_total = tracker.total
+    tracker.update(batch_size=batch_size, batching=batching, start_page=first_page + 1, end_page=end_page,
+                   extraction_error=None)
+    tracker.set_total(known_total, segmenting=True)
+    tracker.flush()
+
+    # 批次结果日志：恢复时从中重建已完成批次的译文
+    journal = None
+    if progress_file:
+        journal = BatchJournal(f"{os.path.splitext(progress_file)[0]}.journal",
+                               translation_fingerprint(api_model, temperature))
+
+    # 失败队列：多次重试和拆分后仍失败的段落，每行一个JSON，可用--retry-dead-letters单独重试
+    dead_letter_path = dead_letter_file_for(progress_file or output_path)
+    dead_letter_log = open(dead_letter_path, 'w', encoding='utf-8')
+    tracker.update(dead_letters=0, dead_letter_file=dead_letter_path)
+
+    # 并发控制：自适应模式下工作协程数和连接池按并发上限创建，实际并发由控制器决定
+    if adaptive_concurrency:
+        max_workers = max(max_concurrent_requests, max_concurrent_limit)
+        semaphore = AdaptiveConcurrencyLimiter(
+            max_concurrent_requests, max_limit=max_workers,
+            on_change=lambda limiter: tracker.update(**limiter.snapshot()))
+        tracker.update(**semaphore.snapshot())
+    else:
+        max_workers = max_concurrent_requests
+        semaphore = asyncio.Semaphore(max_concurrent_requests)
+    if request_budget:
+        semaphore = BudgetedLimiter(semaphore, request_budget, job_id or output_path)
+
+    loop = asyncio.get_running_loop()
+    # 待翻译批次队列；window限制已分出但尚未写入文档的批次数，保证内存有界
+    batch_queue = asyncio.Queue(maxsize=max_workers * 2)
+    result_queue = asyncio.Queue()
+    window = asyncio.Semaphore(max_workers * 4)
+
+    # 所有批次共享同一个HTTP连接池
+    own_session = session is None
+    if own_session:
+        session = create_http_session(max_workers)
+    memory = TranslationMemory(cache_path) if use_cache else None
+    writer = StreamingDocumentWriter(output_path, comparison_mode)
+    # 进度、失败队列中的段落索引均为段落在文档中的位置（包括重复段落）
+    deduplicator = SegmentDeduplicator(dedup)
+    stats = {'paragraphs': 0, 'batches': 0, 'translated': 0}
+    tracker.update(dedup_segments=0, dedup_tokens_saved=0)
+
+    async def emit_batch(batch):
+        batch_index = stats['batches']
+        positions = deduplicator.take_positions(len(batch))
+        stats['batches'] += 1
+        await window.acquire()
+
+        # 批次日志中已有该批次的译文时直接使用，不再调用API
+        journal_text = journal.lookup(batch_index, batch) if journal else None
+        if journal_text is not None:
+            batch_logger.debug("批次 %d 已处理，从批次日志恢复", batch_index + 1)
+            tracker.mark_done(positions)
+            await result_queue.put((batch_index, batch, journal_text, set()))
+        else:
+            await batch_queue.put((batch_index, positions, batch, time.perf_counter()))
+
+    async def produce_batches():
+        """提取与分段阶段：在后台线程中逐页提取（或读取文档缓存），避免阻塞事件循环"""
+        executor = ThreadPoolExecutor(max_workers=1)
+        if document_cache_dir and whole_document:
+            chunks = DocumentCache(document_cache_dir).iter_paragraph_chunks(
+                pdf_path, sentences_per_paragraph, extract_workers, metrics, page_filter)
+        else:
+            pages = iter_pdf_pages(pdf_path, extract_workers, page_filter, first_page, end_page)
+            chunks = iter_paragraph_chunks(pages, sentences_per_paragraph, metrics)
+        batcher = create_batcher(batching, batch_size, max_input_tokens, max_output_tokens)
+
+        try:
+            while True:
+                paragraphs = await loop.run_in_executor(executor, next, chunks, None)
+                if paragraphs is None:
+                    break
+                for paragraph in paragraphs:
+                    position = stats['paragraphs']
+                    stats['paragraphs'] += 1
+                    if not deduplicator.add(position, paragraph):
+                        continue
+                    for batch in batcher.add(paragraph):
+                        await emit_batch(batch)
+                tracker.set_total(max(known_total, stats['paragraphs']), segmenting=True)
+
+            for batch in batcher.flush():
+                await emit_batch(batch)
+        except Exception as e:
+            # 已分出的批次照常翻译和写入，队列排空后main_async返回失败，不保存不完整的文档
+            logger.exception(f"PDF提取失败（已分割出 {stats['paragraphs']} 个段落）: {e}")
+            stats['extraction_error'] = f"{type(e).__name__}: {e}"
+        finally:
+            await loop.run_in_executor(executor, chunks.close)
+            executor.shutdown(wait=False)
+            for _ in range(max_workers):
+                await batch_queue.put(None)
+
+        logger.info(
+            f"共分割出 {stats['paragraphs']} 个段落，分为 {stats['batches']} 个批次")
+        if deduplicator.duplicates:
+            logger.info(f"重复段落去重: {deduplicator.duplicates} 个段落不再发送，"
+                        f"约节省 {deduplicator.saved_tokens} 个token")
+        if page_filter:
+            logger.info(f"去除页眉、页脚和页码 {page_filter.removed_lines} 行，共 {page_filter.removed_chars} 字符")
+            tracker.update(header_lines_removed=page_filter.removed_lines,
+                           header_chars_removed=page_filter.removed_chars)
+            metrics.inc('header_chars_removed', page_filter.removed_chars)
+        tracker.set_total(stats['paragraphs'], segmenting=False)
+        metrics.inc('paragraphs', stats['paragraphs'])
+        metrics.inc('batches', stats['batches'])
+
+    async def translate_worker():
+        """翻译阶段：从队列中取出批次并调用API"""
+        while True:
+            item = await batch_queue.get()
+            if item is None:
+                break
+            batch_index, positions, batch, queued_at = item
+            metrics.observe('batch_queue_wait', time.perf_counter() - queued_at)
+            batch_progress_data = {
+                'batch_index': batch_index,
+                'positions': positions
+            }
+            batch_dead_letters = []
+            try:
+                result = await translate_batch_async(
+                    batch, api_key, api_url, api_model,
+                    semaphore, batch_progress_data, tracker, session,
+                    memory, temperature, batch_dead_letters, stream_responses, metrics
+                )
+            except Exception as e:
+                logger.exception(f"批次 {batch_index} 处理失败")
+                result = ""
+                batch_dead_letters = batch_failure_entries(batch, positions, batch_index, e)
+                metrics.inc('paragraphs_failed', len(batch))
+            failed = set()
+            if batch_dead_letters:
+                # 有失败段落的批次不写入批次日志，恢复时会重新翻译
+                write_dead_letters(batch_dead_letters)
+                offsets = {position: i for i, position in enumerate(positions)}
+                failed = {offsets[entry['index']] for entry in batch_dead_letters}
+            elif result and journal and journal.append(batch_index, batch, result):
+                with metrics.timer('journal_sync'):
+                    await loop.run_in_executor(None, journal.sync)
+            await result_queue.put((batch_index, batch, result, failed))
+
+    def write_dead_letters(entries):
+        for entry in entries:
+            dead_letter_log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        dead_letter_log.flush()
+        tracker.add_counter('dead_letters', len(entries))
+
+    def write_ready(ready):
+        """按文档顺序写入译文已确定的段落：重复段落使用首次出现时的译文并标记完成，
+        首次出现时翻译失败的重复段落同样记入失败队列"""
+        if not ready:
+            return
+        originals = [paragraph for _, paragraph, translation, _ in ready if translation is not None]
+        if originals:
+            with metrics.timer('document_write'):
+                writer.add_batch(originals, "\n".join(t for _, _, t, _ in ready if t is not None))
+        duplicates = [(position, paragraph, translation) for position, paragraph, translation, duplicate in ready
+                      if duplicate]
+        if duplicates:
+            tracker.mark_done(position for position, _, translation in duplicates if translation is not None)
+            failed = [{'index': position, 'batch_index': None, 'paragraph': paragraph, 'status': None,
+                       'error': "重复段落首次出现时翻译失败"}
+                      for position, paragraph, translation in duplicates if translation is None]
+            if failed:
+                write_dead_letters(failed)
+            tracker.update(dedup_segments=deduplicator.duplicates, dedup_tokens_saved=deduplicator.saved_tokens)
+            metrics.inc('dedup_segments', len(duplicates))
+
+    async def write_results():
+        """写入阶段：按批次顺序接收结果，按文档顺序追加到文档"""
+        pending_results = {}
+        next_index = 0
+        while True:
+            item = await result_queue.get()
+            if item is None:
+                break
+            batch_index, batch, result, failed = item
+            pending_results[batch_index] = (batch, result, failed)
+
+            while next_index in pending_results:
+                batch, result, failed = pending_results.pop(next_index)
+                # 译文每行对应一个未失败的段落，失败的段落为None
+                lines = iter([p.strip() for p in result.split('\n') if p.strip()])
+                deduplicator.resolve([None if i in failed else next(lines, None) for i in range(len(batch))])
+                if result:  # 有效结果
+                    stats['translated'] += 1
+                next_index += 1
+                window.release()
+            write_ready(deduplicator.drain())
+
+            if writer.paragraph_count and writer.checkpoint_due():
+                with metrics.timer('document_save'):
+                    await loop.run_in_executor(None, writer.checkpoint)
+
+    workers = [asyncio.create_task(translate_worker())
+               for _ in range(max_workers)]
+    writer_task = asyncio.create_task(write_results())
+    flusher_task = asyncio.create_task(tracker.run_flusher())
+    try:
+        await produce_batches()
+        await asyncio.gather(*workers)
+    finally:
+        await result_queue.put(None)
+        await writer_task
+        flusher_task.cancel()
+        await asyncio.gather(flusher_task, return_exceptions=True)
+        if own_session:
+            await session.close()
+        if journal:
+            journal.close()
+        dead_letter_log.close()
+        if memory:
+            logger.info(f"翻译记忆: 命中 {memory.hits} 个段落, 未命中 {memory.misses} 个段落")
+            memory.close()
+
+    checked = tracker.summary.get('alignment_checked', 0)
+    if checked:
+        logger.info(
+            f"译文对齐: 检查 {checked} 个段落, 错位率 "
+            f"{tracker.summary.get('alignment_mismatched', 0) / checked:.2%}, "
+            f"重新请求 {tracker.summary.get('alignment_rerequested', 0)} 个段落")
+
+    if stats.get('extraction_error'):
+        with metrics.timer('document_save'):
+            writer.abandon()
+        tracker.update(extraction_error=stats['extraction_error'])
+        tracker.flush()
+        logger.error("PDF提取中途失败，未生成最终文档（已翻译的批次保存在批次日志中，再次运行时恢复）")
+        return False
+
+    if not stats['paragraphs']:
+        writer.close()
         logger.error("PDF文本提取失败，退出翻译")
         return False
 
-    # 使用基于句号的段落分割
-    paragraphs = split_paragraphs_by_sentences(text, sentences_per_paragraph)
-    total_paragraphs = len(paragraphs)
-    logger.info(f"共分割出 {total_paragraphs} 个段落")
+    # 保存结果
+    with metrics.timer('document_save'):
+        saved = writer.close()
+    if saved:
+        if journal:
+            journal.remove()
+        logger.info(f"翻译完成！结果已保存至: {output_path}")
+    else:
+        logger.warning("没有生成翻译结果，请检查是否有错误发生")
 
-    # 检查进度文件
-    progress_data = {'total': total_paragraphs, 'processed': []}
-    if progress_file and os.path.exists(progress_file):
-        try:
-            with open(progress_file, 'r', encoding='utf-8') as f:
-                progress_data = json.load(f)
-                logger.info(
-                    f"已加载翻译进度，已处理 {len(progress_data['processed'])} 个段落")
-        except:
-            logger.warning("进度文件损坏或无法读取，创建新的进度文件")
+    return True
 
-    # 创建批次
-    batches = []
-    for i in range(0, total_paragraphs, batch_size):
-        batch = paragraphs[i:i+batch_size]
-        batches.append(batch)
 
-    total_batches = len(batches)
-    logger.info(f"将 {total_paragraphs} 个段落分为 {total_batches} 个批次进行处理")
+class JobScheduler:
+    """进程内的翻译任务调度器
 
-    # 创建进度文件
-    if progress_file:
-        progress_data['total'] = total_paragraphs
-        progress_data['batch_size'] = batch_size
-        with open(progress_file, 'w', encoding='utf-8') as f:
-            json.dump(progress_data, f)
-
-    # 创建任务
-    semaphore = asyncio.Semaphore(max_concurrent_requests)
-    tasks = []
-
-    # 创建一个映射，用于追踪每个批次对应的原始段落索引
-    batch_to_original_indices = {}
-
-    for i, batch in enumerate(batches):
-        # 记录批次和原始段落的映射关系
-        start_idx = i * batch_size
-        end_idx = min(start_idx + len(batch), total_paragraphs)
-        batch_to_original_indices[i] = list(range(start_idx, end_idx))
-
-        # 检查这个批次是否需要处理
-        skip_batch = True
-        for j in range(len(batch)):
-            idx = i * batch_size + j
-            if idx < total_paragraphs and idx not in progress_data.get('processed', []):
-                skip_batch = False
-                break
+    所有任务运行在同一个后台事件循环中，共享一个HTTP连接池和一个FairRequestBudget，
+    同时运行的任务数不超过max_active_jobs，其余任务按提交顺序排队。
+    submit可以在任意线程调用；队列变化时在调度线程中调用on_queue_change(排队任务列表)。
+    """
 
-        if skip_batch:
-            logger.info(f"批次 {i+1}/{total_batches} 已处理，跳过")
-            continue
+    def __init__(self, max_active_jobs=DEFAULT_CONFIG['max_active_jobs'],
+                 max_concurrent_requests=DEFAULT_CONFIG['global_max_concurrent_requests'],
+                 on_queue_change=None):
+        self.max_active_jobs = max(1, max_active_jobs)
+        self.max_concurrent_requests = max_concurrent_requests
+        self.on_queue_change = on_queue_change
+        self.budget = None
+        self.session = None
+        self._pending = deque()  # (job_id, job_factory)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def start(self):
+        """在后台线程中启动事件循环（只需调用一次）"""
+        with self._lock:
+            if self._loop:
+                return self
+            self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        async def setup():
+            self.budget = FairRequestBudget(self.max_concurrent_requests)
+            self.session = create_http_session(self.max_concurrent_requests)
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(setup())
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name="translation-scheduler", daemon=True).start()
+        started.wait()
+        return self
+
+    def submit(self, job_id, job_factory):
+        """提交任务，job_factory(budget, session)返回任务协程
+
+        返回排队位置（0表示立即开始）；同一任务已在运行或排队时返回None。
+        """
+        self.start()
+        with self._lock:
+            if job_id in self._active or any(queued == job_id for queued, _ in self._pending):
+                return None
+            self._pending.append((job_id, job_factory))
+            position = max(0, len(self._active) + len(self._pending) - self.max_active_jobs)
+        self._loop.call_soon_threadsafe(self._dispatch)
+        return position
+
+    def queue_position(self, job_id):
+        """返回任务的排队位置：0为正在运行，n为前面还有n-1个排队任务，未知任务返回None"""
+        with self._lock:
+            if job_id in self._active:
+                return 0
+            for position, (queued, _) in enumerate(self._pending, start=1):
+                if queued == job_id:
+                    return position
+        return None
+
+    def queued_jobs(self):
+        with self._lock:
+            return [job_id for job_id, _ in self._pending]
+
+    def _dispatch(self):
+        """在调度线程中启动排队的任务，直到达到同时运行的任务数上限"""
+        started = False
+        with self._lock:
+            while self._pending and len(self._active) < self.max_active_jobs:
+                job_id, job_factory = self._pending.popleft()
+                self._active[job_id] = self._loop.create_task(self._run(job_id, job_factory))
+                started = True
+        if started and self.on_queue_change:
+            self.on_queue_change(self.queued_jobs())
+
+    async def _run(self, job_id, job_factory):
+        try:
+            await job_factory(self.budget, self.session)
+        except Exception:
+            logger.exception(f"翻译任务失败: {job_id}")
+        finally:
+            with self._lock:
+                self._active.pop(job_id, None)
+            self._dispatch()
+
+    def stop(self):
+        """关闭共享的HTTP会话并停止事件循环（所有任务结束后调用）"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if not loop:
+            return
+        asyncio.run_coroutine_threadsafe(self.session.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def collect_pdf_inputs(source):
+    """把目录、通配符或清单文件展开为PDF路径列表（保持顺序并去重）
+
+    目录：其中所有.pdf文件（不含子目录，按文件名排序）；包含*?[的路径：按通配符匹配（支持**）；
+    其他非PDF文件视为清单：每行一个路径，忽略空行和#开头的注释，相对路径相对于清单所在目录。
+    普通的PDF文件返回只包含它自己的列表。
+    """
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(source, name) for name in os.listdir(source)
+                       if name.lower().endswith('.pdf') and os.path.isfile(os.path.join(source, name)))
+    elif any(char in source for char in '*?['):
+        paths = sorted(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+    elif os.path.isfile(source) and not source.lower().endswith('.pdf'):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+        paths = [os.path.join(base_dir, line) for line in lines if line and not line.startswith('#')]
+    else:
+        paths = [source]
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
 
-        # 更新批次索引信息 - 为每个批次创建独立的进度数据副本
-        batch_progress_data = progress_data.copy()
-        batch_progress_data['batch_index'] = i
 
-        # 创建翻译任务
-        task = asyncio.create_task(
-            translate_batch_async(
-                batch, api_key, api_url, api_model,
-                semaphore, batch_progress_data, progress_file
-            )
-        )
-        tasks.append((i, task))  # 存储批次索引和任务
+def is_batch_input(source):
+    """--pdf是否为批量输入（目录、通配符或清单文件）"""
+    return (os.path.isdir(source) or any(char in source for char in '*?[')
+            or (os.path.isfile(source) and not source.lower().endswith('.pdf')))
+
 
-    # 执行所有任务
-    translated_results = []
-    original_order = []  # 保持原始顺序
+def translate_documents(pdf_paths, api_key, output_dir, report_path=None,
+                        max_active_jobs=DEFAULT_CONFIG['max_active_jobs'],
+                        global_max_concurrent_requests=DEFAULT_CONFIG['global_max_concurrent_requests'],
+                        document_cache_dir=DEFAULT_CONFIG['document_cache_dir'], **job_options):
+    """在一个进程中翻译多个PDF，返回汇总报告（同时写入report_path）
 
-    if tasks:
-        logger.info(f"开始执行 {len(tasks)} 个翻译任务")
-        # 按批次顺序收集结果
-        for batch_idx, task in sorted(tasks, key=lambda x: x[0]):
+    所有文档提交到同一个JobScheduler：共享一个HTTP连接池和global_max_concurrent_requests个API并发名额，
+    最多max_active_jobs个文档同时翻译。每个文档开始翻译时，后台线程预先提取排在后面的文档
+    并写入文档缓存（DocumentCache），轮到它时直接读取分段结果，提取与翻译重叠进行。
+    job_options传给main_async（batch_size、每个文档的max_concurrent_requests等）；
+    各文档的输出和进度文件位于output_dir，文件名与单文件模式相同（重名时加序号）。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    sentences_per_paragraph = job_options.get('sentences_per_paragraph', 4)
+    extract_workers = job_options.get('extract_workers', DEFAULT_CONFIG['extract_workers'])
+    extraction_mode = job_options.get('extraction_mode', DEFAULT_CONFIG['extraction_mode'])
+    document_cache = DocumentCache(document_cache_dir)
+
+    names = []
+    for pdf_path in pdf_paths:
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        name, suffix = stem, 2
+        while name in names:
+            name, suffix = f"{stem}_{suffix}", suffix + 1
+        names.append(name)
+
+    results = [None] * len(pdf_paths)
+    prefetches = {}
+    prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="document-prefetch")
+    finished = threading.Semaphore(0)
+    scheduler = JobScheduler(max_active_jobs, global_max_concurrent_requests).start()
+
+    def prefetch(index):
+        """在后台线程中提取第index个文档并写入文档缓存（已安排或超出范围时忽略）"""
+        if index < len(pdf_paths) and index not in prefetches:
+            prefetches[index] = prefetch_executor.submit(
+                document_cache.prefetch, pdf_paths[index], sentences_per_paragraph, extract_workers,
+                create_page_filter(extraction_mode))
+
+    def job_factory(index):
+        pdf_path, name = pdf_paths[index], names[index]
+        output_path = os.path.join(output_dir, f"translated_{name}.docx")
+        progress_file = os.path.join(output_dir, f"progress_{name}.json")
+
+        async def job(request_budget, session):
+            result = {'pdf': pdf_path, 'output': output_path, 'status': 'failed', 'paragraphs': 0,
+                      'dead_letters': 0, 'header_chars_removed': 0, 'extraction_wait': 0.0, 'elapsed': 0.0,
+                      'error': None}
+            started = time.perf_counter()
             try:
-                result = await task
-                if result:  # 有效结果
-                    translated_results.append(result)
-                    # 记录这个批次对应的原始段落索引
-                    if batch_idx in batch_to_original_indices:
-                        original_order.extend(
-                            batch_to_original_indices[batch_idx])
+                # 当前文档开始翻译时，安排提取下一个将要开始的文档
+                prefetch(index + scheduler.max_active_jobs)
+                future = prefetches.get(index)
+                if future:
+                    try:
+                        await asyncio.wrap_future(future)
+                    except Exception as e:
+                        logger.warning(f"预先提取失败，翻译时重新提取: {os.path.basename(pdf_path)} ({e})")
+                    result['extraction_wait'] = round(time.perf_counter() - started, 3)
+                ok = await main_async(
+                    pdf_path, api_key, output_path, progress_file=progress_file,
+                    request_budget=request_budget, session=session, job_id=name,
+                    document_cache_dir=document_cache_dir, **job_options)
+                summary = read_progress_summary(progress_file)
+                result.update(paragraphs=summary.get('total', 0), dead_letters=summary.get('dead_letters', 0),
+                              header_chars_removed=summary.get('header_chars_removed', 0))
+                if ok and os.path.exists(output_path):
+                    result['status'] = 'completed'
+                else:
+                    result['error'] = failure_reason(ok, summary)
             except Exception as e:
-                logger.error(f"批次 {batch_idx} 处理失败: {e}")
+                logger.exception(f"翻译任务失败: {pdf_path}")
+                result['error'] = f"{type(e).__name__}: {e}"
+            finally:
+                result['elapsed'] = round(time.perf_counter() - started, 3)
+                result['paragraphs_per_second'] = (
+                    round(result['paragraphs'] / result['elapsed'], 2) if result['elapsed'] else 0.0)
+                results[index] = result
+                finished.release()
+        return job
+
+    started = time.perf_counter()
+    try:
+        for index in range(min(scheduler.max_active_jobs, len(pdf_paths))):
+            prefetches[index] = None  # 立即开始的文档自己提取
+        for index in range(len(pdf_paths)):
+            scheduler.submit(names[index], job_factory(index))
+        for _ in pdf_paths:
+            finished.acquire()
+    finally:
+        scheduler.stop()
+        prefetch_executor.shutdown(wait=False, cancel_futures=True)
+    elapsed = time.perf_counter() - started
+
+    total_paragraphs = sum(result['paragraphs'] for result in results)
+    report = {
+        'documents': len(results),
+        'completed': sum(1 for result in results if result['status'] == 'completed'),
+        'failed': sum(1 for result in results if result['status'] != 'completed'),
+        'paragraphs': total_paragraphs,
+        'dead_letters': sum(result['dead_letters'] for result in results),
+        'elapsed': round(elapsed, 3),
+        'paragraphs_per_second': round(total_paragraphs / elapsed, 2) if elapsed else 0.0,
+        'results': results
+    }
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"批量翻译报告已保存至: {report_path}")
+    return report
 
-    # 保存结果
-    if translated_results:
+
+def format_batch_report(report):
+    """批量翻译报告的文字摘要（每个文档一行）"""
+    lines = [f"===== 批量翻译: {report['completed']}/{report['documents']} 个文档完成, "
+             f"共 {report['paragraphs']} 个段落, 用时 {report['elapsed']:.1f}s, "
+             f"{report['paragraphs_per_second']:.1f} 段/秒 ====="]
+    for result in report['results']:
+        line = (f"[{'完成' if result['status'] == 'completed' else '失败'}] {os.path.basename(result['pdf'])}: "
+                f"{result['paragraphs']} 段, {result['elapsed']:.1f}s, {result['paragraphs_per_second']:.1f} 段/秒")
+        if result['dead_letters']:
+            line += f", 失败段落 {result['dead_letters']}"
+        if result['error']:
+            line += f", 错误: {result['error']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def plan_page_chunks(start_page, end_page, chunk_pages=DEFAULT_CONFIG['chunk_pages']):
+    """把页码范围[start_page, end_page]（从1开始，包含两端）按chunk_pages页切分，返回[(起始页, 结束页)]"""
+    return [(first, min(first + chunk_pages - 1, end_page)) for first in range(start_page, end_page + 1, chunk_pages)]
+
+
+def chunk_part_paths(output_path, start_page, end_page):
+    """返回页码范围子任务的(输出文件, 进度文件)，位于输出文件旁的“<输出文件名>.parts”目录中"""
+    parts_dir = f"{os.path.splitext(output_path)[0]}.parts"
+    name = f"pages_{start_page:05d}-{end_page:05d}"
+    return os.path.join(parts_dir, f"{name}.docx"), os.path.join(parts_dir, f"{name}.json")
+
+
+def merge_documents(part_paths, output_path, comparison_mode=False):
+    """按顺序把各子任务的输出文档合并为一个文档
+
+    对照模式下只保留第一个文档的标题，各部分之间加分隔线，段落编号改为全文连续编号。
+    """
+    numbered = re.compile(r'段落 (\d+) - (原文|译文)')
+    merged = Document(part_paths[0])
+    body = merged.element.body
+    offset = sum(1 for paragraph in merged.paragraphs if paragraph.text.endswith('原文')
+                 and numbered.fullmatch(paragraph.text))
+    for path in part_paths[1:]:
+        part = Document(path)
+        count = 0
+        for paragraph in part.paragraphs:
+            match = numbered.fullmatch(paragraph.text)
+            if match:
+                paragraph.text = f"段落 {int(match.group(1)) + offset} - {match.group(2)}"
+                count += match.group(2) == '原文'
+        elements = [element for element in part.element.body.iterchildren() if element.tag != qn('w:sectPr')]
         if comparison_mode:
-            # 在对照模式下，根据original_order重新组织原始段落
-            ordered_paragraphs = []
-            for idx in original_order:
-                if 0 <= idx < len(paragraphs):
-                    ordered_paragraphs.append(paragraphs[idx])
-
-            logger.info(
-                f"对照模式: 重新组织了 {len(ordered_paragraphs)} 个原始段落与 {len(translated_results)} 个翻译结果")
-            save_to_word_with_comparison(
-                ordered_paragraphs, translated_results, output_path)
+            if part.paragraphs and part.paragraphs[0].style.name == 'Title':
+                elements = elements[1:]
+            if count and offset:
+                merged.add_paragraph('---')
+        for element in elements:
+            # 新内容插入在文档末尾的节属性之前
+            body.sectPr.addprevious(element)
+        offset += count
+    merged.save(output_path)
+
+
+def translate_in_chunks(pdf_path, api_key, output_path, chunk_pages=DEFAULT_CONFIG['chunk_pages'],
+                        workers=DEFAULT_CONFIG['chunk_workers'], start_page=1, end_page=None, only_chunks=None,
+                        **job_options):
+    """把页码范围切分为子任务分别翻译，再按页码顺序合并为output_path，返回汇总报告
+
+    每个子任务（chunk_pages页）是一次独立的main_async调用，输出、进度、批次日志和失败队列
+    保存在output_path旁的.parts目录中（chunk_part_paths），中断后再次运行时从批次日志恢复。
+    workers大于1时子任务在独立的进程中并行运行，每个进程各自使用job_options中的并发数，
+    API的总并发约为二者之积。已生成输出且没有失败段落的子任务再次运行时跳过；
+    only_chunks为子任务序号（从1开始）的集合时只（重新）运行这些子任务。
+    所有子任务都有输出时合并文档（子任务在页码边界处断开的句子分属前后两个段落）。
+    """
+    total_pages = get_pdf_page_count(pdf_path)
+    last_page = total_pages if end_page is None else min(end_page, total_pages)
+    chunks = plan_page_chunks(max(start_page, 1), last_page, chunk_pages)
+    results = []
+    pending = []
+    for number, (first, last) in enumerate(chunks, start=1):
+        part_output, part_progress = chunk_part_paths(output_path, first, last)
+        summary = read_progress_summary(part_progress) if os.path.exists(part_progress) else {}
+        done = (os.path.exists(part_output) and not summary.get('segmenting')
+                and not summary.get('dead_letters'))
+        result = {'chunk': number, 'pages': [first, last], 'output': part_output,
+                  'status': 'completed' if done else 'pending', 'skipped': True,
+                  'paragraphs': summary.get('total', 0), 'dead_letters': summary.get('dead_letters', 0),
+                  'elapsed': 0.0, 'error': None}
+        results.append(result)
+        if (number in only_chunks) if only_chunks else not done:
+            result['skipped'] = False
+            pending.append((result, dict(job_options, pdf_path=pdf_path, api_key=api_key, output_path=part_output,
+                                         progress_file=part_progress, start_page=first, end_page=last)))
+    if chunks:
+        os.makedirs(os.path.dirname(chunk_part_paths(output_path, *chunks[0])[0]), exist_ok=True)
+    logger.info(f"分块翻译: 第 {max(start_page, 1)}-{last_page} 页分为 {len(chunks)} 个子任务，"
+                f"本次运行 {len(pending)} 个")
+
+    def finish(result, job, outcome):
+        try:
+            ok, result['elapsed'] = outcome()
+        except Exception as e:
+            logger.exception(f"子任务失败: 第 {job['start_page']}-{job['end_page']} 页")
+            ok, result['error'] = False, f"{type(e).__name__}: {e}"
+        summary = {}
+        if os.path.exists(job['progress_file']):
+            summary = read_progress_summary(job['progress_file'])
+            result.update(paragraphs=summary.get('total', 0), dead_letters=summary.get('dead_letters', 0))
+        if ok and os.path.exists(job['output_path']):
+            result['status'] = 'completed'
         else:
-            save_to_word(translated_results, output_path)
-
-        logger.info(f"翻译完成！结果已保存至: {output_path}")
+            result['status'] = 'failed'
+            result['error'] = result['error'] or failure_reason(ok, summary)
+
+    started = time.perf_counter()
+    if workers > 1 and len(pending) > 1:
+        # 主脚本无法被子进程按模块名导入，由pdf_workers按文件路径加载后运行main_async
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futures = [(result, job, executor.submit(pdf_workers.run_translation_chunk, os.path.abspath(__file__),
+                                                     logger.getEffectiveLevel(), job))
+                       for result, job in pending]
+            for result, job, future in futures:
+                finish(result, job, future.result)
+        finally:
+            executor.shutdown(cancel_futures=True)
     else:
-        logger.warning("没有生成翻译结果，请检查是否有错误发生")
+        for result, job in pending:
+            def run(job=job):
+                chunk_started = time.perf_counter()
+                return asyncio.run(main_async(**job)), time.perf_counter() - chunk_started
+            finish(result, job, run)
+    elapsed = time.perf_counter() - started
+
+    merged = bool(results) and all(os.path.exists(result['output']) for result in results)
+    if merged:
+        merge_documents([result['output'] for result in results], output_path,
+                        job_options.get('comparison_mode', False))
+        logger.info(f"已按页码顺序合并 {len(results)} 个子任务的译文: {output_path}")
+    else:
+        logger.warning("部分子任务没有生成译文，暂不合并；再次运行时只运行未完成的子任务")
+    return {
+        'pdf': pdf_path,
+        'output': output_path if merged else None,
+        'merged': merged,
+        'pages': [max(start_page, 1), last_page],
+        'paragraphs': sum(result['paragraphs'] for result in results),
+        'dead_letters': sum(result['dead_letters'] for result in results),
+        'elapsed': round(elapsed, 3),
+        'chunks': results
+    }
 
-    return True
+
+def format_chunk_report(report):
+    """分块翻译报告的文字摘要（每个子任务一行）"""
+    completed = sum(1 for result in report['chunks'] if result['status'] == 'completed')
+    lines = [f"===== 分块翻译: 第 {report['pages'][0]}-{report['pages'][1]} 页, "
+             f"{completed}/{len(report['chunks'])} 个子任务完成, 共 {report['paragraphs']} 个段落, "
+             f"用时 {report['elapsed']:.1f}s, "
+             f"{'已合并至 ' + report['output'] if report['merged'] else '未合并'} ====="]
+    labels = {'completed': '完成', 'failed': '失败', 'pending': '未运行'}
+    for result in report['chunks']:
+        line = (f"[{labels[result['status']]}] #{result['chunk']} 第 {result['pages'][0]}-{result['pages'][1]} 页: "
+                f"{result['paragraphs']} 段")
+        line += ", 跳过" if result['skipped'] else f", {result['elapsed']:.1f}s"
+        if result['dead_letters']:
+            line += f", 失败段落 {result['dead_letters']}"
+        if result['error']:
+            line += f", 错误: {result['error']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class SQLiteJobStore:
+    """分片翻译任务的共享存储（SQLite，WAL模式）
+
+    一个任务按页码范围切分为多个分片（plan_page_chunks），各工作进程（run_worker）从存储中领取分片。
+    领取时获得lease秒的租约，翻译过程中定期续约（heartbeat）；工作进程退出或失联时租约过期，
+    分片自动回到可领取状态，领取次数达到max_attempts仍未完成的分片标记为失败。
+    分片完成时提交输出文档的内容，全部分片完成后由一个工作进程合并（begin_assembly保证只合并一次），
+    合并结果也保存在存储中。原PDF同样保存在存储中，其他主机上的工作进程可以取回。
+    REMOTE_METHODS中方法的参数和返回值都可以JSON序列化（bytes除外，见encode_job_store_value），
+    Web端的/jobstore接口按方法名转发，供HttpJobStore在其他主机上访问。
+    """
+
+    REMOTE_METHODS = frozenset({
+        'submit', 'claim', 'heartbeat', 'complete', 'release', 'document', 'job', 'pending_work',
+        'assemblable_jobs', 'begin_assembly', 'shard_outputs', 'finish_assembly', 'output'})
+
+    def __init__(self, db_path, lease=DEFAULT_CONFIG['job_store_lease'],
+                 max_attempts=DEFAULT_CONFIG['job_store_max_attempts']):
+        self.db_path = db_path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # 自动提交模式，写事务显式使用BEGIN IMMEDIATE，多个进程同时领取时由SQLite的写锁串行化
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS documents (sha256 TEXT PRIMARY KEY, content BLOB NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, pdf_name TEXT NOT NULL, pdf_sha256 TEXT NOT NULL, options TEXT NOT NULL, "
+            "status TEXT NOT NULL, lease_expires REAL, output BLOB, created REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS shards ("
+            "job_id TEXT NOT NULL, shard INTEGER NOT NULL, start_page INTEGER NOT NULL, end_page INTEGER NOT NULL, "
+            "status TEXT NOT NULL, worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "paragraphs INTEGER NOT NULL DEFAULT 0, dead_letters INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "output BLOB, PRIMARY KEY (job_id, shard));"
+            "CREATE INDEX IF NOT EXISTS idx_shards_status ON shards(status, lease_expires);")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def submit(self, pdf_name, content, shards, options, job_id=None):
+        """新建任务：shards为[(起始页, 结束页)]，options为传给main_async的参数（不含API密钥），返回任务ID"""
+        digest = hashlib.sha256(content).hexdigest()
+        job_id = job_id or f"{os.path.splitext(pdf_name)[0]}-{int(time.time())}-{digest[:8]}"
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO documents (sha256, content) VALUES (?, ?)", (digest, content))
+            conn.execute("INSERT INTO jobs (job_id, pdf_name, pdf_sha256, options, status, created) "
+                         "VALUES (?, ?, ?, ?, 'running', ?)",
+                         (job_id, pdf_name, digest, json.dumps(options, ensure_ascii=False), time.time()))
+            conn.executemany("INSERT INTO shards (job_id, shard, start_page, end_page, status) "
+                             "VALUES (?, ?, ?, ?, 'pending')",
+                             [(job_id, number, first, last) for number, (first, last) in enumerate(shards, start=1)])
+        return job_id
+
+    def claim(self, worker_id, lease=None):
+        """领取一个待处理或租约已过期的分片（按任务提交顺序），没有时返回None"""
+        now = time.time()
+        with self._transaction() as conn:
+            # 领取次数已达上限的分片租约过期后不再重试（例如每次处理都会使工作进程崩溃）
+            conn.execute("UPDATE shards SET status = 'failed', error = COALESCE(error, '租约多次过期') "
+                         "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+            row = conn.execute(
+                "SELECT s.job_id, s.shard, s.start_page, s.end_page, s.attempts, j.pdf_name, j.pdf_sha256, j.options "
+                "FROM shards s JOIN jobs j ON j.job_id = s.job_id "
+                "WHERE s.status = 'pending' OR (s.status = 'leased' AND s.lease_expires < ?) "
+                "ORDER BY j.created, s.shard LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE shards SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                         "WHERE job_id = ? AND shard = ?",
+                         (worker_id, now + (lease or self.lease), row['job_id'], row['shard']))
+        claim = dict(row)
+        claim['options'] = json.loads(claim['options'])
+        claim['attempts'] += 1
+        return claim
+
+    def heartbeat(self, job_id, shard, worker_id, lease=None):
+        """续约，租约已被其他工作进程接手时返回False"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE shards SET lease_expires = ? WHERE job_id = ? AND shard = ? AND worker = ? AND status = 'leased'",
+                (time.time() + (lease or self.lease), job_id, shard, worker_id)).rowcount == 1
+
+    def complete(self, job_id, shard, worker_id, content, paragraphs=0, dead_letters=0):
+        """提交分片的输出文档，租约已失效时返回False（结果以接手的工作进程为准）"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE shards SET status = 'done', output = ?, paragraphs = ?, dead_letters = ?, error = NULL "
+                "WHERE job_id = ? AND shard = ? AND worker = ? AND status = 'leased'",
+                (content, paragraphs, dead_letters, job_id, shard, worker_id)).rowcount == 1
+
+    def release(self, job_id, shard, worker_id, error):
+        """分片处理失败：放回队列，领取次数已达上限时标记为失败"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_expires = NULL, error = ? "
+                "WHERE job_id = ? AND shard = ? AND worker = ? AND status = 'leased'",
+                (self.max_attempts, error, job_id, shard, worker_id))
+
+    def document(self, pdf_sha256):
+        row = self.conn.execute("SELECT content FROM documents WHERE sha256 = ?", (pdf_sha256,)).fetchone()
+        return bytes(row['content']) if row else None
+
+    def job(self, job_id):
+        """返回任务状态：各状态的分片数、段落数、失败段落数和失败分片的错误，任务不存在时返回None"""
+        job = self.conn.execute("SELECT job_id, pdf_name, status, options FROM jobs WHERE job_id = ?",
+                                (job_id,)).fetchone()
+        if job is None:
+            return None
+        shards = self.conn.execute(
+            "SELECT shard, start_page, end_page, status, worker, attempts, paragraphs, dead_letters, error "
+            "FROM shards WHERE job_id = ? ORDER BY shard", (job_id,)).fetchall()
+        counts = Counter(shard['status'] for shard in shards)
+        status = job['status']
+        if status == 'running' and counts['failed']:
+            status = 'failed'
+        return {'job_id': job_id, 'pdf_name': job['pdf_name'], 'status': status,
+                'options': json.loads(job['options']), 'shards': len(shards), 'counts': dict(counts),
+                'paragraphs': sum(shard['paragraphs'] for shard in shards),
+                'dead_letters': sum(shard['dead_letters'] for shard in shards),
+                'errors': {shard['shard']: shard['error'] for shard in shards if shard['error']}}
+
+    def pending_work(self):
+        """尚未结束的分片数（待处理或已领取）加上等待合并的任务数"""
+        shards = self.conn.execute(
+            "SELECT COUNT(*) FROM shards WHERE status IN ('pending', 'leased')").fetchone()[0]
+        return shards + len(self.assemblable_jobs())
+
+    def assemblable_jobs(self):
+        """所有分片都已完成、尚未合并（或合并者失联）的任务"""
+        rows = self.conn.execute(
+            "SELECT job_id FROM jobs j WHERE (status = 'running' OR (status = 'assembling' AND lease_expires < ?)) "
+            "AND NOT EXISTS (SELECT 1 FROM shards s WHERE s.job_id = j.job_id AND s.status != 'done') "
+            "ORDER BY created", (time.time(),)).fetchall()
+        return [row['job_id'] for row in rows]
+
+    def begin_assembly(self, job_id, lease=None):
+        """所有分片都完成时取得合并权，保证同一时间只有一个工作进程合并"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'assembling', lease_expires = ? WHERE job_id = ? "
+                "AND (status = 'running' OR (status = 'assembling' AND lease_expires < ?)) "
+                "AND NOT EXISTS (SELECT 1 FROM shards s WHERE s.job_id = ? AND s.status != 'done')",
+                (time.time() + (lease or self.lease), job_id, time.time(), job_id)).rowcount == 1
+
+    def shard_outputs(self, job_id):
+        """按页码顺序返回各分片的输出文档内容"""
+        rows = self.conn.execute("SELECT output FROM shards WHERE job_id = ? ORDER BY shard", (job_id,)).fetchall()
+        return [bytes(row['output']) for row in rows]
+
+    def finish_assembly(self, job_id, content):
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'assembled', output = ?, lease_expires = NULL WHERE job_id = ?",
+                         (content, job_id))
+            # 合并后不再需要分片的输出
+            conn.execute("UPDATE shards SET output = NULL WHERE job_id = ?", (job_id,))
+
+    def output(self, job_id):
+        """合并后的文档内容，尚未合并时返回None"""
+        row = self.conn.execute("SELECT output FROM jobs WHERE job_id = ? AND status = 'assembled'",
+                                (job_id,)).fetchone()
+        return bytes(row['output']) if row else None
+
+    def close(self):
+        self.conn.close()
+
+
+def encode_job_store_value(value):
+    """把参数或返回值中的bytes编码为{"__bytes__": base64}，以便通过JSON传输"""
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (list, tuple)):
+        return [encode_job_store_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode_job_store_value(item) for key, item in value.items()}
+    return value
+
+
+def decode_job_store_value(value):
+    if isinstance(value, list):
+        return [decode_job_store_value(item) for item in value]
+    if isinstance(value, dict):
+        if set(value) == {'__bytes__'}:
+            return base64.b64decode(value['__bytes__'])
+        return {key: decode_job_store_value(item) for key, item in value.items()}
+    return value
+
+
+class HttpJobStore:
+    """通过Web端的/jobstore接口访问另一台主机上的SQLiteJobStore，方法与SQLiteJobStore相同
+
+    每个请求在X-Job-Store-Token请求头中附带共享密钥，与Web端的job_store_token一致时才会被接受。
+    """
+
+    def __init__(self, base_url, token=None, timeout=DEFAULT_CONFIG['read_timeout']):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers['X-Job-Store-Token'] = token or DEFAULT_CONFIG['job_store_token']
+
+    def _call(self, method, *args, **kwargs):
+        # 位置参数按SQLiteJobStore中方法的签名转换为关键字参数
+        params = inspect.signature(getattr(SQLiteJobStore, method)).bind(self, *args, **kwargs).arguments
+        params.pop('self')
+        response = self._session.post(f"{self.base_url}/jobstore/{method}", json=encode_job_store_value(params),
+                                      timeout=self.timeout)
+        response.raise_for_status()
+        return decode_job_store_value(response.json()['result'])
+
+    def __getattr__(self, method):
+        if method not in SQLiteJobStore.REMOTE_METHODS:
+            raise AttributeError(method)
+        return functools.partial(self._call, method)
+
+    def close(self):
+        self._session.close()
+
+
+# 任务存储的地址前缀 -> 存储类，新的存储后端在这里注册
+JOB_STORE_BACKENDS = {
+    'sqlite': lambda location: SQLiteJobStore(location[2:] if location.startswith('//') else location),
+    'http': lambda location: HttpJobStore(f"http:{location}"),
+    'https': lambda location: HttpJobStore(f"https:{location}"),
+}
+
+
+def open_job_store(url):
+    """按地址打开任务存储：“sqlite:路径”或不带前缀的路径为SQLite文件，“http(s)://主机:端口”为Web端的存储接口"""
+    scheme, separator, location = url.partition(':')
+    if separator and scheme in JOB_STORE_BACKENDS:
+        return JOB_STORE_BACKENDS[scheme](location)
+    return SQLiteJobStore(url)
+
+
+# 分片任务中可以由提交者指定的main_async参数。API地址、缓存路径等只使用工作进程自己的配置，
+# 否则能提交任务的人就可以让工作进程把API密钥发送到任意地址
+SHARD_JOB_OPTIONS = frozenset({
+    'comparison_mode', 'batch_size', 'max_concurrent_requests', 'api_model', 'sentences_per_paragraph',
+    'temperature', 'use_cache', 'extract_workers', 'adaptive_concurrency', 'max_concurrent_limit',
+    'batching', 'max_input_tokens', 'max_output_tokens', 'stream_responses', 'dedup', 'extraction_mode'
+})
+
+
+def submit_sharded_job(store, pdf_path, chunk_pages=DEFAULT_CONFIG['chunk_pages'], start_page=1, end_page=None,
+                       job_id=None, **job_options):
+    """把PDF的页码范围按chunk_pages页切分为分片提交到任务存储，返回任务ID
+
+    job_options为main_async的参数（batch_size、max_concurrent_requests等，需可JSON序列化），
+    只接受SHARD_JOB_OPTIONS中的参数；API密钥和API地址不保存在存储中，由各工作进程自己提供。
+    """
+    unsupported = sorted(set(job_options) - SHARD_JOB_OPTIONS)
+    if unsupported:
+        raise ValueError(f"分片任务不支持的参数: {', '.join(unsupported)}")
+    total_pages = get_pdf_page_count(pdf_path)
+    last_page = total_pages if end_page is None else min(end_page, total_pages)
+    shards = plan_page_chunks(max(start_page, 1), last_page, chunk_pages)
+    with open(pdf_path, 'rb') as f:
+        content = f.read()
+    job_id = store.submit(os.path.basename(pdf_path), content, shards, job_options, job_id)
+    logger.info(f"已提交分片任务 {job_id}: 第 {max(start_page, 1)}-{last_page} 页分为 {len(shards)} 个分片")
+    return job_id
+
+
+async def translate_shard(store, claim, api_key, worker_id, work_dir, lease, api_url=DEFAULT_CONFIG['api_url']):
+    """翻译一个分片，同时每1/3租约时长续约一次；租约被其他工作进程接手时取消翻译
+
+    任务参数中只使用SHARD_JOB_OPTIONS中的参数，API地址使用工作进程自己的api_url。
+    返回(main_async的结果, 输出文件, 进度文件)，租约丢失时结果为None。
+    """
+    options = {key: value for key, value in claim['options'].items() if key in SHARD_JOB_OPTIONS}
+    ignored = sorted(set(claim['options']) - SHARD_JOB_OPTIONS)
+    if ignored:
+        logger.warning(f"任务 {claim['job_id']} 包含不允许的参数，已忽略: {', '.join(ignored)}")
+    loop = asyncio.get_running_loop()
+    pdf_path = os.path.join(work_dir, "documents", f"{claim['pdf_sha256']}.pdf")
+    if not os.path.exists(pdf_path):
+        # 其他主机提交的PDF：从存储取回后保存在本地，同一主机上的工作进程共用
+        content = await loop.run_in_executor(None, store.document, claim['pdf_sha256'])
+        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, pdf_path)
+
+    # 进度和批次日志按任务和页码范围保存，同一主机上接手的工作进程可以从中恢复
+    output_path, progress_file = chunk_part_paths(
+        os.path.join(work_dir, claim['job_id'], "translated.docx"), claim['start_page'], claim['end_page'])
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    translation = asyncio.create_task(main_async(
+        pdf_path, api_key, output_path, progress_file=progress_file,
+        start_page=claim['start_page'], end_page=claim['end_page'],
+        api_url=api_url, job_id=f"{claim['job_id']}#{claim['shard']}", **options))
+    while True:
+        done, _ = await asyncio.wait({translation}, timeout=lease / 3)
+        if done:
+            return translation.result(), output_path, progress_file
+        if not await loop.run_in_executor(None, store.heartbeat, claim['job_id'], claim['shard'], worker_id, lease):
+            translation.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await translation
+            return None, output_path, progress_file
+
+
+def assemble_job(store, job_id, work_dir):
+    """按页码顺序合并任务的全部分片，结果保存到存储中"""
+    job = store.job(job_id)
+    assembly_dir = os.path.join(work_dir, job_id, "assembly")
+    os.makedirs(assembly_dir, exist_ok=True)
+    part_paths = []
+    for number, content in enumerate(store.shard_outputs(job_id), start=1):
+        part_paths.append(os.path.join(assembly_dir, f"shard_{number:05d}.docx"))
+        with open(part_paths[-1], 'wb') as f:
+            f.write(content)
+    output_path = os.path.join(assembly_dir, "translated.docx")
+    merge_documents(part_paths, output_path, job['options'].get('comparison_mode', False))
+    with open(output_path, 'rb') as f:
+        store.finish_assembly(job_id, f.read())
+    logger.info(f"任务 {job_id} 的 {len(part_paths)} 个分片已合并")
+
+
+def run_worker(store, api_key, worker_id=None, work_dir=DEFAULT_CONFIG['worker_dir'],
+               lease=DEFAULT_CONFIG['job_store_lease'], poll_interval=DEFAULT_CONFIG['job_store_poll_interval'],
+               exit_when_idle=False, api_url=DEFAULT_CONFIG['api_url']):
+    """工作进程主循环：领取分片 → 翻译 → 提交结果，任务的最后一个分片完成后合并文档
+
+    api_key和api_url来自工作进程自己的配置，不从任务存储读取。
+    没有可领取的分片时每poll_interval秒轮询一次；exit_when_idle为True时，
+    所有任务都已结束（没有待处理、已领取或等待合并的工作）后返回。返回本进程完成的分片数。
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    completed = 0
+    logger.info(f"工作进程 {worker_id} 已启动")
+    while True:
+        for job_id in store.assemblable_jobs():
+            if store.begin_assembly(job_id, lease):
+                assemble_job(store, job_id, work_dir)
+
+        claim = store.claim(worker_id, lease)
+        if claim is None:
+            if exit_when_idle and not store.pending_work():
+                logger.info(f"工作进程 {worker_id} 没有剩余工作，退出（完成 {completed} 个分片）")
+                return completed
+            time.sleep(poll_interval)
+            continue
+
+        label = f"{claim['job_id']} 分片 {claim['shard']}（第 {claim['start_page']}-{claim['end_page']} 页）"
+        logger.info(f"[{worker_id}] 领取 {label}，第 {claim['attempts']} 次")
+        try:
+            ok, output_path, progress_file = asyncio.run(
+                translate_shard(store, claim, api_key, worker_id, work_dir, lease, api_url))
+        except Exception as e:
+            logger.exception(f"[{worker_id}] {label} 失败")
+            store.release(claim['job_id'], claim['shard'], worker_id, f"{type(e).__name__}: {e}")
+            continue
+        if ok is None:
+            logger.warning(f"[{worker_id}] {label} 的租约已被其他工作进程接手，放弃本次结果")
+            continue
+        if not ok or not os.path.exists(output_path):
+            store.release(claim['job_id'], claim['shard'], worker_id,
+                          failure_reason(ok, read_progress_summary(progress_file)))
+            continue
+
+        summary = read_progress_summary(progress_file)
+        with open(output_path, 'rb') as f:
+            content = f.read()
+        if store.complete(claim['job_id'], claim['shard'], worker_id, content,
+                          summary.get('total', 0), summary.get('dead_letters', 0)):
+            completed += 1
+            logger.info(f"[{worker_id}] {label} 完成")
+        else:
+            logger.warning(f"[{worker_id}] {label} 的租约已过期，结果未被采用")
+
+
+def wait_for_job(store, job_id, output_path, poll_interval=DEFAULT_CONFIG['job_store_poll_interval']):
+    """等待任务合并完成并把结果写入output_path，任务失败时返回False"""
+    while True:
+        job = store.job(job_id)
+        if job is None:
+            raise ValueError(f"任务不存在: {job_id}")
+        if job['status'] == 'assembled':
+            with open(output_path, 'wb') as f:
+                f.write(store.output(job_id))
+            return True
+        if job['status'] == 'failed':
+            logger.error(f"任务 {job_id} 有分片多次失败: {job['errors']}")
+            return False
+        time.sleep(poll_interval)
+
+
+async def retry_dead_letters(dead_letter_file, api_key, api_url=DEFAULT_CONFIG['api_url'],
+                             api_model=DEFAULT_CONFIG['api_model'], temperature=DEFAULT_CONFIG['temperature'],
+                             cache_path=DEFAULT_CONFIG['cache_path']):
+    """逐段重试失败队列中的段落
+
+    成功的译文写入翻译记忆，之后恢复翻译任务时这些段落会直接命中缓存；
+    仍然失败的段落写回失败队列文件。返回(成功数, 剩余失败数)。
+    """
+    if not os.path.exists(dead_letter_file):
+        return 0, 0
+    with open(dead_letter_file, 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    remaining = []
+    memory = TranslationMemory(cache_path)
+    session = create_http_session(1)
+    try:
+        for entry in entries:
+            try:
+                text = await translate_with_deepseek_async(
+                    [entry['paragraph']], api_key, api_url, api_model, temperature,
+                    retries=DEFAULT_CONFIG['retries'], delay=DEFAULT_CONFIG['retry_delay'],
+                    session=session, raise_on_failure=True, raw_output=True)
+                translation = parse_numbered_translation(text, 1)[0]
+                if not translation:
+                    raise TranslationAPIError("API返回空译文")
+                memory.store([entry['paragraph']], [translation], api_model, temperature)
+            except TranslationAPIError as e:
+                entry.update(status=e.status, error=str(e))
+                remaining.append(entry)
+    finally:
+        await session.close()
+        memory.close()
+
+    with open(dead_letter_file, 'w', encoding='utf-8') as f:
+        for entry in remaining:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    logger.info(f"失败队列重试: 成功 {len(entries) - len(remaining)} 个段落, 仍失败 {len(remaining)} 个段落")
+    return len(entries) - len(remaining), len(remaining)
 
 
 def main():
     """命令行入口函数"""
     parser = argparse.ArgumentParser(description="PDF文档翻译工具")
-    parser.add_argument("--pdf", help="PDF文件路径",
+    parser.add_argument("--pdf", help="PDF文件路径；也可以是目录、通配符（如'books/**/*.pdf'）或清单文件，"
+                                      "此时在一个进程中批量翻译所有文档",
                         default=DEFAULT_CONFIG["pdf_path"])
     parser.add_argument("--api-key", help="API密钥",
                         default=DEFAULT_CONFIG["api_key"])
     parser.add_argument("--output", help="输出文件路径", default="")
     parser.add_argument("--comparison", help="是否生成对照文档", action="store_true")
-    parser.add_argument("--batch", help="批处理大小", type=int,
+    parser.add_argument("--batch", help="批处理大小（按段落数组批时使用）", type=int,
                         default=DEFAULT_CONFIG["batch_size"])
-    parser.add_argument("--concurrent", help="并发请求数", type=int,
+    parser.add_argument("--batching", help="组批方式：tokens按token预算，count按段落数",
+                        choices=["tokens", "count"], default=DEFAULT_CONFIG["batching"])
+    parser.add_argument("--max-input-tokens", help="每个请求的原文token预算", type=int,
+                        default=DEFAULT_CONFIG["max_input_tokens"])
+    parser.add_argument("--max-output-tokens", help="每个请求的译文token预算", type=int,
+                        default=DEFAULT_CONFIG["max_output_tokens"])
+    parser.add_argument("--concurrent", help="并发请求数（自适应模式下为初始并发数）", type=int,
                         default=DEFAULT_CONFIG["max_concurrent_requests"])
+    parser.add_argument("--max-concurrent", help="自适应并发的上限", type=int,
+                        default=DEFAULT_CONFIG["max_concurrent_limit"])
+    parser.add_argument("--fixed-concurrency", help="使用固定并发数，不自动调整", action="store_true")
     parser.add_argument("--sentences", help="每个段落包含的句子数", type=int, default=4)
+    parser.add_argument("--no-cache", help="不使用翻译记忆缓存", action="store_true")
+    parser.add_argument("--extract-workers", help="PDF提取进程数", type=int,
+                        default=DEFAULT_CONFIG["extract_workers"])
+    parser.add_argument("--no-stream", help="等待完整响应，不使用流式接收", action="store_true")
+    parser.add_argument("--no-dedup", help="不合并重复段落，每个段落都发送给API", action="store_true")
+    parser.add_argument("--extraction-mode", help="PDF提取方式：layout去除页眉、页脚和页码，text使用每页的全部文本",
+                        choices=["layout", "text"], default=DEFAULT_CONFIG["extraction_mode"])
+    parser.add_argument("--retry-dead-letters", help="先逐段重试上次失败的段落，再继续翻译任务",
+                        action="store_true")
+    parser.add_argument("--profile", help="记录各阶段耗时，结束时输出分阶段耗时表", action="store_true")
+    parser.add_argument("--log-level", help="日志级别", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        default=DEFAULT_CONFIG["log_level"])
+    parser.add_argument("--trace-sample-rate", help="记录逐段落跟踪日志并按该比例采样（0-1）", type=float)
+    parser.add_argument("--output-dir", help="批量翻译的输出目录", default=DEFAULT_CONFIG["output_dir"])
+    parser.add_argument("--report", help="批量翻译汇总报告路径（默认为输出目录下的batch_report.json）")
+    parser.add_argument("--max-active-jobs", help="批量翻译时同时翻译的文档数", type=int,
+                        default=DEFAULT_CONFIG["max_active_jobs"])
+    parser.add_argument("--global-concurrent", help="批量翻译时所有文档共享的API并发数", type=int,
+                        default=DEFAULT_CONFIG["global_max_concurrent_requests"])
+    parser.add_argument("--start-page", help="起始页码（从1开始）", type=int, default=1)
+    parser.add_argument("--end-page", help="结束页码（包含该页，默认到最后一页）", type=int)
+    parser.add_argument("--chunk-pages", help="分块翻译：每个页码范围子任务的页数，子任务可并行运行和单独重新运行，"
+                                              "完成后合并为一个文档", type=int)
+    parser.add_argument("--chunk-workers", help="分块翻译时同时运行子任务的进程数", type=int,
+                        default=DEFAULT_CONFIG["chunk_workers"])
+    parser.add_argument("--chunks", help="分块翻译时只（重新）运行这些子任务（序号从1开始）", type=int, nargs="+")
+    parser.add_argument("--job-store", help="分片任务存储：SQLite文件路径（sqlite:路径）或Web端地址（http://主机:端口）；"
+                                            "与--pdf一起使用时按--chunk-pages切分后提交任务")
+    parser.add_argument("--local-workers", help="提交任务后在本机启动的工作进程数，等待合并完成后写入输出文件",
+                        type=int, default=0)
+    parser.add_argument("--worker", help="作为工作进程运行：从--job-store领取分片翻译", action="store_true")
+    parser.add_argument("--exit-when-idle", help="工作进程在没有剩余工作时退出", action="store_true")
+    parser.add_argument("--collect", help="等待该任务合并完成后写入输出文件", metavar="JOB_ID")
 
     args = parser.parse_args()
+    levels = dict(DEFAULT_CONFIG["log_levels"])
+    if args.trace_sample_rate:
+        levels["translator.trace"] = "DEBUG"
+    setup_logging(args.log_level, levels=levels, trace_sample_rate=args.trace_sample_rate)
+
+    if args.worker:
+        run_worker(open_job_store(args.job_store), args.api_key, exit_when_idle=args.exit_when_idle)
+        return
+
+    if is_batch_input(args.pdf):
+        pdf_paths = collect_pdf_inputs(args.pdf)
+        if not pdf_paths:
+            print(f"没有找到PDF文件: {args.pdf}")
+            return
+        report = translate_documents(
+            pdf_paths, args.api_key, args.output_dir,
+            report_path=args.report or os.path.join(args.output_dir, "batch_report.json"),
+            max_active_jobs=args.max_active_jobs, global_max_concurrent_requests=args.global_concurrent,
+            comparison_mode=args.comparison,
+            batch_size=args.batch,
+            max_concurrent_requests=args.concurrent,
+            sentences_per_paragraph=args.sentences,
+            use_cache=not args.no_cache,
+            extract_workers=args.extract_workers,
+            adaptive_concurrency=not args.fixed_concurrency,
+            max_concurrent_limit=args.max_concurrent,
+            batching=args.batching,
+            max_input_tokens=args.max_input_tokens,
+            max_output_tokens=args.max_output_tokens,
+            stream_responses=not args.no_stream,
+            dedup=not args.no_dedup,
+            extraction_mode=args.extraction_mode)
+        print(format_batch_report(report))
+        return
 
     # 设置输出路径
     if not args.output:
@@ -855,23 +4095,107 @@ def main():
         os.makedirs(output_dir, exist_ok=True)
         args.output = os.path.join(output_dir, f"translated_{pdf_name}.docx")
 
+    if args.job_store:
+        store = open_job_store(args.job_store)
+        job_id = args.collect
+        if not job_id:
+            job_id = submit_sharded_job(
+                store, args.pdf, chunk_pages=args.chunk_pages or DEFAULT_CONFIG["chunk_pages"],
+                start_page=args.start_page, end_page=args.end_page,
+                comparison_mode=args.comparison,
+                batch_size=args.batch,
+                max_concurrent_requests=args.concurrent,
+                sentences_per_paragraph=args.sentences,
+                use_cache=not args.no_cache,
+                extract_workers=args.extract_workers,
+                adaptive_concurrency=not args.fixed_concurrency,
+                max_concurrent_limit=args.max_concurrent,
+                batching=args.batching,
+                max_input_tokens=args.max_input_tokens,
+                max_output_tokens=args.max_output_tokens,
+                stream_responses=not args.no_stream,
+                dedup=not args.no_dedup,
+                extraction_mode=args.extraction_mode)
+            print(f"已提交任务: {job_id}")
+        if not args.local_workers and not args.collect:
+            return
+        # 本机工作进程在所有任务结束后退出；其他主机上的工作进程可以同时领取分片
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=pdf_workers.run_job_worker, args=(
+            os.path.abspath(__file__), logger.getEffectiveLevel(), args.job_store, args.api_key))
+            for _ in range(args.local_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            ok = wait_for_job(store, job_id, args.output)
+        finally:
+            for worker in workers:
+                worker.join()
+        print(f"任务 {job_id} 完成！结果已保存到: {args.output}" if ok else f"任务 {job_id} 失败")
+        return
+
+    if args.chunk_pages:
+        report = translate_in_chunks(
+            args.pdf, args.api_key, args.output, chunk_pages=args.chunk_pages, workers=args.chunk_workers,
+            start_page=args.start_page, end_page=args.end_page, only_chunks=set(args.chunks or ()),
+            comparison_mode=args.comparison,
+            batch_size=args.batch,
+            max_concurrent_requests=args.concurrent,
+            sentences_per_paragraph=args.sentences,
+            use_cache=not args.no_cache,
+            extract_workers=args.extract_workers,
+            adaptive_concurrency=not args.fixed_concurrency,
+            max_concurrent_limit=args.max_concurrent,
+            batching=args.batching,
+            max_input_tokens=args.max_input_tokens,
+            max_output_tokens=args.max_output_tokens,
+            stream_responses=not args.no_stream,
+            dedup=not args.no_dedup,
+            extraction_mode=args.extraction_mode)
+        print(format_chunk_report(report))
+        return
+
     # 设置进度文件
     progress_file = os.path.join(
         DEFAULT_CONFIG["output_dir"], f"progress_{os.path.basename(args.pdf).rsplit('.', 1)[0]}.json")
 
+    if args.retry_dead_letters:
+        # 重试成功的译文通过翻译记忆回填，因此继续翻译时必须启用缓存
+        succeeded, remaining = asyncio.run(retry_dead_letters(
+            dead_letter_file_for(progress_file), args.api_key))
+        print(f"失败段落重试完成: 成功 {succeeded} 个, 仍失败 {remaining} 个")
+        args.no_cache = False
+
     # 运行翻译
+    metrics = Metrics() if args.profile else None
     asyncio.run(main_async(
         pdf_path=args.pdf,
         api_key=args.api_key,
         output_path=args.output,
         progress_file=progress_file,
+        start_page=args.start_page,
+        end_page=args.end_page,
         comparison_mode=args.comparison,
         batch_size=args.batch,
         max_concurrent_requests=args.concurrent,
-        sentences_per_paragraph=args.sentences
+        sentences_per_paragraph=args.sentences,
+        use_cache=not args.no_cache,
+        extract_workers=args.extract_workers,
+        adaptive_concurrency=not args.fixed_concurrency,
+        max_concurrent_limit=args.max_concurrent,
+        batching=args.batching,
+        max_input_tokens=args.max_input_tokens,
+        max_output_tokens=args.max_output_tokens,
+        stream_responses=not args.no_stream,
+        dedup=not args.no_dedup,
+        extraction_mode=args.extraction_mode,
+        document_cache_dir=DEFAULT_CONFIG["document_cache_dir"],
+        metrics=metrics
     ))
 
     print(f"翻译完成！结果已保存到: {args.output}")
+    if metrics:
+        print(metrics.format_report())
 
 
 if __name__ == "__main__":
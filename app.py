@@ -1,8 +1,13 @@
 import os
-import asyncio
+import contextlib
+import hashlib
+import hmac
 import json
+import secrets
 import shutil
-from flask import Flask, request, render_template, redirect, url_for, flash, send_from_directory, jsonify
+import threading
+from flask import Flask, request, render_template, redirect, url_for, flash, send_from_directory, jsonify, \
+    Response, stream_with_context, session
 from werkzeug.utils import secure_filename
 import tempfile
 from pathlib import Path
@@ -18,20 +23,301 @@ translator_path = os.path.join(current_dir, "#Book TranslateV1.py")
 spec = spec_from_file_location("translator", translator_path)
 translator = module_from_spec(spec)
 spec.loader.exec_module(translator)
+# 翻译模块导入时不配置日志，由Web入口配置（后台线程写日志，不阻塞翻译事件循环）
+translator.setup_logging()
 
 app = Flask(__name__)
 app.secret_key = 'translation_secret_key'  # 用于flash消息
 app.config['UPLOAD_FOLDER'] = os.path.join(current_dir, 'uploads')
 app.config['OUTPUT_FOLDER'] = os.path.join(current_dir, 'outputs')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB最大上传限制
+app.config['MAX_CONTENT_LENGTH'] = 64 * 1024 * 1024  # 单个请求的最大长度（分块上传的每一块、不分块的表单上传）
+app.config['MAX_UPLOAD_SIZE'] = 2 * 1024 * 1024 * 1024  # 分块上传的文件大小上限（2GB）
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024  # 分块上传时每块的大小
 
 # 确保上传和输出目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
+# 文档缓存：预览、启动翻译和翻译流水线共用，同一个PDF只提取一次
+document_cache = translator.DocumentCache(os.path.join(app.config['OUTPUT_FOLDER'], 'documents'))
+# 预览按页窗口提取，页面文本保存在LRU缓存中
+previewer = translator.PdfPreviewer(document_cache)
+
+# 分片任务存储：其他主机上的工作进程通过/jobstore接口访问（--job-store http://主机:端口）
+job_store = None
+job_store_lock = threading.Lock()
+
 # 允许的文件类型
 ALLOWED_EXTENSIONS = {'pdf'}
 
+# 进度推送的心跳间隔（秒），防止代理关闭空闲连接
+PROGRESS_KEEPALIVE = 15
+
+
+class ProgressBroker:
+    """保存各翻译任务的最新进度（内存中），并唤醒等待推送的连接
+
+    翻译线程调用publish，/progress_stream的连接线程调用wait等待新版本，
+    查询进度时不再读取磁盘上的进度文件。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._states = {}
+
+    def publish(self, job, state):
+        with self._condition:
+            version = self._states.get(job, (0, None))[0] + 1
+            self._states[job] = (version, state)
+            self._condition.notify_all()
+
+    def get(self, job):
+        """返回(版本号, 状态)，任务未知时返回None"""
+        with self._condition:
+            return self._states.get(job)
+
+    def wait(self, job, version, timeout):
+        """等待任务状态的版本号大于version，超时返回None"""
+        with self._condition:
+            if self._condition.wait_for(
+                    lambda: self._states.get(job, (0, None))[0] > version, timeout):
+                return self._states[job]
+            return None
+
+
+progress_broker = ProgressBroker()
+
+
+def queued_state(position):
+    """排队任务的进度状态"""
+    return {
+        'status': 'queued',
+        'queue_position': position,
+        'message': f'排队中，前面还有 {position - 1} 个任务等待' if position > 1 else '排队中，下一个开始'
+    }
+
+
+def publish_queue_positions(queued_jobs):
+    """排队任务的位置变化时更新它们的进度状态"""
+    for position, job in enumerate(queued_jobs, start=1):
+        progress_broker.publish(job, queued_state(position))
+
+
+# 所有翻译任务在同一个事件循环中运行，共享API并发预算
+scheduler = translator.JobScheduler(on_queue_change=publish_queue_positions)
+
+# 各任务最近一次运行的指标（任务名 -> Metrics），由/metrics接口导出
+job_metrics = {}
+
+
+def build_progress_payload(progress_data):
+    """把进度摘要转换为前端使用的进度数据"""
+    total = progress_data.get('total', 0)
+    completed = progress_data.get('completed', 0)
+    percentage = (completed / total) * 100 if total > 0 else 0
+    checked = progress_data.get('alignment_checked', 0)
+
+    # 如果进度已达到100%但输出文件还没有生成，显示"处理最终结果中"
+    # （流水线模式下分段尚未结束时总数仍会增长，不算完成）
+    if total > 0 and percentage >= 100 and not progress_data.get('segmenting'):
+        return {
+            'status': 'finalizing',
+            'message': '翻译已完成，正在处理最终结果...'
+        }
+
+    return {
+        'status': 'in_progress',
+        'completed': completed,
+        'total': total,
+        'percentage': percentage,
+        'throughput': progress_data.get('throughput'),
+        'eta_seconds': progress_data.get('eta_seconds'),
+        'cache_hits': progress_data.get('cache_hits', 0),
+        'cache_misses': progress_data.get('cache_misses', 0),
+        'concurrency_limit': progress_data.get('concurrency_limit'),
+        'concurrency_changes': progress_data.get('concurrency_changes', []),
+        'dead_letters': progress_data.get('dead_letters', 0),
+        'alignment_checked': checked,
+        'alignment_mismatch_rate': (
+            progress_data.get('alignment_mismatched', 0) / checked if checked else 0),
+        'alignment_rerequested': progress_data.get('alignment_rerequested', 0),
+        'streamed_paragraphs': progress_data.get('streamed_paragraphs', 0),
+        'dedup_segments': progress_data.get('dedup_segments', 0),
+        'dedup_tokens_saved': progress_data.get('dedup_tokens_saved', 0),
+        'header_chars_removed': progress_data.get('header_chars_removed', 0),
+        'latest_translation': progress_data.get('latest_translation', ''),
+        'metrics': progress_data.get('metrics')
+    }
+
+class UploadStore:
+    """分块、可续传的上传，按文件内容去重
+
+    上传ID由服务端随机生成，文件名、大小和上传者（会话中的随机标识）保存在服务端，
+    客户端每次PUT一块，从服务端已收到的字节数继续，只有同一会话才能继续或完成该上传；
+    每块写入磁盘的同时更新SHA-256，最后一块到达时不必再读一遍文件。
+    上传完成后按内容哈希查找索引：已有相同内容的文件时删除本次上传，直接返回已有的文件名，
+    原有的提取缓存、进度和译文都以该文件名（以及内容哈希）为键，因此可以直接沿用。
+    """
+
+    # 每次读取请求体的字节数
+    COPY_BLOCK = 1 << 20
+
+    def __init__(self, upload_dir):
+        self.upload_dir = upload_dir
+        self.partial_dir = os.path.join(upload_dir, '.partial')
+        # 内容哈希 -> 文件名，保存在上传目录中（清除缓存时一并删除）
+        self.index_path = os.path.join(upload_dir, '.hashes.json')
+        self._lock = threading.Lock()
+        # 上传ID -> 已收到部分的SHA-256对象（服务重启后从磁盘上的部分文件重新计算）
+        self._hashers = {}
+        # 正在写入的上传ID，同一个上传同时只接受一个请求
+        self._writing = set()
+        os.makedirs(self.partial_dir, exist_ok=True)
+
+    @staticmethod
+    def new_id():
+        return secrets.token_hex(12)
+
+    @staticmethod
+    def valid_id(upload_id):
+        return len(upload_id) == 24 and all(c in '0123456789abcdef' for c in upload_id)
+
+    def _partial_path(self, upload_id):
+        return os.path.join(self.partial_dir, f"{upload_id}.part")
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.partial_dir, f"{upload_id}.json")
+
+    def create(self, name, size, owner):
+        """登记一个新的分块上传，返回服务端生成的上传ID（元数据写入磁盘，服务重启后仍可续传）"""
+        upload_id = self.new_id()
+        tmp_path = f"{self._meta_path(upload_id)}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'name': name, 'size': size, 'owner': owner}, f)
+        os.replace(tmp_path, self._meta_path(upload_id))
+        return upload_id
+
+    def info(self, upload_id, owner):
+        """上传的元数据；ID无效、不存在或不属于owner时返回None"""
+        if not self.valid_id(upload_id):
+            return None
+        try:
+            with open(self._meta_path(upload_id), encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if not hmac.compare_digest(meta.get('owner', ''), owner):
+            return None
+        return meta
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def lookup(self, digest):
+        """已上传的相同内容的文件名，没有（或文件已被删除）时返回None"""
+        with self._lock:
+            filename = self._read_index().get(digest)
+        if filename and os.path.exists(os.path.join(self.upload_dir, filename)):
+            return filename
+        return None
+
+    def received(self, upload_id):
+        """已收到的字节数（续传的起始位置）"""
+        path = self._partial_path(upload_id)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def append(self, upload_id, offset, stream):
+        """把stream的内容写到部分文件的offset处（必须等于已收到的字节数），返回新的字节数"""
+        path = self._partial_path(upload_id)
+        with self._lock:
+            received = self.received(upload_id)
+            if offset != received or upload_id in self._writing:
+                raise ValueError(received)
+            self._writing.add(upload_id)
+            # 写入过程中出错时不保留哈希状态，下次从磁盘上的部分文件重新计算
+            hasher = self._hashers.pop(upload_id, None)
+        try:
+            if hasher is None:
+                hasher = hashlib.sha256()
+                if received:
+                    with open(path, 'rb') as f:
+                        for block in iter(lambda: f.read(self.COPY_BLOCK), b''):
+                            hasher.update(block)
+            with open(path, 'ab') as f:
+                for block in iter(lambda: stream.read(self.COPY_BLOCK), b''):
+                    f.write(block)
+                    hasher.update(block)
+                received = f.tell()
+            with self._lock:
+                self._hashers[upload_id] = hasher
+        finally:
+            with self._lock:
+                self._writing.discard(upload_id)
+        return received
+
+    def finish(self, upload_id, name):
+        """上传完成：相同内容已存在时返回(已有文件名, True)，否则以name保存并返回(文件名, False)"""
+        path = self._partial_path(upload_id)
+        with self._lock:
+            hasher = self._hashers.pop(upload_id, None)
+            if hasher is None:
+                hasher = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(self.COPY_BLOCK), b''):
+                        hasher.update(block)
+            digest = hasher.hexdigest()
+            index = self._read_index()
+            existing = index.get(digest)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._meta_path(upload_id))
+            if existing and os.path.exists(os.path.join(self.upload_dir, existing)):
+                os.remove(path)
+                return existing, True
+
+            # 同名文件内容不同时在文件名后加上哈希前缀，不覆盖已有的上传
+            filename = name
+            if os.path.exists(os.path.join(self.upload_dir, filename)):
+                stem, ext = os.path.splitext(name)
+                filename = f"{stem}-{digest[:8]}{ext}"
+            filepath = os.path.join(self.upload_dir, filename)
+            os.replace(path, filepath)
+            index[digest] = filename
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+        # 文档缓存以内容哈希为键，直接使用上传时计算的哈希，不再读一遍文件
+        translator.DocumentCache.remember_hash(filepath, digest)
+        return filename, False
+
+    def clear_partial(self):
+        """删除所有未完成的上传"""
+        with self._lock:
+            self._hashers.clear()
+            for name in os.listdir(self.partial_dir):
+                os.unlink(os.path.join(self.partial_dir, name))
+
+    def discard(self, upload_id):
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+            for path in (self._partial_path(upload_id), self._meta_path(upload_id)):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+
+upload_store = UploadStore(app.config['UPLOAD_FOLDER'])
+
+
+def upload_owner():
+    """当前会话的上传者标识，首次上传时随机生成并保存在会话中"""
+    if 'upload_owner' not in session:
+        session['upload_owner'] = secrets.token_hex(16)
+    return session['upload_owner']
+
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -61,10 +347,16 @@ def upload_file():
         return redirect(request.url)
     
     if file and allowed_file(file.filename):
-        # 保存上传的文件
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # 不支持分块上传时的表单上传：同样边写入边计算哈希，相同内容的文件沿用已有的上传
+        upload_id = UploadStore.new_id()
+        try:
+            upload_store.append(upload_id, 0, file.stream)
+            filename, existing = upload_store.finish(upload_id, secure_filename(file.filename))
+        except Exception:
+            upload_store.discard(upload_id)
+            raise
+        if existing:
+            flash(f'该文件已上传过（{filename}），沿用已有的提取结果、进度和译文')
         
         # 重定向到翻译页面
         return redirect(url_for('translate_page', filename=filename))
@@ -72,16 +364,81 @@ def upload_file():
         flash('只允许上传PDF文件')
         return redirect(url_for('index'))
 
+@app.route('/upload/init', methods=['POST'])
+def init_upload():
+    """开始或继续分块上传，返回上传ID、已收到的字节数和每块的大小
+
+    客户端给出之前的upload_id时，只有属于当前会话且文件名、大小一致才继续该上传，否则开始新的上传。
+    """
+    data = request.get_json(silent=True) or {}
+    name = data.get('name', '')
+    size = data.get('size')
+    if not allowed_file(name):
+        return jsonify({'status': 'error', 'message': '只允许上传PDF文件'})
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({'status': 'error', 'message': '文件为空'})
+    if size > app.config['MAX_UPLOAD_SIZE']:
+        limit = app.config['MAX_UPLOAD_SIZE'] // (1024 * 1024)
+        return jsonify({'status': 'error', 'message': f'文件超过大小上限（{limit}MB）'})
+    owner = upload_owner()
+    upload_id = data.get('upload_id')
+    info = upload_store.info(upload_id, owner) if isinstance(upload_id, str) else None
+    if info is None or info['name'] != name or info['size'] != size:
+        upload_id = upload_store.create(name, size, owner)
+    return jsonify({
+        'status': 'success',
+        'upload_id': upload_id,
+        'offset': upload_store.received(upload_id),
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+    })
+
+@app.route('/upload/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """接收从offset开始的一块；收到初始化时登记的全部字节后完成上传，返回翻译页面的地址"""
+    info = upload_store.info(upload_id, session.get('upload_owner', ''))
+    if info is None:
+        return jsonify({'status': 'error', 'message': '上传不存在或已过期，请重新上传'}), 404
+    name, size = info['name'], info['size']
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'status': 'error', 'message': '无效的上传参数'}), 400
+
+    try:
+        received = upload_store.append(upload_id, offset, request.stream)
+    except ValueError as e:
+        # 起始位置与服务端不一致（重复发送或并发请求），客户端从返回的offset继续
+        return jsonify({'status': 'error', 'message': '上传位置不一致', 'offset': e.args[0]}), 409
+    if received < size:
+        return jsonify({'status': 'success', 'offset': received})
+    if received > size:
+        upload_store.discard(upload_id)
+        return jsonify({'status': 'error', 'message': '收到的数据超过文件大小，请重新上传'}), 400
+
+    filename, existing = upload_store.finish(upload_id, secure_filename(name))
+    if existing:
+        flash(f'该文件已上传过（{filename}），沿用已有的提取结果、进度和译文')
+    return jsonify({
+        'status': 'success',
+        'offset': received,
+        'filename': filename,
+        'existing': existing,
+        'redirect': url_for('translate_page', filename=filename)
+    })
+
 @app.route('/preview/<filename>')
 def get_preview(filename):
-    """获取PDF文件预览内容"""
+    """获取PDF文件预览内容，offset为起始页（从0开始），count为页数"""
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     if not os.path.exists(filepath):
         return jsonify({'status': 'error', 'message': '文件不存在'})
     
+    offset = max(0, request.args.get('offset', 0, type=int))
+    count = request.args.get('count', translator.DEFAULT_CONFIG['preview_page_size'], type=int)
+    count = max(1, min(translator.DEFAULT_CONFIG['preview_max_page_size'], count))
+    
     try:
-        # 调用translator的预览功能
-        preview_data = translator.get_pdf_preview(filepath)
+        # 只提取请求的页面
+        preview_data = previewer.preview(filepath, offset, count)
         return jsonify({
             'status': 'success',
             'preview': preview_data
@@ -111,14 +468,28 @@ def start_translation():
     api_key = request.form.get('api_key', '')
     if not api_key:
         return jsonify({'status': 'error', 'message': '请输入API密钥'})
+    if scheduler.queue_position(filename) is not None:
+        return jsonify({'status': 'error', 'message': '该文件已在翻译或排队中'})
         
     batch_size = int(request.form.get('batch_size', translator.DEFAULT_CONFIG['batch_size']))
     max_concurrent = int(request.form.get('max_concurrent', translator.DEFAULT_CONFIG['max_concurrent_requests']))
     comparison_mode = request.form.get('comparison_mode') == 'on'
     sentences_per_paragraph = int(request.form.get('sentences_per_paragraph', 4))
+    batching = request.form.get('batching', translator.DEFAULT_CONFIG['batching'])
+    if batching not in ('tokens', 'count'):
+        batching = translator.DEFAULT_CONFIG['batching']
+    # 每个任务可以单独覆盖token预算，未填写时使用默认配置
+    max_input_tokens = request.form.get('max_input_tokens', type=int)
+    max_output_tokens = request.form.get('max_output_tokens', type=int)
+    # 翻译页码范围（从1开始，包含两端），未填写时翻译全部页面
+    start_page = max(1, request.form.get('start_page', 1, type=int) or 1)
+    end_page = request.form.get('end_page', type=int)
+    if end_page is not None and end_page < start_page:
+        return jsonify({'status': 'error', 'message': '结束页不能小于起始页'})
     
-    # 确保并行进程数在1-5之间
-    max_concurrent = max(1, min(5, max_concurrent))
+    # 确保初始并行数在自适应并发的上下限之间
+    max_concurrent = max(translator.DEFAULT_CONFIG['min_concurrent_requests'],
+                         min(translator.DEFAULT_CONFIG['max_concurrent_limit'], max_concurrent))
     # 确保每段句子数在合理范围内
     sentences_per_paragraph = max(1, min(10, sentences_per_paragraph))
     
@@ -130,96 +501,144 @@ def start_translation():
     progress_filename = f"progress_{os.path.splitext(filename)[0]}.json"
     progress_path = os.path.join(app.config['OUTPUT_FOLDER'], progress_filename)
     
-    # 创建进度初始化
-    text = translator.extract_text_from_pdf(filepath)
-    paragraphs = translator.split_paragraphs_by_sentences(text, sentences_per_paragraph)
-    
-    # 初始化进度文件
-    progress_data = {
-        'total': len(paragraphs),
-        'processed': [],
-        'batch_size': batch_size
-    }
-    
-    with open(progress_path, 'w', encoding='utf-8') as f:
-        json.dump(progress_data, f)
+    # 初始化进度文件：不在请求中提取PDF，翻译全部页面且段落总数在文档缓存中已有时直接使用，
+    # 否则由翻译流水线在分段过程中逐步更新
+    total_paragraphs = None
+    if start_page == 1 and end_page is None:
+        total_paragraphs = document_cache.paragraph_count(filepath, sentences_per_paragraph,
+                                                          translator.create_page_filter())
+    tracker = translator.ProgressTracker(progress_path, load=False)
+    tracker.set_total(total_paragraphs or 0, segmenting=total_paragraphs is None)
+    tracker.update(batch_size=batch_size)
+    tracker.flush()
     
-    # 启动异步翻译任务（这里使用线程而不是协程，避免阻塞Flask）
-    import threading
-    thread = threading.Thread(
-        target=lambda: asyncio.run(process_translation(
-            filepath, api_key, output_path, progress_path, 
-            comparison_mode, batch_size, max_concurrent, sentences_per_paragraph
-        ))
-    )
-    thread.daemon = True
-    thread.start()
+    def job_factory(request_budget, session):
+        return process_translation(
+            filepath, api_key, output_path, progress_path,
+            comparison_mode, batch_size, max_concurrent, sentences_per_paragraph,
+            batching, max_input_tokens, max_output_tokens,
+            request_budget=request_budget, session=session,
+            start_page=start_page, end_page=end_page
+        )
+
+    # 提交到调度器：超过同时运行的任务数时排队，所有任务共享API并发预算
+    # 清除上一次运行留在内存中的状态
+    progress_broker.publish(filename, build_progress_payload(tracker.snapshot()))
+    position = scheduler.submit(filename, job_factory)
+    if position is None:
+        return jsonify({'status': 'error', 'message': '该文件已在翻译或排队中'})
+    current_position = scheduler.queue_position(filename)
+    if current_position:
+        progress_broker.publish(filename, queued_state(current_position))
     
     return jsonify({
         'status': 'success', 
-        'message': '翻译已启动',
-        'total_paragraphs': len(paragraphs)
+        'message': '翻译已启动' if not position else '翻译任务已加入队列',
+        'queue_position': position,
+        'total_paragraphs': total_paragraphs
     })
 
+def read_progress_state(filename):
+    """从磁盘读取任务状态（服务重启后或任务不在内存中时使用）"""
+    progress_filename = f"progress_{os.path.splitext(filename)[0]}.json"
+    progress_path = os.path.join(app.config['OUTPUT_FOLDER'], progress_filename)
+    output_filename = f"translated_{os.path.splitext(filename)[0]}.docx"
+    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+
+    # 如果输出文件存在并且大于零字节，认为翻译已完成
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        # 附带失败段落数，便于提示用户重试
+        dead_letters = 0
+        if os.path.exists(progress_path):
+            dead_letters = translator.read_progress_summary(progress_path).get('dead_letters', 0)
+        return {'status': 'completed', 'output_file': output_filename, 'dead_letters': dead_letters}
+
+    if not os.path.exists(progress_path):
+        return {'status': 'not_started'}
+
+    # 只读取进度摘要，不解析整个进度文件
+    progress_data = translator.read_progress_summary(progress_path)
+    if progress_data.get('extraction_error'):
+        return {'status': 'error', 'message': translator.failure_reason(False, progress_data)}
+    if progress_data.get('total', 0) <= 0:
+        return {'status': 'error', 'message': '无效的进度数据'}
+    return build_progress_payload(progress_data)
+
+
+def current_progress(filename):
+    """优先使用内存中的任务状态，没有时再读取磁盘"""
+    published = progress_broker.get(filename)
+    if published:
+        return published[1]
+    return read_progress_state(filename)
+
+
 @app.route('/check_progress/<filename>')
 def check_progress(filename):
-    """检查翻译进度"""
+    """检查翻译进度（不支持推送时的轮询接口）"""
     try:
-        # 检查翻译进度
-        progress_filename = f"progress_{os.path.splitext(filename)[0]}.json"
-        progress_path = os.path.join(app.config['OUTPUT_FOLDER'], progress_filename)
-        
-        # 检查输出文件是否存在
-        output_filename = f"translated_{os.path.splitext(filename)[0]}.docx"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        
-        # 调试信息
-        print(f"检查进度: {filename}, 进度文件: {progress_path}, 输出文件: {output_path}")
-        
-        if os.path.exists(output_path):
-            # 如果输出文件存在并且大于零字节，认为翻译已完成
-            if os.path.getsize(output_path) > 0:
-                print(f"翻译已完成，输出文件大小: {os.path.getsize(output_path)}")
-                return jsonify({'status': 'completed', 'output_file': output_filename})
-        
-        if os.path.exists(progress_path):
-            try:
-                with open(progress_path, 'r', encoding='utf-8') as f:
-                    progress_data = json.load(f)
-                    # 计算完成百分比
-                    if 'total' in progress_data and progress_data['total'] > 0:
-                        completed = len(progress_data.get('processed', []))
-                        percentage = (completed / progress_data['total']) * 100
-                        
-                        print(f"进度数据: 已完成 {completed}/{progress_data['total']} ({percentage:.1f}%)")
-                        
-                        # 如果进度已达到100%但输出文件还没有生成，显示"处理最终结果中"
-                        if percentage >= 100 and not os.path.exists(output_path):
-                            return jsonify({
-                                'status': 'finalizing',
-                                'message': '翻译已完成，正在处理最终结果...'
-                            })
-                        
-                        return jsonify({
-                            'status': 'in_progress',
-                            'completed': completed,
-                            'total': progress_data['total'],
-                            'percentage': percentage
-                        })
-                    else:
-                        print(f"进度数据无效: {progress_data}")
-                        return jsonify({'status': 'error', 'message': '无效的进度数据'})
-            except Exception as e:
-                print(f"读取进度文件错误: {e}")
-                return jsonify({'status': 'error', 'message': str(e)})
-        else:
-            print(f"进度文件不存在: {progress_path}")
-        
-        return jsonify({'status': 'not_started'})
+        return jsonify(current_progress(filename))
     except Exception as e:
-        print(f"检查进度时发生错误: {e}")
+        app.logger.exception(f"检查进度时发生错误: {filename}")
         return jsonify({'status': 'error', 'message': f"服务器错误: {str(e)}"})
 
+
+@app.route('/progress_stream/<filename>')
+def progress_stream(filename):
+    """以Server-Sent Events推送翻译进度，任务完成或出错后关闭连接"""
+    def generate():
+        published = progress_broker.get(filename)
+        if not published:
+            # 任务不在本进程中运行，只发送一次磁盘上的状态，前端随后改为轮询
+            yield f"data: {json.dumps(read_progress_state(filename), ensure_ascii=False)}\n\n"
+            return
+
+        version = 0
+        while True:
+            published = progress_broker.wait(filename, version, PROGRESS_KEEPALIVE)
+            if published is None:
+                yield ": keepalive\n\n"
+                continue
+            version, state = published
+            yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+            if state['status'] in ('completed', 'error'):
+                return
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def export_metrics():
+    """以Prometheus文本格式导出各任务的分阶段耗时和计数"""
+    body = translator.render_prometheus(dict(job_metrics))
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def get_job_store():
+    """首次访问时打开任务存储，保存在输出目录的jobs子目录中（清除缓存时不会被删除）"""
+    global job_store
+    with job_store_lock:
+        if job_store is None:
+            job_store = translator.SQLiteJobStore(os.path.join(app.config['OUTPUT_FOLDER'], 'jobs', 'jobs.db'))
+    return job_store
+
+@app.route('/jobstore/<method>', methods=['POST'])
+def job_store_call(method):
+    """把工作进程的调用转发给任务存储，参数和返回值中的bytes以base64编码
+
+    只有配置了job_store_token（环境变量JOB_STORE_TOKEN）时才开放，请求须在X-Job-Store-Token中附带该密钥。
+    """
+    token = translator.DEFAULT_CONFIG['job_store_token']
+    if not token or method not in translator.SQLiteJobStore.REMOTE_METHODS:
+        return jsonify({'error': f'未知的方法: {method}'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Job-Store-Token', ''), token):
+        return jsonify({'error': '任务存储密钥无效'}), 403
+    params = translator.decode_job_store_value(request.get_json(force=True) or {})
+    try:
+        result = getattr(get_job_store(), method)(**params)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'result': translator.encode_job_store_value(result)})
+
 @app.route('/download/<filename>')
 def download_file(filename):
     return send_from_directory(app.config['OUTPUT_FOLDER'], filename, as_attachment=True)
@@ -273,6 +692,15 @@ def clear_cache():
             if os.path.isfile(file_path):
                 os.unlink(file_path)
         
+        # 清除未完成的分块上传
+        upload_store.clear_partial()
+        
+        # 清除文档缓存（提取的页面文本和分段结果）
+        for filename in os.listdir(document_cache.cache_dir):
+            file_path = os.path.join(document_cache.cache_dir, filename)
+            if os.path.isfile(file_path):
+                os.unlink(file_path)
+        
         return jsonify({'status': 'success', 'message': '缓存已清除'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'清除缓存时发生错误: {str(e)}'})
@@ -292,26 +720,60 @@ def list_uploads():
 
 async def process_translation(pdf_path, api_key, output_path, progress_path, 
                              comparison_mode=False, batch_size=3, max_concurrent=3,
-                             sentences_per_paragraph=4):
-    """处理翻译任务的包装函数"""
+                             sentences_per_paragraph=4, batching='tokens',
+                             max_input_tokens=None, max_output_tokens=None,
+                             request_budget=None, session=None, start_page=1, end_page=None):
+    """处理翻译任务的包装函数，进度通过progress_broker推送给前端
+
+    request_budget和session由调度器提供，所有任务共享。
+    start_page/end_page为翻译的页码范围（end_page为None时到最后一页）。
+    """
+    job = os.path.basename(pdf_path)
+
+    def on_progress(state):
+        progress_broker.publish(job, build_progress_payload(state))
+
+    metrics = None
+    if translator.DEFAULT_CONFIG['metrics_enabled']:
+        metrics = job_metrics[job] = translator.Metrics()
+
     try:
         # 调用异步翻译函数
-        await translator.main_async(
+        success = await translator.main_async(
             pdf_path=pdf_path,
             api_key=api_key,
             output_path=output_path,
             progress_file=progress_path,
-            start_page=1,  # 从第一页开始
-            end_page=None,  # 翻译全部内容
+            start_page=start_page,
+            end_page=end_page,
             comparison_mode=comparison_mode,
             batch_size=batch_size,
             max_concurrent_requests=max_concurrent,
-            sentences_per_paragraph=sentences_per_paragraph
+            sentences_per_paragraph=sentences_per_paragraph,
+            cache_path=os.path.join(app.config['OUTPUT_FOLDER'], 'translation_memory.db'),
+            batching=batching,
+            max_input_tokens=max_input_tokens,
+            max_output_tokens=max_output_tokens,
+            on_progress=on_progress,
+            request_budget=request_budget,
+            job_id=job,
+            session=session,
+            document_cache_dir=document_cache.cache_dir,
+            metrics=metrics
         )
-        
-        return True
+        if not success:
+            message = translator.failure_reason(False, translator.read_progress_summary(progress_path))
+            progress_broker.publish(job, {'status': 'error', 'message': message})
+            return False
+
+        state = read_progress_state(job)
+        if state['status'] != 'completed':
+            state = {'status': 'error', 'message': '没有生成翻译结果，请检查是否有错误发生'}
+        progress_broker.publish(job, state)
+        return state['status'] == 'completed'
     except Exception as e:
-        print(f"翻译处理错误: {e}")
+        app.logger.exception(f"翻译处理错误: {job}")
+        progress_broker.publish(job, {'status': 'error', 'message': f"翻译处理错误: {str(e)}"})
         return False
 
 if __name__ == '__main__':
@@ -0,0 +1,88 @@
+"""在会注入限流的本地模拟API上验证AIMD自适应并发控制
+
+模拟服务端同时最多处理 --capacity 个请求，超出返回HTTP 429。
+分别使用固定并发和自适应并发翻译同样的批次，报告吞吐量、被限流次数，
+以及自适应控制器的上限变化过程，并检查上限是否收敛到服务端容量附近。
+
+用法: python benchmarks/bench_adaptive_concurrency.py --batches 300 --capacity 4
+"""
+import argparse
+import asyncio
+import time
+
+from common import load_translator
+from stub_server import StubDeepSeekServer
+
+translator = load_translator()
+
+
+async def run(server, batches, limiter, workers):
+    session = translator.create_http_session(workers)
+    queue = asyncio.Queue()
+    for i in range(batches):
+        queue.put_nowait(i)
+    failed = 0
+
+    async def worker():
+        nonlocal failed
+        while not queue.empty():
+            i = queue.get_nowait()
+            result = await translator.translate_batch_async(
+                [f"Paragraph {i}-{j}." for j in range(3)], "stub-key", server.url, "stub-model",
+                limiter, {'batch_index': i, 'start_index': i * 3}, session=session)
+            if not result:
+                failed += 1
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        await session.close()
+    return time.perf_counter() - started, failed
+
+
+async def main_async(args):
+    # 缩短重试等待，使限流的代价在测试中可见但不至于拖太久
+    translator.DEFAULT_CONFIG['retry_delay'] = args.retry_delay
+    translator.DEFAULT_CONFIG['retries'] = 5
+    server = await StubDeepSeekServer(latency=args.latency, max_concurrency=args.capacity,
+                                      error_rate=args.error_rate).start()
+    try:
+        for label, limiter in (
+                ("固定并发", asyncio.Semaphore(args.max_limit)),
+                ("自适应并发", translator.AdaptiveConcurrencyLimiter(
+                    args.initial, min_limit=1, max_limit=args.max_limit,
+                    decrease_cooldown=args.latency * 2))):
+            server.reset_stats()
+            elapsed, failed = await run(server, args.batches, limiter, args.max_limit)
+            print(f"{label}: 用时 {elapsed:.2f}s, {args.batches / elapsed:.1f} 批次/秒, "
+                  f"请求数={server.request_count}, 429次数={server.throttled_count}, "
+                  f"503次数={server.error_count}, 失败批次={failed}, "
+                  f"服务端峰值并发={server.peak_in_flight}")
+
+            if isinstance(limiter, translator.AdaptiveConcurrencyLimiter):
+                for change in limiter.changes:
+                    print(f"  上限 {change['from']} -> {change['to']}: {change['reason']}")
+                within_bounds = all(1 <= c['to'] <= args.max_limit for c in limiter.changes)
+                decreased = any(c['to'] < c['from'] for c in limiter.changes)
+                print(f"  最终上限={limiter.limit}, 服务端容量={args.capacity}, "
+                      f"上限在范围内={'是' if within_bounds else '否'}, "
+                      f"限流后降低过上限={'是' if decreased or not server.throttled_count else '否'}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自适应并发基准测试")
+    parser.add_argument("--batches", type=int, default=300, help="批次数")
+    parser.add_argument("--capacity", type=int, default=4, help="模拟服务端的并发容量")
+    parser.add_argument("--initial", type=int, default=2, help="自适应并发的初始值")
+    parser.add_argument("--max-limit", type=int, default=10, help="并发上限")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务端延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机503的概率")
+    parser.add_argument("--retry-delay", type=float, default=0.2, help="重试等待（秒）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""对比按行数截断与逐段校验对齐两种方式在模型合并/丢失段落时的正确率
+
+模拟服务端以misalign_rate的概率把某一段合并到上一段或直接丢弃。
+旧方式按行顺序与原文配对（多余或缺失的部分被截断）；
+新方式按“段落N:”编号对齐，并只重新请求缺失或长度比异常的段落。
+模拟译文为“【译】原文”，因此可以逐段判断配对是否正确。
+
+用法: python benchmarks/bench_alignment.py --paragraphs 800 --misalign-rate 0.3
+"""
+import argparse
+import asyncio
+import time
+
+from bench_batching import make_batches, make_paragraphs
+from common import load_translator
+from stub_server import StubDeepSeekServer
+
+translator = load_translator()
+
+
+def score_pairs(batch, lines):
+    """返回(正确配对数, 错误配对数)"""
+    correct = sum(1 for source, line in zip(batch, lines) if line == f"【译】{source}")
+    return correct, min(len(batch), len(lines)) - correct
+
+
+async def run_line_pairing(server, batches, concurrency):
+    """旧方式：译文按行与原文顺序配对"""
+    session = translator.create_http_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    totals = {'correct': 0, 'wrong': 0}
+
+    async def one(batch):
+        async with semaphore:
+            text = await translator.translate_with_deepseek_async(
+                batch, "stub-key", server.url, "stub-model", session=session)
+        correct, wrong = score_pairs(batch, [p.strip() for p in text.split('\n') if p.strip()])
+        totals['correct'] += correct
+        totals['wrong'] += wrong
+
+    try:
+        await asyncio.gather(*(one(batch) for batch in batches))
+    finally:
+        await session.close()
+    return totals, None
+
+
+async def run_verified(server, batches, concurrency):
+    """新方式：逐段校验对齐，只重新请求缺失或错位的段落"""
+    session = translator.create_http_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    tracker = translator.ProgressTracker()
+    totals = {'correct': 0, 'wrong': 0}
+
+    async def one(batch_index, batch):
+        dead_letters = []
+        text = await translator.translate_batch_async(
+            batch, "stub-key", server.url, "stub-model", semaphore,
+            {'batch_index': batch_index, 'start_index': 0}, tracker, session,
+            dead_letters=dead_letters)
+        failed = {entry['index'] for entry in dead_letters}
+        written = [p for i, p in enumerate(batch) if i not in failed]
+        correct, wrong = score_pairs(written, [p.strip() for p in text.split('\n') if p.strip()])
+        totals['correct'] += correct
+        totals['wrong'] += wrong
+
+    try:
+        await asyncio.gather(*(one(i, batch) for i, batch in enumerate(batches)))
+    finally:
+        await session.close()
+    return totals, tracker.summary
+
+
+async def main_async(args):
+    paragraphs = make_paragraphs(args.paragraphs)
+    batches = make_batches(translator.FixedCountBatcher(args.batch_size), paragraphs)
+    print(f"段落数={len(paragraphs)}, 批次数={len(batches)}, 错位概率={args.misalign_rate}")
+
+    for label, runner in (("按行配对", run_line_pairing), ("逐段校验", run_verified)):
+        server = await StubDeepSeekServer(latency=args.latency, misalign_rate=args.misalign_rate,
+                                          seed=5).start()
+        try:
+            started = time.perf_counter()
+            totals, summary = await runner(server, batches, args.concurrent)
+            elapsed = time.perf_counter() - started
+            lost = len(paragraphs) - totals['correct'] - totals['wrong']
+            line = (f"{label}: 正确={totals['correct']}, 错配={totals['wrong']}, 丢失={lost}, "
+                    f"请求数={server.request_count}, 错位响应={server.misaligned_count}, 用时 {elapsed:.2f}s")
+            if summary:
+                checked = summary.get('alignment_checked', 0)
+                line += (f", 错位率={summary.get('alignment_mismatched', 0) / max(checked, 1):.2%}, "
+                         f"重新请求段落={summary.get('alignment_rerequested', 0)}")
+            print(line)
+        finally:
+            await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="译文对齐基准测试")
+    parser.add_argument("--paragraphs", type=int, default=800, help="段落数")
+    parser.add_argument("--batch-size", type=int, default=8, help="每批段落数")
+    parser.add_argument("--misalign-rate", type=float, default=0.3, help="每个响应发生错位的概率")
+    parser.add_argument("--concurrent", type=int, default=4, help="并发请求数")
+    parser.add_argument("--latency", type=float, default=0.01, help="每个请求的固定延迟（秒）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
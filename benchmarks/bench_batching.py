@@ -0,0 +1,97 @@
+"""对比按固定段落数组批与按token预算组批的请求数和总耗时
+
+段落长度按对数正态分布生成（相差10倍以上），模拟服务端的响应时间包含
+固定延迟和按输出token计算的生成时间，并在超出输出上限时截断译文。
+
+用法: python benchmarks/bench_batching.py --paragraphs 2000 --batch-size 3
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from common import load_translator
+from pdf_fixtures import WORDS
+from stub_server import StubDeepSeekServer
+
+translator = load_translator()
+
+
+def make_paragraphs(count, seed=7):
+    """生成长度差异很大的英文段落"""
+    rnd = random.Random(seed)
+    paragraphs = []
+    for _ in range(count):
+        words = max(4, int(rnd.lognormvariate(3.5, 1.0)))
+        paragraphs.append(" ".join(rnd.choice(WORDS) for _ in range(words)).capitalize() + ".")
+    return paragraphs
+
+
+def make_batches(batcher, paragraphs):
+    batches = []
+    for paragraph in paragraphs:
+        batches.extend(batcher.add(paragraph))
+    batches.extend(batcher.flush())
+    return batches
+
+
+async def translate_all(server, batches, concurrency):
+    session = translator.create_http_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    missing = 0
+
+    async def one(batch):
+        nonlocal missing
+        async with semaphore:
+            text = await translator.translate_with_deepseek_async(
+                batch, "stub-key", server.url, "stub-model", session=session)
+        missing += max(0, len(batch) - len([p for p in text.split('\n') if p.strip()]))
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(batch) for batch in batches))
+    finally:
+        await session.close()
+    return time.perf_counter() - started, missing
+
+
+async def main_async(args):
+    paragraphs = make_paragraphs(args.paragraphs)
+    lengths = sorted(translator.estimate_tokens(p) for p in paragraphs)
+    print(f"段落数={len(paragraphs)}, token数 最短={lengths[0]}, 中位={lengths[len(lengths) // 2]}, "
+          f"最长={lengths[-1]}")
+
+    server = await StubDeepSeekServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                                      max_output_tokens=args.model_output_limit).start()
+    try:
+        for label, batcher in (
+                (f"固定段落数(batch_size={args.batch_size})",
+                 translator.FixedCountBatcher(args.batch_size)),
+                (f"token预算(输入{args.max_input_tokens}/输出{args.max_output_tokens})",
+                 translator.TokenBudgetBatcher(args.max_input_tokens, args.max_output_tokens))):
+            batches = make_batches(batcher, paragraphs)
+            server.reset_stats()
+            elapsed, missing = await translate_all(server, batches, args.concurrent)
+            print(f"{label}: 请求数={len(batches)}, 用时 {elapsed:.2f}s, "
+                  f"被截断的请求={server.truncated_count}, 丢失段落={missing}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="组批方式基准测试")
+    parser.add_argument("--paragraphs", type=int, default=2000, help="段落数")
+    parser.add_argument("--batch-size", type=int, default=3, help="固定组批的段落数")
+    parser.add_argument("--max-input-tokens", type=int,
+                        default=translator.DEFAULT_CONFIG['max_input_tokens'])
+    parser.add_argument("--max-output-tokens", type=int,
+                        default=translator.DEFAULT_CONFIG['max_output_tokens'])
+    parser.add_argument("--model-output-limit", type=int, default=4096, help="模拟模型的输出上限")
+    parser.add_argument("--concurrent", type=int, default=3, help="并发请求数")
+    parser.add_argument("--latency", type=float, default=0.3, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=2000, help="模拟生成速度")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""端到端离线基准：用本地模拟的DeepSeek接口完整运行main_async
+
+对合成PDF（--pages）或真实PDF（--pdf，可重复）运行完整流水线：提取 → 分段 → 组批 → 翻译 → 写入docx。
+模拟接口可配置延迟分布、生成速度、随机429/5xx和段落合并（错位），
+对--batch-size、--concurrent、--sentences的每种组合各运行一次（每次在独立子进程中，峰值内存互不影响），
+报告吞吐量、批次延迟p50/p99、峰值RSS以及输出正确性（docx中每段是否为对应原文的“【译】原文”），
+并可用--output写出JSON结果，便于在不同提交之间对比。
+
+用法: python benchmarks/bench_e2e.py --pages 40 --batch-size 3 8 --concurrent 4 8 \\
+          --latency 0.05 --latency-distribution lognormal --throttle-rate 0.02 --merge-rate 0.1 --output e2e.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from pdf_fixtures import make_pdf
+from stub_server import BackgroundServer
+
+SERVER_OPTIONS = ("latency", "latency_distribution", "latency_spread", "tokens_per_second",
+                  "throttle_rate", "error_rate", "error_status", "max_concurrency", "seed")
+
+
+def normalize(text):
+    return ' '.join(text.split())
+
+
+def check_output(translator, pdf_path, output_path, progress_file, sentences_per_paragraph):
+    """按原文重新分段，逐段比较docx中的译文；进入失败队列的段落不计入缺失"""
+    import docx
+
+    pages = translator.iter_pdf_pages(pdf_path, page_filter=translator.create_page_filter())
+    sources = [paragraph for chunk in translator.iter_paragraph_chunks(pages, sentences_per_paragraph)
+               for paragraph in chunk]
+    dead = set()
+    dead_letter_path = translator.dead_letter_file_for(progress_file)
+    if os.path.exists(dead_letter_path):
+        with open(dead_letter_path, encoding='utf-8') as f:
+            dead = {json.loads(line)['index'] for line in f if line.strip()}
+    expected = [f"【译】{normalize(p)}" for i, p in enumerate(sources) if i not in dead]
+    written = []
+    if os.path.exists(output_path):
+        written = [normalize(p.text) for p in docx.Document(output_path).paragraphs if p.text.strip()]
+    correct = sum(1 for want, got in zip(expected, written) if want == got)
+    return {
+        'paragraphs': len(sources),
+        'correct': correct,
+        'wrong': min(len(expected), len(written)) - correct,
+        'missing': max(0, len(expected) - len(written)),
+        'dead_letters': len(dead),
+    }
+
+
+def run_once(pdf_path, server_url, params, retry_delay, stream, results):
+    """在子进程中运行一次完整翻译，把结果放入results队列"""
+    from common import load_translator, percentile
+
+    translator = load_translator()
+    translator.DEFAULT_CONFIG['retry_delay'] = retry_delay
+    latencies = []
+    translate_batch = translator.translate_batch_async
+
+    async def timed_batch(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await translate_batch(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    translator.translate_batch_async = timed_batch
+    with tempfile.TemporaryDirectory() as workdir:
+        output_path = os.path.join(workdir, "translated.docx")
+        progress_file = os.path.join(workdir, "progress.json")
+        started = time.perf_counter()
+        ok = asyncio.run(translator.main_async(
+            pdf_path, "stub-key", output_path, progress_file=progress_file,
+            api_url=server_url, api_model="stub-model", use_cache=False,
+            batch_size=params['batch_size'], max_concurrent_requests=params['concurrent'],
+            sentences_per_paragraph=params['sentences'], batching=params['batching'],
+            adaptive_concurrency=params['adaptive'], stream_responses=stream))
+        elapsed = time.perf_counter() - started
+        summary = translator.read_progress_summary(progress_file) or {}
+        correctness = check_output(translator, pdf_path, output_path, progress_file, params['sentences'])
+
+    results.put(dict(
+        params, ok=bool(ok), elapsed=round(elapsed, 3),
+        paragraphs_per_second=round(correctness['paragraphs'] / elapsed, 2) if elapsed else 0.0,
+        batches=len(latencies),
+        batch_latency_p50=round(percentile(latencies, 50), 4),
+        batch_latency_p99=round(percentile(latencies, 99), 4),
+        batch_latency_mean=round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+        # Linux下ru_maxrss以KB为单位
+        peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        alignment_rerequested=summary.get('alignment_rerequested', 0),
+        **correctness))
+
+
+def run_in_subprocess(pdf_path, server, params, args):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_once, args=(
+        pdf_path, server.url, params, args.retry_delay, args.stream, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端离线基准测试")
+    parser.add_argument("--pdf", action="append", default=[], help="真实PDF文件（可重复）；不指定时生成合成PDF")
+    parser.add_argument("--pages", type=int, default=40, help="合成PDF的页数")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[3], help="每批段落数（可给多个值）")
+    parser.add_argument("--concurrent", type=int, nargs="+", default=[4], help="并发请求数（可给多个值）")
+    parser.add_argument("--sentences", type=int, nargs="+", default=[4], help="每段句子数（可给多个值）")
+    parser.add_argument("--batching", choices=["count", "tokens"], default="count", help="组批方式")
+    parser.add_argument("--adaptive", action="store_true", help="启用自适应并发")
+    parser.add_argument("--stream", action="store_true", help="流式接收译文")
+    parser.add_argument("--latency", type=float, default=0.05, help="首个token之前的延迟（秒，分布的中位数）")
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="fixed",
+                        help="延迟分布")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="uniform的相对幅度或lognormal的对数标准差")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="模拟生成速度")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="随机返回429的概率")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回5xx的概率")
+    parser.add_argument("--error-status", type=int, default=503, help="随机错误的HTTP状态码")
+    parser.add_argument("--merge-rate", type=float, default=0.0, help="响应中合并或丢弃段落的概率")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="模拟服务商的并发上限（超出返回429）")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="重试的基础等待时间（秒）")
+    parser.add_argument("--seed", type=int, default=7, help="模拟接口的随机种子")
+    parser.add_argument("--output", help="把结果写入JSON文件")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pdfs = [os.path.abspath(path) for path in args.pdf]
+        if not pdfs:
+            path = os.path.join(workdir, f"synthetic_{args.pages}p.pdf")
+            make_pdf(path, args.pages)
+            pdfs.append(path)
+
+        options = {name: getattr(args, name) for name in SERVER_OPTIONS}
+        server = BackgroundServer(misalign_rate=args.merge_rate, **options)
+        runs = []
+        try:
+            for pdf_path, batch_size, concurrent, sentences in itertools.product(
+                    pdfs, args.batch_size, args.concurrent, args.sentences):
+                server.server.reset_stats()
+                params = dict(pdf=os.path.basename(pdf_path), batch_size=batch_size, concurrent=concurrent,
+                              sentences=sentences, batching=args.batching, adaptive=args.adaptive)
+                result = run_in_subprocess(pdf_path, server.server, params, args)
+                result.update(requests=server.server.request_count,
+                              throttled=server.server.throttled_count,
+                              errors=server.server.error_count, merged=server.server.misaligned_count,
+                              peak_in_flight=server.server.peak_in_flight)
+                runs.append(result)
+                print(f"{result['pdf']} batch={batch_size} concurrent={concurrent} sentences={sentences}: "
+                      f"{result['elapsed']:.2f}s, {result['paragraphs_per_second']:.1f} 段/秒, "
+                      f"批次延迟 p50={result['batch_latency_p50'] * 1000:.0f}ms "
+                      f"p99={result['batch_latency_p99'] * 1000:.0f}ms, 峰值RSS {result['peak_rss_mb']:.0f}MB, "
+                      f"请求={result['requests']} 429={result['throttled']} 错误={result['errors']}, "
+                      f"正确={result['correct']}/{result['paragraphs']} 错配={result['wrong']} "
+                      f"缺失={result['missing']} 失败={result['dead_letters']}")
+        finally:
+            server.stop()
+
+    if args.output:
+        report = {'server': dict(options, merge_rate=args.merge_rate, stream=args.stream,
+                                 retry_delay=args.retry_delay),
+                  'python': sys.version.split()[0], 'runs': runs}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
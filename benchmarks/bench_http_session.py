@@ -0,0 +1,60 @@
+"""对比每次请求新建会话与共享连接池两种方式的单请求延迟
+
+用法: python benchmarks/bench_http_session.py --requests 200 --concurrent 3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from common import load_translator, percentile
+from stub_server import StubDeepSeekServer
+
+translator = load_translator()
+
+
+async def run_requests(server, total, concurrent, shared):
+    semaphore = asyncio.Semaphore(concurrent)
+    latencies = []
+    session = translator.create_http_session(concurrent) if shared else None
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await translator.translate_with_deepseek_async(
+                [f"Sentence number {i}."], "stub-key", server.url, "stub-model",
+                session=session)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    try:
+        await asyncio.gather(*(one(i) for i in range(total)))
+    finally:
+        if session:
+            await session.close()
+    return latencies
+
+
+async def main_async(args):
+    server = await StubDeepSeekServer(latency=args.latency).start()
+    try:
+        for shared in (False, True):
+            server.reset_stats()
+            latencies = await run_requests(server, args.requests, args.concurrent, shared)
+            label = "共享会话" if shared else "每次新建会话"
+            print(f"{label}: 请求数={len(latencies)}, TCP连接数={len(server.connections)}, "
+                  f"平均={statistics.mean(latencies):.2f}ms, "
+                  f"p50={percentile(latencies, 50):.2f}ms, p99={percentile(latencies, 99):.2f}ms")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP会话复用基准测试")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--concurrent", type=int, default=3, help="并发请求数")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟服务端延迟（秒）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""对比整批重试与拆分重试在出现无法翻译的段落和随机服务端错误时丢失的段落数
+
+每个请求都带有一个或多个“有毒”段落（服务端总是返回HTTP 400），
+同时服务端以error_rate的概率返回HTTP 503。整批重试时整个批次被丢弃；
+拆分重试时只有有毒段落进入失败队列。
+
+用法: python benchmarks/bench_retry.py --paragraphs 600 --poison-every 97
+"""
+import argparse
+import asyncio
+import time
+
+from bench_batching import make_batches, make_paragraphs
+from common import load_translator
+from stub_server import StubDeepSeekServer
+
+translator = load_translator()
+
+POISON = "POISONED"
+
+
+async def run_whole_batches(server, batches, concurrency):
+    """旧方式：一个批次失败就整体丢弃"""
+    session = translator.create_http_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    lost = 0
+
+    async def one(batch):
+        nonlocal lost
+        async with semaphore:
+            text = await translator.translate_with_deepseek_async(
+                batch, "stub-key", server.url, "stub-model", session=session,
+                retries=translator.DEFAULT_CONFIG['retries'], delay=translator.DEFAULT_CONFIG['retry_delay'])
+        if not text:
+            lost += len(batch)
+
+    try:
+        await asyncio.gather(*(one(batch) for batch in batches))
+    finally:
+        await session.close()
+    return lost, []
+
+
+async def run_bisection(server, batches, concurrency):
+    """新方式：失败批次拆分重试，仍失败的段落进入失败队列"""
+    session = translator.create_http_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    dead_letters = []
+    lost = 0
+    start_indices = []
+    position = 0
+    for batch in batches:
+        start_indices.append(position)
+        position += len(batch)
+
+    async def one(batch_index, batch):
+        nonlocal lost
+        text = await translator.translate_batch_async(
+            batch, "stub-key", server.url, "stub-model", semaphore,
+            {'batch_index': batch_index, 'start_index': start_indices[batch_index]},
+            session=session, dead_letters=dead_letters)
+        translated = len([p for p in text.split('\n') if p.strip()])
+        lost += max(0, len(batch) - translated)
+
+    try:
+        await asyncio.gather(*(one(i, batch) for i, batch in enumerate(batches)))
+    finally:
+        await session.close()
+    return lost, dead_letters
+
+
+async def main_async(args):
+    translator.DEFAULT_CONFIG['retry_delay'] = args.retry_delay
+    paragraphs = make_paragraphs(args.paragraphs)
+    poisoned = 0
+    for i in range(args.poison_every - 1, len(paragraphs), args.poison_every):
+        paragraphs[i] = f"{paragraphs[i]} {POISON}"
+        poisoned += 1
+    batches = make_batches(translator.FixedCountBatcher(args.batch_size), paragraphs)
+    print(f"段落数={len(paragraphs)}, 批次数={len(batches)}, 有毒段落={poisoned}, "
+          f"随机503概率={args.error_rate}")
+
+    for label, runner in (("整批重试", run_whole_batches), ("拆分重试", run_bisection)):
+        server = await StubDeepSeekServer(latency=args.latency, error_rate=args.error_rate,
+                                          retry_after=0, poison=POISON, seed=3).start()
+        try:
+            started = time.perf_counter()
+            lost, dead_letters = await runner(server, batches, args.concurrent)
+            elapsed = time.perf_counter() - started
+            print(f"{label}: 丢失段落={lost}, 失败队列={len(dead_letters)}, 请求数={server.request_count}, "
+                  f"400={server.rejected_count}, 503={server.error_count}, 用时 {elapsed:.2f}s")
+        finally:
+            await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重试与拆分策略基准测试")
+    parser.add_argument("--paragraphs", type=int, default=600, help="段落数")
+    parser.add_argument("--batch-size", type=int, default=8, help="每批段落数")
+    parser.add_argument("--poison-every", type=int, default=97, help="每隔多少个段落放一个有毒段落")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="随机返回503的概率")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="重试退避的基础等待时间（秒）")
+    parser.add_argument("--concurrent", type=int, default=4, help="并发请求数")
+    parser.add_argument("--latency", type=float, default=0.01, help="每个请求的固定延迟（秒）")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""对比每个任务独立线程运行与JobScheduler统一调度时，API的峰值并发和各任务完成时间
+
+同时提交若干个大小不同的PDF翻译任务：
+- 独立线程：每个任务一个线程和事件循环，各自按max_concurrent并发，总并发随任务数增长；
+- 调度器：同一个事件循环，最多max_active_jobs个任务同时运行，
+  所有任务共享global_max_concurrent_requests个API并发名额并轮流分配。
+
+用法: python benchmarks/bench_scheduler.py --jobs 4 --max-active-jobs 2 --budget 4
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from common import load_translator
+from pdf_fixtures import make_pdf
+from stub_server import BackgroundServer
+
+translator = load_translator()
+
+
+def job_kwargs(workdir, pdf_path, server, args):
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return dict(
+        pdf_path=pdf_path, api_key="stub-key",
+        output_path=os.path.join(workdir, f"translated_{name}.docx"),
+        progress_file=os.path.join(workdir, f"progress_{name}.json"),
+        api_url=server.url, api_model="stub-model", use_cache=False,
+        max_concurrent_requests=args.concurrent, adaptive_concurrency=False, stream_responses=False,
+        batching="count", batch_size=3)
+
+
+def run_threads(workdir, pdfs, server, args):
+    finished = {}
+    started = time.perf_counter()
+
+    def run(pdf_path):
+        asyncio.run(translator.main_async(**job_kwargs(workdir, pdf_path, server, args)))
+        finished[os.path.basename(pdf_path)] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=run, args=(pdf,)) for pdf in pdfs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return finished
+
+
+def run_scheduler(workdir, pdfs, server, args):
+    scheduler = translator.JobScheduler(args.max_active_jobs, args.budget).start()
+    finished = {}
+    done = threading.Semaphore(0)
+    started = time.perf_counter()
+
+    def factory(pdf_path):
+        async def job(request_budget, session):
+            try:
+                await translator.main_async(**job_kwargs(workdir, pdf_path, server, args),
+                                            request_budget=request_budget, session=session,
+                                            job_id=os.path.basename(pdf_path))
+            finally:
+                finished[os.path.basename(pdf_path)] = time.perf_counter() - started
+                done.release()
+        return job
+
+    positions = {os.path.basename(pdf): scheduler.submit(os.path.basename(pdf), factory(pdf)) for pdf in pdfs}
+    for _ in pdfs:
+        done.acquire()
+    print(f"  提交时的排队位置: {positions}")
+    return finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务调度基准测试")
+    parser.add_argument("--jobs", type=int, default=4, help="同时提交的任务数")
+    parser.add_argument("--pages", type=int, default=6, help="最小任务的页数（其余任务依次加倍）")
+    parser.add_argument("--concurrent", type=int, default=3, help="每个任务的并发数")
+    parser.add_argument("--max-active-jobs", type=int, default=2, help="调度器同时运行的任务数")
+    parser.add_argument("--budget", type=int, default=4, help="调度器的全局API并发数")
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的固定延迟（秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pdfs = []
+        for i in range(args.jobs):
+            path = os.path.join(workdir, f"book{i}.pdf")
+            make_pdf(path, args.pages * (2 ** (args.jobs - 1 - i)), seed=i)
+            pdfs.append(path)
+
+        server = BackgroundServer(latency=args.latency, tokens_per_second=4000)
+        try:
+            for label, runner in (("独立线程", run_threads), ("调度器", run_scheduler)):
+                server.server.reset_stats()
+                finished = runner(workdir, pdfs, server.server, args)
+                times = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in sorted(finished.items()))
+                print(f"{label}: API峰值并发={server.server.peak_in_flight}, "
+                      f"请求数={server.server.request_count}, 完成时间: {times}")
+                for name in os.listdir(workdir):
+                    if not name.endswith(".pdf"):
+                        os.remove(os.path.join(workdir, name))
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
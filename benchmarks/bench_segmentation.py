@@ -0,0 +1,138 @@
+"""句子分割器的吞吐量与断句正确率微基准
+
+生成数MB按行折行（类似PDF提取结果）的英文文本，其中包含缩写（e.g.、Dr.、Fig.）、
+小数、姓名缩写和空行分段。每个真实句子以唯一的标记词“zqN”结尾，
+段落的最后一个词不是标记词即说明在句子中间断开。
+对比最初的split_paragraphs_by_sentences实现（复制在本文件中）与当前的分割器：
+整段文本一次分割、只返回偏移量、以及按页增量输入三种方式。
+
+用法: python benchmarks/bench_segmentation.py --megabytes 4 --repeat 3
+"""
+import argparse
+import logging
+import random
+import re
+import time
+
+from common import load_translator
+from pdf_fixtures import WORDS
+
+translator = load_translator()
+
+ABBREVIATED = ["e.g. the", "i.e. a", "Dr. Smith", "Mr. Jones", "Fig. 3", "No. 7", "vs. the",
+               "J. K. Rowling", "3.5 percent", "pp. 12", "et al. found"]
+SENTENCE_END = re.compile(r'zq\d+[.!?]["”’)]*$')
+
+
+def make_text(target_bytes, seed=13, line_width=80):
+    """返回(文本, 句子数)"""
+    rnd = random.Random(seed)
+    lines = []
+    sentences = 0
+    size = 0
+    while size < target_bytes:
+        paragraph = []
+        for _ in range(rnd.randint(2, 9)):
+            words = [rnd.choice(WORDS) for _ in range(rnd.randint(6, 24))]
+            if rnd.random() < 0.4:
+                words.insert(rnd.randint(1, len(words) - 1), rnd.choice(ABBREVIATED))
+            sentence = " ".join(words).capitalize() + f" zq{sentences}" + rnd.choice(".....?!")
+            paragraph.append(sentence)
+            sentences += 1
+        # 按固定宽度折行，段落最后一行通常较短
+        line = ""
+        for word in " ".join(paragraph).split(" "):
+            if line and len(line) + 1 + len(word) > line_width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        if rnd.random() < 0.2:
+            lines.append("")
+        size += sum(len(part) + 1 for part in paragraph)
+    return "\n".join(lines) + "\n", sentences
+
+
+def legacy_split_paragraphs(text, sentences_per_paragraph=4):
+    """最初的实现（去掉日志）：先收集所有断点，再切出句子字符串，最后拼接成段落"""
+    text = text.replace('\r\n', '\n')
+    sentence_breaks = [match.end() - 1 for match in re.finditer(r'[.!?][\s\n]', text)]
+    if not sentence_breaks:
+        return [line.strip() for line in text.split('\n') if line.strip()]
+
+    sentences = []
+    prev_end = 0
+    for end in sentence_breaks:
+        sentence = text[prev_end:end + 1].strip()
+        if sentence:
+            sentences.append(sentence)
+        prev_end = end + 1
+    if prev_end < len(text):
+        last_sentence = text[prev_end:].strip()
+        if last_sentence:
+            sentences.append(last_sentence)
+
+    paragraphs = []
+    current_paragraph = []
+    for sentence in sentences:
+        current_paragraph.append(sentence)
+        if sentence.endswith('\n') or len(current_paragraph) >= sentences_per_paragraph:
+            paragraphs.append(' '.join(current_paragraph).strip())
+            current_paragraph = []
+    if current_paragraph:
+        paragraphs.append(' '.join(current_paragraph).strip())
+    return [p for p in paragraphs if p]
+
+
+def incremental(text, sentences_per_paragraph, page_chars=3000):
+    """按页（约page_chars个字符）增量输入，与翻译流水线的用法相同"""
+    segmenter = translator.SentenceSegmenter(sentences_per_paragraph)
+    paragraphs = []
+    for start in range(0, len(text), page_chars):
+        paragraphs.extend(segmenter.feed(text[start:start + page_chars]))
+    return paragraphs + segmenter.finish()
+
+
+def timed(function, text, sentences_per_paragraph, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(text, sentences_per_paragraph)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="句子分割微基准")
+    parser.add_argument("--megabytes", type=float, default=4, help="生成文本的大小（MB）")
+    parser.add_argument("--sentences", type=int, default=4, help="每段句子数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式重复次数（取最快一次）")
+    args = parser.parse_args()
+    # 分割器在单独的一段文本上记录日志，计时时关闭
+    logging.disable(logging.CRITICAL)
+
+    text, sentences = make_text(int(args.megabytes * 1024 * 1024))
+    megabytes = len(text.encode('utf-8')) / 1024 / 1024
+    print(f"文本 {megabytes:.1f} MB, 真实句子数={sentences}")
+
+    runs = (
+        ("最初实现", legacy_split_paragraphs),
+        ("当前分割器", translator.split_paragraphs_by_sentences),
+        ("仅偏移量", translator.paragraph_spans),
+        ("按页增量", incremental),
+    )
+    for label, function in runs:
+        elapsed, result = timed(function, text, args.sentences, args.repeat)
+        if function is translator.paragraph_spans:
+            paragraphs = [text[start:end] for start, end in result]
+        else:
+            paragraphs = result
+        broken = sum(1 for p in paragraphs if not SENTENCE_END.search(p.rstrip()))
+        print(f"{label}: {elapsed:.3f}s, {megabytes / elapsed:.1f} MB/s, 段落数={len(paragraphs)}, "
+              f"在句子中间断开的段落={broken} ({broken / max(len(paragraphs), 1):.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""流式接收译文的首段延迟与断流恢复测试
+
+1. 同一批次分别以普通方式和流式方式请求，比较收到第一个完整段落的时间；
+2. 模拟服务端随机断开流，检查只重新请求未收到的段落后所有段落都正确对齐。
+
+用法: python benchmarks/bench_streaming.py --batch-size 12 --cut-rate 0.3
+"""
+import argparse
+import asyncio
+import time
+
+from bench_batching import make_batches, make_paragraphs
+from common import load_translator
+from stub_server import StubDeepSeekServer
+
+translator = load_translator()
+
+
+async def first_paragraph_latency(server, batch, stream):
+    """返回(首个段落的耗时, 完整响应的耗时)"""
+    first = []
+    started = time.perf_counter()
+
+    def on_paragraph(index, text):
+        if not first:
+            first.append(time.perf_counter() - started)
+
+    text = await translator.translate_with_deepseek_async(
+        batch, "stub-key", server.url, "stub-model", raw_output=True,
+        stream=stream, on_paragraph=on_paragraph)
+    total = time.perf_counter() - started
+    # 非流式时整个响应到达后才能拿到第一个段落
+    return (first[0] if first else total), total, translator.parse_numbered_translation(text, len(batch))
+
+
+async def cut_stream_recovery(server, batches, concurrency):
+    session = translator.create_http_session(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    tracker = translator.ProgressTracker()
+    results = {'correct': 0, 'wrong': 0, 'dead': 0}
+
+    async def one(batch_index, batch):
+        dead_letters = []
+        text = await translator.translate_batch_async(
+            batch, "stub-key", server.url, "stub-model", semaphore,
+            {'batch_index': batch_index, 'start_index': 0}, tracker, session,
+            dead_letters=dead_letters, stream=True)
+        failed = {entry['index'] for entry in dead_letters}
+        written = [p for i, p in enumerate(batch) if i not in failed]
+        lines = [p.strip() for p in text.split('\n') if p.strip()]
+        correct = sum(1 for source, line in zip(written, lines) if line == f"【译】{source}")
+        results['correct'] += correct
+        results['wrong'] += len(lines) - correct
+        results['dead'] += len(failed)
+
+    try:
+        await asyncio.gather(*(one(i, batch) for i, batch in enumerate(batches)))
+    finally:
+        await session.close()
+    return results, tracker.summary
+
+
+async def main_async(args):
+    paragraphs = make_paragraphs(args.paragraphs)
+    batch = paragraphs[:args.batch_size]
+
+    server = await StubDeepSeekServer(latency=args.latency, tokens_per_second=args.tokens_per_second).start()
+    try:
+        for label, stream in (("普通响应", False), ("流式响应", True)):
+            first, total, aligned = await first_paragraph_latency(server, batch, stream)
+            print(f"{label}: 首段 {first:.2f}s, 完整响应 {total:.2f}s, "
+                  f"对齐段落 {sum(1 for t in aligned if t)}/{len(batch)}")
+    finally:
+        await server.stop()
+
+    batches = make_batches(translator.FixedCountBatcher(args.batch_size), paragraphs)
+    server = await StubDeepSeekServer(latency=0.005, stream_cut_rate=args.cut_rate, seed=11).start()
+    try:
+        results, summary = await cut_stream_recovery(server, batches, args.concurrent)
+        print(f"断流恢复: 段落数={len(paragraphs)}, 请求数={server.request_count}, 断流={server.cut_count}, "
+              f"正确={results['correct']}, 错配={results['wrong']}, 失败={results['dead']}, "
+              f"重新请求段落={summary.get('alignment_rerequested', 0)}, "
+              f"流式推送段落={summary.get('streamed_paragraphs', 0)}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式响应基准测试")
+    parser.add_argument("--paragraphs", type=int, default=600, help="断流测试的段落数")
+    parser.add_argument("--batch-size", type=int, default=12, help="每批段落数")
+    parser.add_argument("--tokens-per-second", type=float, default=300, help="模拟生成速度")
+    parser.add_argument("--latency", type=float, default=0.2, help="首个token之前的延迟（秒）")
+    parser.add_argument("--cut-rate", type=float, default=0.3, help="流在中途断开的概率")
+    parser.add_argument("--concurrent", type=int, default=4, help="并发请求数")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""分片任务的工作进程扩展性测试：共享任务存储 + 多个工作进程
+
+把合成PDF按--chunk-pages切分为分片提交到SQLite任务存储，再启动W个工作进程（--workers的每个值各运行一次）
+领取分片翻译，最后一个分片完成后由工作进程合并文档。报告总耗时、吞吐量、相对第一种工作进程数的加速比、
+API峰值并发和429次数。模拟接口的--max-concurrency表示服务商的并发上限，
+工作进程数 × 每个进程的并发数超过该上限后吞吐量不再增长。
+--kill-after N 在N秒后强制结束第一个工作进程，检查其分片在租约（--lease）过期后被其他工作进程接手。
+
+用法: python benchmarks/bench_workers.py --pages 48 --chunk-pages 4 --workers 1 2 4 8 --concurrent 2 \\
+          --max-concurrency 12 --latency 0.2
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common import load_translator
+from pdf_fixtures import make_pdf
+from stub_server import BackgroundServer
+
+
+def run_worker(db_path, worker_id, work_dir, lease, api_url):
+    translator = load_translator()
+    translator.DEFAULT_CONFIG['retry_delay'] = 0.05
+    store = translator.SQLiteJobStore(db_path)
+    translator.run_worker(store, "stub-key", worker_id=worker_id, work_dir=work_dir, lease=lease,
+                          poll_interval=0.1, exit_when_idle=True, api_url=api_url)
+
+
+def run_once(translator, pdf_path, server, workers, args, workdir):
+    import docx
+
+    db_path = os.path.join(workdir, f"jobs_{workers}.db")
+    store = translator.SQLiteJobStore(db_path)
+    job_id = translator.submit_sharded_job(
+        store, pdf_path, chunk_pages=args.chunk_pages,
+        api_model="stub-model", use_cache=False, batching="count", batch_size=3,
+        max_concurrent_requests=args.concurrent, adaptive_concurrency=False, stream_responses=False)
+
+    context = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    processes = [context.Process(target=run_worker, args=(
+        db_path, f"w{number}", os.path.join(workdir, f"worker_{workers}_{number}"), args.lease, server.url))
+        for number in range(workers)]
+    for process in processes:
+        process.start()
+    if args.kill_after:
+        time.sleep(args.kill_after)
+        processes[0].kill()
+    output_path = os.path.join(workdir, f"translated_{workers}.docx")
+    ok = translator.wait_for_job(store, job_id, output_path, poll_interval=0.05)
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    job = store.job(job_id)
+    written = sum(1 for p in docx.Document(output_path).paragraphs if p.text.strip()) if ok else 0
+    attempts = store.conn.execute("SELECT SUM(attempts) FROM shards WHERE job_id = ?", (job_id,)).fetchone()[0]
+    store.close()
+    return {'ok': ok, 'elapsed': elapsed, 'paragraphs': job['paragraphs'], 'written': written,
+            'shards': job['shards'], 'attempts': attempts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片任务工作进程扩展性测试")
+    parser.add_argument("--pages", type=int, default=48, help="合成PDF的页数")
+    parser.add_argument("--chunk-pages", type=int, default=4, help="每个分片的页数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="工作进程数（可给多个值）")
+    parser.add_argument("--concurrent", type=int, default=2, help="每个工作进程的并发请求数")
+    parser.add_argument("--max-concurrency", type=int, default=12, help="模拟服务商的并发上限（超出返回429）")
+    parser.add_argument("--latency", type=float, default=0.2, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--lease", type=float, default=3, help="分片租约时长（秒）")
+    parser.add_argument("--kill-after", type=float, default=0, help="N秒后强制结束第一个工作进程")
+    args = parser.parse_args()
+
+    translator = load_translator()
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = os.path.join(workdir, f"synthetic_{args.pages}p.pdf")
+        make_pdf(pdf_path, args.pages)
+        server = BackgroundServer(latency=args.latency, max_concurrency=args.max_concurrency)
+        baseline = None
+        try:
+            for workers in args.workers:
+                server.server.reset_stats()
+                result = run_once(translator, pdf_path, server.server, workers, args, workdir)
+                baseline = baseline or result['elapsed']
+                print(f"工作进程={workers}: {result['elapsed']:.2f}s, "
+                      f"{result['paragraphs'] / result['elapsed']:.1f} 段/秒, "
+                      f"加速比={baseline / result['elapsed']:.2f}, "
+                      f"API峰值并发={server.server.peak_in_flight}, 请求={server.server.request_count} "
+                      f"429={server.server.throttled_count}, 分片={result['shards']} "
+                      f"领取次数={result['attempts']}, 段落={result['written']}/{result['paragraphs']}"
+                      f"{'' if result['ok'] else ', 任务失败'}")
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
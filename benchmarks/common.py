@@ -0,0 +1,30 @@
+"""基准测试公共工具：加载翻译模块、统计辅助函数"""
+import logging
+import os
+import sys
+from importlib.util import spec_from_file_location, module_from_spec
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_translator():
+    """与app.py相同的方式动态导入翻译脚本"""
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    translator_path = os.path.join(ROOT_DIR, "#Book TranslateV1.py")
+    spec = spec_from_file_location("translator", translator_path)
+    translator = module_from_spec(spec)
+    spec.loader.exec_module(translator)
+    # 基准测试时只保留警告以上的日志，避免日志输出影响计时
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("translator").setLevel(logging.WARNING)
+    return translator
+
+
+def percentile(values, pct):
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
@@ -0,0 +1,52 @@
+"""生成用于基准测试的合成PDF（不依赖第三方PDF生成库）"""
+import random
+
+WORDS = ("the of translation model paragraph book chapter system network data "
+         "analysis result method value language process").split()
+
+
+def make_pdf(path, pages, lines_per_page=30, seed=1, header="Running Header Title"):
+    """生成每页带页眉、正文句子和页码的英文PDF"""
+    rnd = random.Random(seed)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    content_ids = []
+    for page_number in range(1, pages + 1):
+        ops = ["BT /F1 10 Tf 50 800 Td 12 TL", f"({header}) Tj T* T*"]
+        for _ in range(lines_per_page):
+            words = [rnd.choice(WORDS) for _ in range(rnd.randint(6, 12))]
+            ops.append(f"({' '.join(words).capitalize()}.) Tj T*")
+        ops.append("ET")
+        # 页码位于页面底部居中
+        ops.append(f"BT /F1 10 Tf 297 40 Td ({page_number}) Tj ET")
+        data = "\n".join(ops).encode("latin-1")
+        content_ids.append(add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"))
+
+    pages_id = len(objects) + len(content_ids) + 1
+    page_ids = [add(f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 595 842] "
+                    f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {cid} 0 R >>".encode())
+                for cid in content_ids]
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    add(f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode())
+    catalog_id = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += (f"trailer\n<< /Size {len(objects) + 1} /Root {catalog_id} 0 R >>\n"
+               f"startxref\n{xref_offset}\n%%EOF\n").encode()
+
+    with open(path, "wb") as f:
+        f.write(output)
+    return path
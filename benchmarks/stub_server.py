@@ -0,0 +1,215 @@
+"""本地模拟的DeepSeek chat-completions接口，用于离线基准测试"""
+import asyncio
+import json
+import random
+import re
+import threading
+
+from aiohttp import web
+
+MARKER_PATTERN = re.compile(r'^段落(\d+)[:：]\s*', re.MULTILINE)
+
+
+def estimate_tokens(text):
+    """与翻译模块相同的粗略估算：约4个英文字符1个token"""
+    return (len(text) + 3) // 4
+
+
+def parse_marked_paragraphs(content):
+    """从请求内容中解析出 [(段落编号, 原文)]，段落内的换行会被合并"""
+    parts = MARKER_PATTERN.split(content)
+    return [(int(parts[i]), ' '.join(parts[i + 1].split()))
+            for i in range(1, len(parts) - 1, 2)]
+
+
+class StubDeepSeekServer:
+    """模拟聊天补全接口：将每个“段落N: 原文”转换为“段落N: 【译】原文”
+
+    latency为首个token之前的延迟（秒），latency_distribution为fixed（固定）、uniform
+    （在latency×(1±latency_spread)之间均匀分布）或lognormal（中位数为latency、对数标准差为latency_spread，
+    有长尾）。
+    max_concurrency模拟服务商的并发限制，超出时返回HTTP 429；throttle_rate为随机返回HTTP 429的概率；
+    error_rate为随机返回HTTP error_status（默认503）的概率；
+    retry_after不为空时，429/5xx响应带上Retry-After头。
+    poison为字符串时，原文中包含该字符串的请求总是返回HTTP 400，模拟无法处理的段落。
+    misalign_rate为每个请求的输出发生错位的概率：随机把一段合并到上一段或丢弃一段。
+    请求带有"stream": true时以SSE逐块返回译文（生成时间分摊到各块）；
+    stream_cut_rate为流在中途断开（不发送[DONE]）的概率。
+    tokens_per_second不为空时，响应时间还包括按输出token数计算的生成时间；
+    max_output_tokens模拟模型的输出上限，超出部分被截断。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.02,
+                 max_concurrency=None, error_rate=0.0, seed=0,
+                 latency_distribution="fixed", latency_spread=0.5, throttle_rate=0.0, error_status=503,
+                 tokens_per_second=None, max_output_tokens=None, retry_after=None, poison=None,
+                 misalign_rate=0.0, stream_cut_rate=0.0, chunk_chars=16):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.latency_spread = latency_spread
+        self.throttle_rate = throttle_rate
+        self.error_status = error_status
+        self.tokens_per_second = tokens_per_second
+        self.max_output_tokens = max_output_tokens
+        self.truncated_count = 0
+        self.max_concurrency = max_concurrency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.poison = poison
+        self.rejected_count = 0
+        self.misalign_rate = misalign_rate
+        self.misaligned_count = 0
+        self.stream_cut_rate = stream_cut_rate
+        self.chunk_chars = chunk_chars
+        self.cut_count = 0
+        self.random = random.Random(seed)
+        self.request_count = 0
+        self.throttled_count = 0
+        self.error_count = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections = set()
+        self._runner = None
+
+    def sample_latency(self):
+        """按配置的分布抽取一次首个token之前的延迟"""
+        if self.latency_distribution == "uniform":
+            return self.latency * self.random.uniform(1 - self.latency_spread, 1 + self.latency_spread)
+        if self.latency_distribution == "lognormal":
+            return self.latency * self.random.lognormvariate(0, self.latency_spread)
+        return self.latency
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/api/v3/chat/completions"
+
+    async def handle_chat(self, request):
+        self.request_count += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+        payload = await request.json()
+        content = payload["messages"][-1]["content"]
+
+        headers = {"Retry-After": str(self.retry_after)} if self.retry_after is not None else None
+        if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+            self.throttled_count += 1
+            return web.json_response({"error": "rate limited"}, status=429, headers=headers)
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            self.throttled_count += 1
+            return web.json_response({"error": "rate limited"}, status=429, headers=headers)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.error_count += 1
+            return web.json_response({"error": "service unavailable"}, status=self.error_status, headers=headers)
+        if self.poison and self.poison in content:
+            self.rejected_count += 1
+            return web.json_response({"error": "invalid request"}, status=400)
+
+        truncated_before = self.truncated_count
+        lines = self.translate_lines(content)
+        output_tokens = sum(estimate_tokens(line) for line in lines)
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if payload.get("stream"):
+                return await self.stream_lines(request, lines, self.truncated_count > truncated_before)
+            delay = self.sample_latency()
+            if self.tokens_per_second:
+                delay += output_tokens / self.tokens_per_second
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": "\n".join(lines)}}]
+        })
+
+    async def stream_lines(self, request, lines, truncated):
+        """以SSE格式逐块发送译文，模拟按token生成的速度"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.sample_latency())
+
+        text = "\n".join(lines)
+        cut_at = None
+        if self.stream_cut_rate and text and self.random.random() < self.stream_cut_rate:
+            self.cut_count += 1
+            cut_at = self.random.randrange(len(text))
+        for start in range(0, len(text), self.chunk_chars):
+            chunk = text[start:start + self.chunk_chars]
+            if cut_at is not None and start + len(chunk) > cut_at:
+                await self.send_event(response, {"choices": [{"delta": {"content": chunk[:cut_at - start]}}]})
+                return response
+            if self.tokens_per_second:
+                await asyncio.sleep(estimate_tokens(chunk) / self.tokens_per_second)
+            await self.send_event(response, {"choices": [{"delta": {"content": chunk}}]})
+
+        finish_reason = "length" if truncated else "stop"
+        await self.send_event(response, {"choices": [{"delta": {}, "finish_reason": finish_reason}]})
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    @staticmethod
+    async def send_event(response, data):
+        await response.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def translate_lines(self, content):
+        """生成“译文”行，超出输出上限时截断"""
+        lines = []
+        used_tokens = 0
+        for num, text in parse_marked_paragraphs(content):
+            line = f"段落{num}: 【译】{text}"
+            used_tokens += estimate_tokens(line)
+            if self.max_output_tokens and used_tokens > self.max_output_tokens:
+                self.truncated_count += 1
+                break
+            lines.append(line)
+        if self.misalign_rate and len(lines) > 1 and self.random.random() < self.misalign_rate:
+            self.misaligned_count += 1
+            i = self.random.randrange(1, len(lines))
+            if self.random.random() < 0.5:
+                # 合并到上一段（丢失段落标记）
+                lines[i - 1] += " " + MARKER_PATTERN.sub("", lines[i])
+            del lines[i]
+        return lines
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/v3/chat/completions", self.handle_chat)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def reset_stats(self):
+        self.request_count = 0
+        self.throttled_count = 0
+        self.error_count = 0
+        self.rejected_count = 0
+        self.misaligned_count = 0
+        self.cut_count = 0
+        self.peak_in_flight = 0
+        self.truncated_count = 0
+        self.connections = set()
+
+
+class BackgroundServer:
+    """在独立线程的事件循环中运行模拟API，供多个事件循环（或子进程）同时访问"""
+
+    def __init__(self, **options):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.server = StubDeepSeekServer(**options)
+        asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
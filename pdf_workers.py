@@ -0,0 +1,73 @@
+"""供进程池调用的函数（PDF提取、分块翻译的页码范围子任务、分片任务的工作进程）
+
+主脚本 `#Book TranslateV1.py` 的文件名无法被子进程按模块名导入，
+因此需要在子进程中执行的函数放在这个可正常导入的模块里。
+"""
+import asyncio
+import importlib.util
+import time
+
+import pdfplumber
+from pdfplumber.utils import cluster_objects
+
+# 顶部位置相差不超过该值（点）的单词属于同一行，与page.extract_text的默认值相同
+LINE_TOLERANCE = 3
+
+
+def extract_page_layout(page):
+    """按单词位置把页面分成行，返回(页高, [(行顶部, 行底部, 行文本)])，行按从上到下排列
+
+    坐标相对于页面的上边缘。行文本与page.extract_text()的对应行相同（单词之间以空格分隔），
+    耗时也基本相同，只是多保留了每行的位置，供版面提取模式识别页眉页脚。
+    """
+    top_offset = page.bbox[1]
+    lines = []
+    for words in cluster_objects(page.extract_words(), "top", LINE_TOLERANCE):
+        words.sort(key=lambda word: word["x0"])
+        lines.append((min(word["top"] for word in words) - top_offset,
+                      max(word["bottom"] for word in words) - top_offset,
+                      " ".join(word["text"] for word in words)))
+    return page.height, lines
+
+
+def extract_page_range(pdf_path, first_page, last_page, layout=False):
+    """提取 [first_page, last_page) 范围内各页的文本（页码从0开始），按顺序返回列表
+
+    layout为True时每页返回extract_page_layout的结果。
+    """
+    page_numbers = list(range(first_page + 1, last_page + 1))
+    texts = []
+    with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+        for page in pdf.pages:
+            texts.append(extract_page_layout(page) if layout else page.extract_text() or "")
+            page.flush_cache()
+    return texts
+
+
+_translator = None
+
+
+def load_translator(engine_path):
+    """在子进程中按文件路径加载主脚本（每个进程只加载一次）"""
+    global _translator
+    if _translator is None:
+        spec = importlib.util.spec_from_file_location("translator", engine_path)
+        _translator = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_translator)
+    return _translator
+
+
+def run_translation_chunk(engine_path, log_level, job):
+    """在子进程中运行一个页码范围子任务（main_async的关键字参数job），返回(是否成功, 耗时秒数)"""
+    translator = load_translator(engine_path)
+    translator.setup_logging(log_level)
+    started = time.perf_counter()
+    ok = asyncio.run(translator.main_async(**job))
+    return ok, time.perf_counter() - started
+
+
+def run_job_worker(engine_path, log_level, store_url, api_key):
+    """在子进程中运行分片任务的工作进程，没有剩余工作时退出"""
+    translator = load_translator(engine_path)
+    translator.setup_logging(log_level)
+    return translator.run_worker(translator.open_job_store(store_url), api_key, exit_when_idle=True)
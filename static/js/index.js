@@ -2,11 +2,13 @@
 $(document).ready(function() {
     // 存储活跃的翻译任务信息
     let activeTranslations = {};
+    // 每个文件的进度推送连接
+    let progressSources = {};
     
     // 检查上传文件夹内容，查找可能正在进行翻译的文件
     checkActiveTranslations();
     
-    // 每10秒检查一次活跃的翻译任务
+    // 每10秒检查一次上传文件列表，新出现的文件订阅进度推送
     setInterval(checkActiveTranslations, 10000);
     
     // 检查正在进行的翻译任务
@@ -18,35 +20,61 @@ $(document).ready(function() {
                 if (response.status === 'success' && response.uploads && response.uploads.length > 0) {
                     // 循环检查每个上传的PDF文件是否正在翻译
                     response.uploads.forEach(function(filename) {
-                        checkFileProgress(filename);
+                        if (window.EventSource) {
+                            watchFileProgress(filename);
+                        } else {
+                            checkFileProgress(filename);
+                        }
                     });
                 }
             }
         });
     }
     
-    // 检查特定文件的翻译进度
+    // 订阅特定文件的进度推送；连接断开后由下一次列表检查重新订阅
+    function watchFileProgress(filename) {
+        if (progressSources[filename]) {
+            return;
+        }
+        
+        const source = new EventSource('/progress_stream/' + filename);
+        progressSources[filename] = source;
+        source.onmessage = function(event) {
+            handleFileProgress(filename, JSON.parse(event.data));
+        };
+        source.onerror = function() {
+            source.close();
+            delete progressSources[filename];
+        };
+    }
+    
+    // 检查特定文件的翻译进度（不支持推送时轮询）
     function checkFileProgress(filename) {
         $.ajax({
             url: '/check_progress/' + filename,
             type: 'GET',
             success: function(response) {
-                if (response.status === 'in_progress' || response.status === 'finalizing') {
-                    // 更新或添加到活跃翻译列表
-                    updateActiveTranslation(filename, response);
-                } else if (response.status === 'completed') {
-                    // 如果翻译完成，从活跃列表中移除
-                    removeActiveTranslation(filename);
-                    // 刷新页面以显示新的已翻译文件（可选）
-                    // window.location.reload();
-                } else if (activeTranslations[filename]) {
-                    // 如果之前在列表中但现在不是活跃状态，移除
-                    removeActiveTranslation(filename);
-                }
+                handleFileProgress(filename, response);
             }
         });
     }
     
+    // 根据进度数据更新活跃任务列表
+    function handleFileProgress(filename, response) {
+        if (response.status === 'in_progress' || response.status === 'finalizing' || response.status === 'queued') {
+            // 更新或添加到活跃翻译列表
+            updateActiveTranslation(filename, response);
+        } else if (response.status === 'completed') {
+            // 如果翻译完成，从活跃列表中移除
+            removeActiveTranslation(filename);
+            // 刷新页面以显示新的已翻译文件（可选）
+            // window.location.reload();
+        } else if (activeTranslations[filename]) {
+            // 如果之前在列表中但现在不是活跃状态，移除
+            removeActiveTranslation(filename);
+        }
+    }
+    
     // 更新活跃翻译任务的显示
     function updateActiveTranslation(filename, progressData) {
         // 添加到跟踪对象
@@ -88,6 +116,8 @@ $(document).ready(function() {
         } else if (progressData.status === 'finalizing') {
             percentage = 99;
             statusText = progressData.message || '正在处理最终结果...';
+        } else if (progressData.status === 'queued') {
+            statusText = progressData.message || `排队中（第 ${progressData.queue_position} 位）`;
         }
         
         // 更新UI
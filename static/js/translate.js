@@ -72,6 +72,15 @@ $(document).ready(function() {
             return;
         }
         
+        // 验证页码范围（留空时翻译全部页面）
+        const startPage = parseInt($('#start_page').val(), 10);
+        const endPage = parseInt($('#end_page').val(), 10);
+        if (startPage && endPage && startPage > endPage) {
+            $('#progress-container').removeClass('d-none');
+            showError('起始页不能大于结束页');
+            return;
+        }
+        
         // 显示进度容器
         $('#progress-container').removeClass('d-none');
         // 禁用开始翻译按钮
@@ -79,6 +88,23 @@ $(document).ready(function() {
         
         // 获取表单数据
         const formData = new FormData($('#translation-form')[0]);
+        // 组批方式：按长度组批时提交每批的token预算，按段落数组批时使用批处理大小
+        formData.set('batching', $('#batching').val());
+        formData.set('batch_size', $('#batch_size').val());
+        formData.delete('max_input_tokens');
+        const maxInputTokens = parseInt($('#max_input_tokens').val(), 10);
+        if ($('#batching').val() === 'tokens' && maxInputTokens) {
+            formData.set('max_input_tokens', maxInputTokens);
+        }
+        // 页码范围：只提交填写了的一端，服务端按1-based闭区间截取
+        formData.delete('start_page');
+        formData.delete('end_page');
+        if (startPage) {
+            formData.set('start_page', startPage);
+        }
+        if (endPage) {
+            formData.set('end_page', endPage);
+        }
         
         // 发送翻译请求
         $.ajax({
@@ -91,9 +117,7 @@ $(document).ready(function() {
                 if (response.status === 'success') {
                     // 初始化进度检查
                     updateProgressBar(0, '初始化翻译中...');
-                    setTimeout(() => {
-                        checkProgress(formData.get('filename'));
-                    }, 2000);
+                    watchProgress(formData.get('filename'));
                 } else {
                     showError(response.message || '翻译失败，请重试');
                     resetForm();
@@ -107,46 +131,48 @@ $(document).ready(function() {
         });
     });
     
-    // 检查翻译进度
+    // 订阅服务器推送的翻译进度，浏览器不支持或连接失败时改为轮询
+    function watchProgress(filename) {
+        if (!window.EventSource) {
+            checkProgress(filename);
+            return;
+        }
+        
+        const source = new EventSource('/progress_stream/' + filename);
+        let finished = false;
+        source.onmessage = function(event) {
+            const response = JSON.parse(event.data);
+            if (handleProgress(response)) {
+                finished = true;
+                source.close();
+            }
+        };
+        source.onerror = function() {
+            // 连接断开（或任务不在当前服务进程中），改为轮询
+            source.close();
+            if (!finished) {
+                setTimeout(function() {
+                    checkProgress(filename);
+                }, 2000);
+            }
+        };
+    }
+    
+    // 检查翻译进度（轮询方式）
     function checkProgress(filename) {
         $.ajax({
             url: '/check_progress/' + filename,
             type: 'GET',
             success: function(response) {
-                console.log('Progress check response:', response); // 调试日志
-                
-                if (response.status === 'in_progress') {
-                    // 更新进度条
-                    updateProgressBar(response.percentage, `已完成: ${response.completed}/${response.total} (${response.percentage.toFixed(1)}%)`);
-                    
+                if (!handleProgress(response)) {
                     // 继续检查进度
                     setTimeout(function() {
                         checkProgress(filename);
-                    }, 2000);
-                } else if (response.status === 'completed') {
-                    // 显示完成状态
-                    updateProgressBar(100, '翻译完成!');
-                    showCompleted(response.output_file);
-                } else if (response.status === 'finalizing') {
-                    // 显示正在完成的状态
-                    updateProgressBar(99, response.message || '正在处理最终结果...');
-                    // 继续检查进度
-                    setTimeout(function() {
-                        checkProgress(filename);
-                    }, 2000);
-                } else if (response.status === 'error') {
-                    showError(response.message || '翻译过程中发生错误');
-                    resetForm();
-                } else {
-                    // 未开始或未知状态，继续检查
-                    updateProgressBar(0, '等待任务开始...');
-                    setTimeout(function() {
-                        checkProgress(filename);
-                    }, 3000);
+                    }, response.status === 'not_started' ? 3000 : 2000);
                 }
             },
             error: function(xhr, status, error) {
-                console.error('Progress check error:', error, xhr.responseText); // 调试日志
+                console.error('Progress check error:', error, xhr.responseText);
                 showError('检查进度时发生错误');
                 
                 // 继续检查，除非是严重错误
@@ -157,6 +183,56 @@ $(document).ready(function() {
         });
     }
     
+    // 根据进度数据更新界面，任务结束（完成或出错）时返回true
+    function handleProgress(response) {
+        if (response.status === 'in_progress') {
+            // 更新进度条，附带速度和预计剩余时间
+            let text = `已完成: ${response.completed}/${response.total} (${response.percentage.toFixed(1)}%)`;
+            if (response.throughput) {
+                text += ` · ${response.throughput.toFixed(1)} 段/秒`;
+            }
+            if (response.eta_seconds !== null && response.eta_seconds !== undefined) {
+                text += ` · 预计剩余 ${formatDuration(response.eta_seconds)}`;
+            }
+            updateProgressBar(response.percentage, text);
+            
+            // 显示流式收到的最新译文
+            if (response.latest_translation) {
+                $('#latest-translation').removeClass('d-none').text('最新译文: ' + response.latest_translation);
+            }
+            return false;
+        } else if (response.status === 'completed') {
+            // 显示完成状态
+            updateProgressBar(100, '翻译完成!');
+            $('#latest-translation').addClass('d-none');
+            showCompleted(response.output_file);
+            return true;
+        } else if (response.status === 'finalizing') {
+            // 显示正在完成的状态
+            updateProgressBar(99, response.message || '正在处理最终结果...');
+            return false;
+        } else if (response.status === 'queued') {
+            // 显示排队位置
+            updateProgressBar(0, response.message || `排队中（第 ${response.queue_position} 位）`);
+            return false;
+        } else if (response.status === 'error') {
+            $('#latest-translation').addClass('d-none');
+            showError(response.message || '翻译过程中发生错误');
+            resetForm();
+            return true;
+        }
+        // 未开始或未知状态
+        updateProgressBar(0, '等待任务开始...');
+        return false;
+    }
+    
+    // 把秒数格式化为“X分Y秒”
+    function formatDuration(seconds) {
+        seconds = Math.max(0, Math.round(seconds));
+        const minutes = Math.floor(seconds / 60);
+        return minutes > 0 ? `${minutes}分${seconds % 60}秒` : `${seconds}秒`;
+    }
+    
     // 更新进度条
     function updateProgressBar(percentage, text) {
         console.log('Updating progress bar:', percentage, text); // 调试日志
@@ -192,45 +268,58 @@ $(document).ready(function() {
         $('#start-translation').prop('disabled', false).html('<i class="fas fa-play-circle"></i> 开始翻译');
     }
     
-    // 加载文档预览
-    function loadDocumentPreview() {
+    // 加载文档预览：offset为起始页（从0开始），每次只请求一个页窗口
+    function loadDocumentPreview(offset) {
         const filename = $('#filename').val();
+        offset = offset || 0;
         
         $.ajax({
             url: '/preview/' + filename,
             type: 'GET',
+            data: { offset: offset },
             success: function(response) {
                 if (response.status === 'success') {
-                    renderPreview(response.preview);
-                } else {
+                    renderPreview(response.preview, offset > 0);
+                } else if (offset === 0) {
                     $('#preview-content').html(
                         `<div class="alert alert-warning"><i class="fas fa-exclamation-triangle"></i> 无法加载预览: ${response.message}</div>`
                     );
+                } else {
+                    $('#load-more-preview').prop('disabled', false).text('加载失败，点击重试');
                 }
             },
             error: function() {
-                $('#preview-content').html(
-                    `<div class="alert alert-danger"><i class="fas fa-exclamation-circle"></i> 预览加载失败</div>`
-                );
+                if (offset === 0) {
+                    $('#preview-content').html(
+                        `<div class="alert alert-danger"><i class="fas fa-exclamation-circle"></i> 预览加载失败</div>`
+                    );
+                } else {
+                    $('#load-more-preview').prop('disabled', false).text('加载失败，点击重试');
+                }
             }
         });
     }
     
-    // 渲染预览内容
-    function renderPreview(previewData) {
+    // 渲染预览内容，append为true时追加到已显示的页面之后
+    function renderPreview(previewData, append) {
         const $previewContent = $('#preview-content');
-        $previewContent.empty();
+        let $container = $previewContent.find('.preview-container');
         
-        if (!previewData || !previewData.previews || previewData.previews.length === 0) {
-            $previewContent.html('<div class="alert alert-warning">没有可用的预览内容</div>');
-            return;
+        if (!append) {
+            $previewContent.empty();
+            
+            if (!previewData || !previewData.previews || previewData.previews.length === 0) {
+                $previewContent.html('<div class="alert alert-warning">没有可用的预览内容</div>');
+                return;
+            }
+            
+            $container = $('<div class="preview-container"></div>');
+            $previewContent.append($container);
+            
+            // 添加页面总数信息
+            $container.append(`<div class="mb-3 text-muted">文档共 ${previewData.total_pages} 页：</div>`);
         }
-        
-        const $container = $('<div class="preview-container"></div>');
-        $previewContent.append($container);
-        
-        // 添加页面总数信息
-        $container.append(`<div class="mb-3 text-muted">文档共 ${previewData.total_pages} 页，以下是前几页预览：</div>`);
+        $container.find('.preview-more').remove();
         
         // 逐页添加预览内容
         previewData.previews.forEach(pagePreview => {
@@ -247,7 +336,28 @@ $(document).ready(function() {
             
             $container.append($pageTemplate);
         });
+        
+        // 还有后续页面时显示“加载更多”
+        if (previewData.next_offset !== null && previewData.next_offset !== undefined) {
+            const $more = $(`<div class="preview-more text-center mb-3">
+                <button id="load-more-preview" class="btn btn-sm btn-outline-secondary">加载更多页面</button>
+            </div>`);
+            $more.find('button').on('click', function() {
+                $(this).prop('disabled', true).text('加载中...');
+                loadDocumentPreview(previewData.next_offset);
+            });
+            $container.append($more);
+        }
+    }
+    
+    // 组批方式切换时只启用对应的设置项
+    function updateBatchingFields() {
+        const byTokens = $('#batching').val() === 'tokens';
+        $('#max_input_tokens').prop('disabled', !byTokens);
+        $('#batch_size').prop('disabled', byTokens);
     }
+    $('#batching').on('change', updateBatchingFields);
+    updateBatchingFields();
     
     // 并行进程数和批处理大小相关提示
     $('#max_concurrent').on('change', function() {
@@ -0,0 +1,19 @@
+"""测试公共夹具：与基准测试相同的方式加载翻译模块，并复用benchmarks中的模拟接口"""
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(ROOT_DIR, "benchmarks")
+# 仓库根目录用于导入app（Web接口测试）
+for path in (ROOT_DIR, BENCHMARKS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from common import load_translator  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def translator():
+    return load_translator()
@@ -0,0 +1,85 @@
+"""AdaptiveConcurrencyLimiter在注入限流的本地模拟接口上的行为"""
+import asyncio
+import time
+
+import pytest
+
+from stub_server import StubDeepSeekServer
+
+
+def drive(translator, server, limiter, requests, concurrency=1, between=None):
+    """通过translate_with_deepseek_async向模拟接口发送requests个请求（每个请求不重试），
+    between(第几个请求)在每个请求之前调用，可用来调整模拟接口"""
+    async def run():
+        await server.start()
+        session = translator.create_http_session(concurrency)
+        counter = iter(range(requests))
+
+        async def worker():
+            for number in counter:
+                if between:
+                    between(number)
+                async with limiter:
+                    await translator.translate_with_deepseek_async(
+                        ["A short paragraph."], "stub-key", server.url, "stub-model", retries=1, delay=0,
+                        session=session, limiter=limiter)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            await session.close()
+            await server.stop()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("options", [{"throttle_rate": 1.0}, {"error_rate": 1.0, "error_status": 503}])
+def test_limit_halves_once_per_cooldown(translator, options):
+    limiter = translator.AdaptiveConcurrencyLimiter(8, min_limit=1, max_limit=10, decrease_cooldown=60)
+    drive(translator, StubDeepSeekServer(latency=0, **options), limiter, requests=5)
+    # 同一冷却时间内的多次429/5xx只减半一次
+    assert limiter.limit == 4
+    assert [(c['from'], c['to']) for c in limiter.changes] == [(8, 4)]
+
+
+def test_limit_halves_again_after_cooldown(translator):
+    limiter = translator.AdaptiveConcurrencyLimiter(8, min_limit=1, max_limit=10, decrease_cooldown=0.2)
+    drive(translator, StubDeepSeekServer(latency=0, throttle_rate=1.0), limiter, requests=3,
+          between=lambda number: time.sleep(0.25) if number == 2 else None)
+    assert [(c['from'], c['to']) for c in limiter.changes] == [(8, 4), (4, 2)]
+
+
+def test_limit_grows_only_while_latency_within_tolerance(translator):
+    limiter = translator.AdaptiveConcurrencyLimiter(2, min_limit=1, max_limit=10, latency_tolerance=3.0)
+    server = StubDeepSeekServer(latency=0.02)
+    # 前10个请求延迟正常：每连续成功“当前上限”次加1（2+3+4 = 9个请求后上限为5）
+    # 之后延迟变为原来的10倍，上限保持不变
+    drive(translator, server, limiter, requests=16,
+          between=lambda number: setattr(server, 'latency', 0.02 if number < 10 else 0.2))
+    assert limiter.limit == 5
+    assert all(c['to'] == c['from'] + 1 for c in limiter.changes)
+    assert len(limiter.changes) == 3
+
+
+def test_limit_stays_within_bounds(translator):
+    limiter = translator.AdaptiveConcurrencyLimiter(20, min_limit=2, max_limit=4, decrease_cooldown=0)
+    assert limiter.limit == 4
+
+    server = StubDeepSeekServer(latency=0, throttle_rate=1.0)
+    drive(translator, server, limiter, requests=6)
+    assert limiter.limit == 2
+
+    server = StubDeepSeekServer(latency=0.01)
+    drive(translator, server, limiter, requests=40, concurrency=2)
+    assert limiter.limit == 4
+    assert all(2 <= c['to'] <= 4 for c in limiter.changes)
+
+
+def test_limiter_backs_off_under_provider_capacity(translator):
+    """服务商并发容量为3、工作协程为8：遇到限流后上限降低"""
+    limiter = translator.AdaptiveConcurrencyLimiter(8, min_limit=1, max_limit=8, decrease_cooldown=0.05)
+    server = StubDeepSeekServer(latency=0.02, max_concurrency=3)
+    drive(translator, server, limiter, requests=80, concurrency=8)
+    assert server.throttled_count > 0
+    assert any(c['to'] < c['from'] for c in limiter.changes)
+    assert all(1 <= c['to'] <= 8 for c in limiter.changes)
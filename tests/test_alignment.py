@@ -0,0 +1,77 @@
+"""译文对齐校验：小批次中段落被合并时，吞并了缺失段落的相邻段落必须重新请求"""
+import asyncio
+
+from stub_server import MARKER_PATTERN, StubDeepSeekServer
+
+SOURCES = [
+    "The first paragraph describes the method in enough words to be checked.",
+    "The second paragraph explains the results and their limitations in detail.",
+    "The third paragraph closes the chapter with a short summary of findings.",
+]
+
+
+class MergeOnceServer(StubDeepSeekServer):
+    """第一个请求把第merge_at段合并到上一段，之后的请求正常返回"""
+
+    def __init__(self, merge_at, **options):
+        super().__init__(latency=0, **options)
+        self.merge_at = merge_at
+
+    def translate_lines(self, content):
+        lines = super().translate_lines(content)
+        if self.request_count == 1 and len(lines) > self.merge_at:
+            lines[self.merge_at - 1] += " " + MARKER_PATTERN.sub("", lines[self.merge_at])
+            del lines[self.merge_at]
+        return lines
+
+
+def run_verified(translator, server, paragraphs):
+    async def run():
+        await server.start()
+        session = translator.create_http_session(2)
+        stats = {'checked': 0, 'mismatched': 0, 'rerequested': 0}
+        dead_letters = []
+        try:
+            results = await translator.translate_verified(
+                paragraphs, list(range(len(paragraphs))), "stub-key", server.url, "stub-model", 0.3, session,
+                {}, dead_letters, stats)
+        finally:
+            await session.close()
+            await server.stop()
+        return results, dead_letters, stats
+
+    return asyncio.run(run())
+
+
+def test_no_reference_flags_neighbors_of_missing(translator):
+    outliers, reference = translator.length_ratio_outliers(
+        SOURCES[:1], ["【译】" + SOURCES[0] + " " + SOURCES[1]], neighbors={0})
+    assert reference is None
+    assert outliers == [0]
+
+
+def test_merged_line_in_two_paragraph_batch_is_rerequested(translator):
+    server = MergeOnceServer(merge_at=1)
+    results, dead_letters, stats = run_verified(translator, server, SOURCES[:2])
+    assert results == {0: f"【译】{SOURCES[0]}", 1: f"【译】{SOURCES[1]}"}
+    assert not dead_letters
+    assert stats['rerequested'] == 2
+
+
+def test_merged_line_in_three_paragraph_batch_is_rerequested(translator):
+    server = MergeOnceServer(merge_at=2)
+    results, dead_letters, stats = run_verified(translator, server, SOURCES)
+    assert results == {i: f"【译】{source}" for i, source in enumerate(SOURCES)}
+    assert not dead_letters
+    assert stats['rerequested'] == 2
+
+
+def test_swallowing_neighbor_is_dead_lettered_when_retries_run_out(translator):
+    class AlwaysMerge(MergeOnceServer):
+        def translate_lines(self, content):
+            self.request_count = 1
+            return super().translate_lines(content)
+
+    results, dead_letters, _ = run_verified(translator, AlwaysMerge(merge_at=1), SOURCES[:2])
+    assert results == {}
+    assert sorted(entry['offset'] for entry in dead_letters) == [0, 1]
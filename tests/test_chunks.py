@@ -0,0 +1,51 @@
+"""页码范围子任务：切分、输出路径的排序和按页码顺序合并"""
+import docx
+import pytest
+
+
+def write_part(translator, path, paragraphs, comparison_mode):
+    writer = translator.StreamingDocumentWriter(str(path), comparison_mode=comparison_mode)
+    writer.add_batch(paragraphs, "\n".join(f"译{p}" for p in paragraphs))
+    assert writer.close()
+    return str(path)
+
+
+def texts(path):
+    return [p.text for p in docx.Document(path).paragraphs if p.text.strip()]
+
+
+def test_plan_page_chunks_covers_range(translator):
+    assert translator.plan_page_chunks(3, 12, 4) == [(3, 6), (7, 10), (11, 12)]
+    assert translator.plan_page_chunks(1, 1, 4) == [(1, 1)]
+
+
+def test_part_paths_sort_in_page_order(translator, tmp_path):
+    chunks = translator.plan_page_chunks(1, 120, 8)
+    paths = [translator.chunk_part_paths(str(tmp_path / "out.docx"), first, last)[0] for first, last in chunks]
+    assert sorted(paths) == paths
+
+
+def test_merge_keeps_part_order(translator, tmp_path):
+    parts = [write_part(translator, tmp_path / f"part{n}.docx", [f"Part {n} a.", f"Part {n} b."], False)
+             for n in (1, 2, 3)]
+    translator.merge_documents(parts, str(tmp_path / "merged.docx"))
+    assert texts(tmp_path / "merged.docx") == [f"译Part {n} {x}." for n in (1, 2, 3) for x in "ab"]
+
+
+def test_merge_renumbers_comparison_parts(translator, tmp_path):
+    parts = [write_part(translator, tmp_path / f"part{n}.docx", [f"Part {n} a.", f"Part {n} b."], True)
+             for n in (1, 2)]
+    translator.merge_documents(parts, str(tmp_path / "merged.docx"), comparison_mode=True)
+    merged = texts(tmp_path / "merged.docx")
+    # 只保留第一个部分的标题，段落编号全文连续
+    assert merged.count('翻译对照文档') == 1
+    headings = [text for text in merged if text.startswith('段落 ')]
+    assert headings == [f"段落 {n} - {kind}" for n in range(1, 5) for kind in ("原文", "译文")]
+    assert merged[merged.index("段落 3 - 原文") + 1] == "Part 2 a."
+
+
+@pytest.mark.parametrize("comparison_mode", [False, True])
+def test_single_part_is_copied(translator, tmp_path, comparison_mode):
+    part = write_part(translator, tmp_path / "part.docx", ["Only part."], comparison_mode)
+    translator.merge_documents([part], str(tmp_path / "merged.docx"), comparison_mode)
+    assert texts(tmp_path / "merged.docx") == texts(part)
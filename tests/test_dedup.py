@@ -0,0 +1,70 @@
+"""作业内去重：重复段落只翻译一次，按文档顺序回填首次出现时的译文"""
+import asyncio
+
+import docx
+import pytest
+
+from pdf_fixtures import make_pdf
+from stub_server import StubDeepSeekServer
+
+CHAPTER = ["Repeated legal notice for every chapter.", "Chapter text number {n} with its own words."]
+
+
+def test_duplicates_reuse_first_translation_in_document_order(translator):
+    dedup = translator.SegmentDeduplicator()
+    paragraphs = ["Alpha one.", "Beta two.", "Alpha  one.", "Gamma three.", "Beta two."]
+    new = [dedup.add(position, paragraph) for position, paragraph in enumerate(paragraphs)]
+    assert new == [True, True, False, True, False]
+    assert dedup.duplicates == 2 and dedup.saved_tokens > 0
+
+    # 第一批（前两个新段落）返回前，第三个位置及之后都不能写入
+    assert dedup.take_positions(2) == [0, 1]
+    assert dedup.drain() == []
+    dedup.resolve(["甲", None])
+    assert dedup.drain() == [(0, "Alpha one.", "甲", False), (1, "Beta two.", None, False),
+                             (2, "Alpha  one.", "甲", True)]
+    assert dedup.take_positions(1) == [3]
+    dedup.resolve(["丙"])
+    # 首次出现时翻译失败的重复段落同样没有译文
+    assert dedup.drain() == [(3, "Gamma three.", "丙", False), (4, "Beta two.", None, True)]
+
+
+def test_disabled_translates_every_segment(translator):
+    dedup = translator.SegmentDeduplicator(enabled=False)
+    assert [dedup.add(i, "Same text.") for i in range(3)] == [True, True, True]
+    assert dedup.duplicates == 0
+
+
+def test_forgotten_segments_are_translated_again(translator):
+    dedup = translator.SegmentDeduplicator(max_entries=2)
+    assert [dedup.add(i, p) for i, p in enumerate(["A.", "B.", "C.", "A.", "C."])] == [
+        True, True, True, True, False]
+
+
+@pytest.mark.parametrize("dedup", [True, False])
+def test_pipeline_output_is_identical_with_fewer_requests(translator, tmp_path, monkeypatch, dedup):
+    chunks = [[line.format(n=n) for line in CHAPTER] for n in range(6)]
+    monkeypatch.setattr(translator, "iter_paragraph_chunks", lambda *args, **kwargs: (chunk for chunk in chunks))
+    pdf_path = str(tmp_path / "book.pdf")
+    make_pdf(pdf_path, 1)
+    output_path = str(tmp_path / "translated.docx")
+
+    async def run():
+        server = await StubDeepSeekServer(latency=0).start()
+        try:
+            ok = await translator.main_async(
+                pdf_path, "stub-key", output_path, progress_file=str(tmp_path / "progress.json"),
+                api_url=server.url, api_model="stub-model", use_cache=False, batching="count", batch_size=1,
+                stream_responses=False, dedup=dedup)
+            return ok, server.request_count
+        finally:
+            await server.stop()
+
+    ok, requests = asyncio.run(run())
+    assert ok
+    written = [p.text for p in docx.Document(output_path).paragraphs if p.text.strip()]
+    assert written == [f"【译】{line}" for chunk in chunks for line in chunk]
+    assert requests == (7 if dedup else 12)
+    summary = translator.read_progress_summary(str(tmp_path / "progress.json"))
+    assert summary['completed'] == summary['total'] == 12
+    assert summary.get('dedup_segments', 0) == (5 if dedup else 0)
@@ -0,0 +1,58 @@
+"""文档缓存：按文件内容缓存页面文本和分段结果，提取中断时不留下不完整的缓存"""
+import shutil
+
+import pytest
+
+from pdf_fixtures import make_pdf
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = str(tmp_path / "book.pdf")
+    make_pdf(path, 6)
+    return path
+
+
+def paragraphs(cache, pdf_path, sentences=4):
+    return [p for chunk in cache.iter_paragraph_chunks(pdf_path, sentences, workers=1) for p in chunk]
+
+
+def test_second_read_uses_cache(translator, pdf_path, tmp_path, monkeypatch):
+    cache = translator.DocumentCache(str(tmp_path / "documents"))
+    expected = [p for chunk in translator.iter_paragraph_chunks(translator.iter_pdf_pages(pdf_path, 1))
+                for p in chunk]
+    assert paragraphs(cache, pdf_path) == expected
+    assert cache.paragraph_count(pdf_path) == len(expected)
+    assert cache.read_pages(pdf_path)[0] == 6
+
+    def no_extraction(*args, **kwargs):
+        raise AssertionError("已缓存的文档不应重新提取")
+
+    monkeypatch.setattr(translator, "iter_pdf_pages", no_extraction)
+    assert paragraphs(cache, pdf_path) == expected
+    # 其他分段参数从缓存的页面文本重新分段，同样不提取PDF
+    assert len(paragraphs(cache, pdf_path, sentences=2)) > len(expected)
+
+
+def test_cache_is_keyed_by_content(translator, pdf_path, tmp_path):
+    cache = translator.DocumentCache(str(tmp_path / "documents"))
+    paragraphs(cache, pdf_path)
+    copy_path = str(tmp_path / "renamed.pdf")
+    shutil.copyfile(pdf_path, copy_path)
+    assert cache.paragraph_count(copy_path) == cache.paragraph_count(pdf_path)
+
+    other_path = str(tmp_path / "other.pdf")
+    make_pdf(other_path, 6, seed=2)
+    assert cache.paragraph_count(other_path) is None
+
+
+def test_interrupted_extraction_leaves_no_cache(translator, pdf_path, tmp_path):
+    cache = translator.DocumentCache(str(tmp_path / "documents"))
+    chunks = cache.iter_paragraph_chunks(pdf_path, workers=1)
+    next(chunks)
+    chunks.close()
+    assert cache.paragraph_count(pdf_path) is None
+    assert cache.read_pages(pdf_path) is None
+    assert not [name for name in (tmp_path / "documents").iterdir() if name.suffix == ".tmp"]
+    assert paragraphs(cache, pdf_path)
+    assert cache.paragraph_count(pdf_path)
@@ -0,0 +1,104 @@
+"""分片任务存储：租约过期后由其他工作进程接手，任务参数只接受允许的字段"""
+import asyncio
+import time
+
+import pytest
+
+from pdf_fixtures import make_pdf
+
+
+@pytest.fixture
+def store(translator, tmp_path):
+    store = translator.SQLiteJobStore(str(tmp_path / "jobs.db"), max_attempts=2)
+    yield store
+    store.close()
+
+
+def submit(store, options=None, shards=((1, 2), (3, 4))):
+    return store.submit("book.pdf", b"%PDF-1.4 fake", list(shards), options or {}, job_id="job")
+
+
+def test_expired_lease_is_taken_over(store):
+    submit(store, shards=[(1, 2)])
+    first = store.claim("w1", lease=0.2)
+    assert first['shard'] == 1
+    # 租约有效期内其他工作进程领取不到
+    assert store.claim("w2", lease=5) is None
+
+    time.sleep(0.3)
+    second = store.claim("w2", lease=5)
+    assert (second['shard'], second['attempts']) == (1, 2)
+    # 原工作进程既不能续约，也不能提交结果
+    assert not store.heartbeat("job", 1, "w1")
+    assert not store.complete("job", 1, "w1", b"stale")
+    assert store.complete("job", 1, "w2", b"fresh", paragraphs=3)
+    assert store.shard_outputs("job") == [b"fresh"]
+    assert store.job("job")['counts'] == {'done': 1}
+
+
+def test_heartbeat_keeps_lease(store):
+    submit(store, shards=[(1, 2)])
+    store.claim("w1", lease=0.2)
+    for _ in range(3):
+        time.sleep(0.1)
+        assert store.heartbeat("job", 1, "w1", lease=0.2)
+    assert store.claim("w2") is None
+
+
+def test_shard_fails_after_max_attempts(store):
+    submit(store, shards=[(1, 2)])
+    for worker in ("w1", "w2"):
+        assert store.claim(worker, lease=0.05)
+        time.sleep(0.1)
+    assert store.claim("w3") is None
+    job = store.job("job")
+    assert job['status'] == 'failed'
+    assert job['errors'] == {1: '租约多次过期'}
+
+
+def test_submit_rejects_worker_side_options(translator, store, tmp_path):
+    pdf_path = str(tmp_path / "book.pdf")
+    make_pdf(pdf_path, 2)
+    with pytest.raises(ValueError, match="api_url"):
+        translator.submit_sharded_job(store, pdf_path, chunk_pages=1, api_url="http://attacker.example/")
+
+
+def test_shard_ignores_api_url_from_store(translator, store, tmp_path, monkeypatch):
+    submit(store, {'batch_size': 5, 'api_url': "http://attacker.example/", 'cache_path': "/tmp/x.db"},
+           shards=[(1, 2)])
+    calls = []
+
+    async def fake_main_async(*args, **kwargs):
+        calls.append(kwargs)
+        return True
+
+    monkeypatch.setattr(translator, "main_async", fake_main_async)
+    claim = store.claim("w1")
+    ok, _, _ = asyncio.run(translator.translate_shard(
+        store, claim, "key", "w1", str(tmp_path / "worker"), lease=5, api_url="http://worker.example/"))
+    assert ok is True
+    assert calls[0]['api_url'] == "http://worker.example/"
+    assert calls[0]['batch_size'] == 5
+    assert 'cache_path' not in calls[0]
+
+
+def test_shard_is_cancelled_when_lease_is_lost(translator, store, tmp_path, monkeypatch):
+    submit(store, shards=[(1, 2)])
+    cancelled = []
+
+    async def slow_main_async(*args, **kwargs):
+        # 模拟租约过期后被w2接手
+        store.conn.execute("UPDATE shards SET worker = 'w2'")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return True
+
+    monkeypatch.setattr(translator, "main_async", slow_main_async)
+    claim = store.claim("w1")
+    ok, _, _ = asyncio.run(translator.translate_shard(
+        store, claim, "key", "w1", str(tmp_path / "worker"), lease=0.3))
+    assert ok is None
+    assert cancelled == [True]
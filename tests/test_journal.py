@@ -0,0 +1,80 @@
+"""批次日志：恢复时重放已完成的批次，截断写了一半的记录，设置变化后不再重放"""
+import asyncio
+import os
+
+from pdf_fixtures import make_pdf
+from stub_server import StubDeepSeekServer
+
+BATCHES = [["First paragraph.", "Second paragraph."], ["Third paragraph."], ["Fourth paragraph."]]
+
+
+def write_journal(translator, path, fingerprint="fp"):
+    journal = translator.BatchJournal(path, fingerprint)
+    for index, batch in enumerate(BATCHES):
+        journal.append(index, batch, "\n".join(f"译{p}" for p in batch))
+    journal.close()
+
+
+def test_replay_restores_batches(translator, tmp_path):
+    path = str(tmp_path / "job.journal")
+    write_journal(translator, path)
+    journal = translator.BatchJournal(path, "fp")
+    assert journal.lookup(1, BATCHES[1]) == "译Third paragraph."
+    # 原文变化的批次不重放
+    assert journal.lookup(1, ["Changed paragraph."]) is None
+    journal.close()
+
+
+def test_partly_written_last_record_is_truncated(translator, tmp_path):
+    path = str(tmp_path / "job.journal")
+    write_journal(translator, path)
+    intact = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'{"batch": 3, "hash": "abc", "te')
+
+    journal = translator.BatchJournal(path, "fp")
+    assert os.path.getsize(path) == intact
+    assert sorted(journal.index) == [0, 1, 2]
+    # 截断后追加的记录可以正常重放
+    journal.append(3, ["Fifth paragraph."], "译Fifth paragraph.")
+    journal.close()
+    journal = translator.BatchJournal(path, "fp")
+    assert journal.lookup(3, ["Fifth paragraph."]) == "译Fifth paragraph."
+    assert journal.lookup(0, BATCHES[0]) == "译First paragraph.\n译Second paragraph."
+    journal.close()
+
+
+def test_different_settings_are_not_replayed(translator, tmp_path):
+    path = str(tmp_path / "job.journal")
+    for model, temperature in (("model-b", 0.3), ("model-a", 0.7)):
+        write_journal(translator, path, translator.translation_fingerprint("model-a", 0.3))
+        journal = translator.BatchJournal(path, translator.translation_fingerprint(model, temperature))
+        assert not journal.index
+        assert journal.lookup(0, BATCHES[0]) is None
+        journal.close()
+
+
+def test_prompt_is_part_of_fingerprint(translator, monkeypatch):
+    before = translator.translation_fingerprint("model", 0.3)
+    monkeypatch.setattr(translator, "TRANSLATION_SYSTEM_PROMPT", translator.TRANSLATION_SYSTEM_PROMPT + "术语表")
+    assert translator.translation_fingerprint("model", 0.3) != before
+
+
+def test_journal_is_removed_after_output_is_written(translator, tmp_path):
+    pdf_path = str(tmp_path / "book.pdf")
+    make_pdf(pdf_path, 3)
+    progress_file = str(tmp_path / "progress.json")
+
+    async def run():
+        server = await StubDeepSeekServer(latency=0).start()
+        try:
+            return await translator.main_async(
+                pdf_path, "stub-key", str(tmp_path / "translated.docx"), progress_file=progress_file,
+                api_url=server.url, api_model="stub-model", use_cache=False, batching="count", batch_size=3,
+                stream_responses=False)
+        finally:
+            await server.stop()
+
+    assert asyncio.run(run()) is True
+    assert os.path.exists(tmp_path / "translated.docx")
+    assert not os.path.exists(tmp_path / "progress.journal")
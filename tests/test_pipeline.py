@@ -0,0 +1,91 @@
+"""翻译流水线的端到端检查（使用本地模拟接口）"""
+import asyncio
+import json
+import os
+
+import pytest
+
+from pdf_fixtures import make_pdf
+from stub_server import StubDeepSeekServer
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = str(tmp_path / "book.pdf")
+    make_pdf(path, 6)
+    return path
+
+
+def run_job(translator, pdf_path, tmp_path):
+    async def run():
+        server = await StubDeepSeekServer(latency=0).start()
+        try:
+            return await translator.main_async(
+                pdf_path, "stub-key", str(tmp_path / "translated.docx"),
+                progress_file=str(tmp_path / "progress.json"), api_url=server.url, api_model="stub-model",
+                use_cache=False, batching="count", batch_size=3, stream_responses=False)
+        finally:
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+def test_completed_job_saves_document(translator, pdf_path, tmp_path):
+    assert run_job(translator, pdf_path, tmp_path) is True
+    assert os.path.exists(tmp_path / "translated.docx")
+    assert not translator.read_progress_summary(str(tmp_path / "progress.json")).get('extraction_error')
+
+
+def test_extraction_failure_midway_fails_the_job(translator, pdf_path, tmp_path, monkeypatch):
+    segment = translator.iter_paragraph_chunks
+
+    def failing_chunks(pages, *args, **kwargs):
+        for number, chunk in enumerate(segment(pages, *args, **kwargs)):
+            if number == 2:
+                raise OSError("damaged page stream")
+            yield chunk
+
+    monkeypatch.setattr(translator, "iter_paragraph_chunks", failing_chunks)
+    assert run_job(translator, pdf_path, tmp_path) is False
+    assert not os.path.exists(tmp_path / "translated.docx")
+    summary = translator.read_progress_summary(str(tmp_path / "progress.json"))
+    assert "damaged page stream" in summary['extraction_error']
+    assert translator.failure_reason(False, summary).startswith("PDF提取失败")
+
+    # 再次运行时提取正常，任务完成并清除上次的错误
+    monkeypatch.setattr(translator, "iter_paragraph_chunks", segment)
+    assert run_job(translator, pdf_path, tmp_path) is True
+    assert not translator.read_progress_summary(str(tmp_path / "progress.json")).get('extraction_error')
+
+
+def test_unexpected_batch_error_goes_to_dead_letters(translator, pdf_path, tmp_path, monkeypatch):
+    verify = translator.translate_verified
+    calls = []
+
+    async def failing_first_batch(*args, **kwargs):
+        calls.append(args[0])
+        if len(calls) == 1:
+            raise KeyError("unexpected")
+        return await verify(*args, **kwargs)
+
+    monkeypatch.setattr(translator, "translate_verified", failing_first_batch)
+    run_job(translator, pdf_path, tmp_path)
+    summary = translator.read_progress_summary(str(tmp_path / "progress.json"))
+    with open(translator.dead_letter_file_for(str(tmp_path / "progress.json")), encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    # 失败批次的每个段落都记入失败队列，其余段落照常完成
+    assert [entry['paragraph'] for entry in entries] == calls[0]
+    assert all("KeyError" in entry['error'] for entry in entries)
+    assert summary['dead_letters'] == len(calls[0])
+    assert summary['completed'] == summary['total'] - len(calls[0])
+
+
+def test_unexpected_batch_error_raises_without_dead_letter_list(translator, monkeypatch):
+    async def failing(*args, **kwargs):
+        raise KeyError("unexpected")
+
+    monkeypatch.setattr(translator, "translate_verified", failing)
+    with pytest.raises(KeyError):
+        asyncio.run(translator.translate_batch_async(
+            ["First paragraph.", "Second paragraph."], "stub-key", "http://127.0.0.1:9", "stub-model",
+            asyncio.Semaphore(1), {'batch_index': 0, 'start_index': 0}))
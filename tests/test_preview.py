@@ -0,0 +1,51 @@
+"""预览与翻译流水线使用相同的提取方式和文档缓存"""
+import pytest
+
+from pdf_fixtures import make_pdf
+
+HEADER = "Running Header Title"
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = str(tmp_path / "book.pdf")
+    make_pdf(path, 20, header=HEADER)
+    return path
+
+
+def engine_pages(translator, pdf_path, mode):
+    return list(translator.iter_pdf_pages(pdf_path, workers=1, page_filter=translator.create_page_filter(mode)))
+
+
+def test_text_mode_is_default(translator):
+    assert translator.DEFAULT_CONFIG['extraction_mode'] == "text"
+    assert translator.create_page_filter() is None
+
+
+@pytest.mark.parametrize("offset", [0, 7, 15])
+def test_layout_preview_matches_engine_without_cache(translator, pdf_path, offset):
+    expected = engine_pages(translator, pdf_path, "layout")
+    previewer = translator.PdfPreviewer(extraction_mode="layout")
+    pages = previewer.pages(pdf_path, offset, 5)
+    assert pages == expected[offset:offset + 5]
+    assert not any(HEADER in page for page in pages)
+
+
+def test_text_preview_keeps_headers(translator, pdf_path):
+    pages = translator.PdfPreviewer(extraction_mode="text").pages(pdf_path, 0, 3)
+    assert all(HEADER in page for page in pages)
+
+
+def test_layout_preview_reads_engine_cache(translator, pdf_path, tmp_path, monkeypatch):
+    cache = translator.DocumentCache(str(tmp_path / "documents"))
+    page_filter = translator.create_page_filter("layout")
+    expected = list(cache.iter_pages(pdf_path, workers=1, page_filter=page_filter))
+
+    # 已缓存时不再打开PDF提取页面
+    def no_extraction(*args, **kwargs):
+        raise AssertionError("预览不应重新提取已缓存的页面")
+
+    monkeypatch.setattr(translator.pdf_workers, "extract_page_layout", no_extraction)
+    previewer = translator.PdfPreviewer(cache, extraction_mode="layout")
+    assert previewer.pages(pdf_path, 4, 6) == expected[4:10]
+    assert cache.read_pages(pdf_path, page_filter=page_filter)[0] == 20
@@ -0,0 +1,65 @@
+"""句子分割：缩写、小数和姓名缩写不断句，分多次输入与一次输入的结果相同"""
+import random
+
+import pytest
+
+TEXT = ("Dr. Smith measured 3.5 kg in Fig. 2 of the report. It was heavy! Was it?\n"
+        "See e.g. the appendix for details. J. R. Tolkien wrote books. The end came.\n\n"
+        "New paragraph starts here. Another sentence.")
+
+
+def segment(translator, chunks, sentences=2):
+    segmenter = translator.SentenceSegmenter(sentences)
+    paragraphs = []
+    for chunk in chunks:
+        paragraphs.extend(segmenter.feed(chunk))
+    return paragraphs + segmenter.finish()
+
+
+def test_abbreviations_decimals_and_initials_do_not_end_sentences(translator):
+    assert segment(translator, [TEXT]) == [
+        "Dr. Smith measured 3.5 kg in Fig. 2 of the report. It was heavy!",
+        "Was it? See e.g. the appendix for details.",
+        "J. R. Tolkien wrote books. The end came.",
+        "New paragraph starts here. Another sentence.",
+    ]
+
+
+def test_lowercase_continuation_does_not_end_sentence(translator):
+    assert segment(translator, ["The value is approx. ten units. next comes more. Last one."], 1) == [
+        "The value is approx. ten units. next comes more.",
+        "Last one.",
+    ]
+
+
+def test_blank_line_ends_paragraph(translator):
+    assert segment(translator, ["One sentence.\n\nTwo sentence. Three sentence."], 4) == [
+        "One sentence.", "Two sentence. Three sentence."]
+
+
+def test_short_last_line_ends_paragraph(translator):
+    text = ("This line of the paragraph is long enough to set the width of the column.\n"
+            "It ends here.\n"
+            "A new paragraph starts on this line and keeps going for a while longer.\n")
+    assert segment(translator, [text], 10) == [
+        "This line of the paragraph is long enough to set the width of the column. It ends here.",
+        "A new paragraph starts on this line and keeps going for a while longer.",
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_chunked_input_matches_whole_input(translator, seed):
+    rng = random.Random(seed)
+    text = TEXT * 5
+    chunks, position = [], 0
+    while position < len(text):
+        size = rng.randint(1, 40)
+        chunks.append(text[position:position + size])
+        position += size
+    assert segment(translator, chunks) == segment(translator, [text])
+
+
+def test_spans_point_into_the_input(translator):
+    segmenter = translator.SentenceSegmenter(2)
+    spans = segmenter.feed_spans(TEXT) + segmenter.finish_spans()
+    assert [" ".join(TEXT[start:end].split()) for start, end in spans] == segment(translator, [TEXT])
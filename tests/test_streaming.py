@@ -0,0 +1,137 @@
+"""流式接收译文：逐段回调、断流时只保留完整的行、只重新请求缺失的段落"""
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from stub_server import StubDeepSeekServer, parse_marked_paragraphs
+
+PARAGRAPHS = [f"Paragraph number {i} talks about the subject of chapter {i} in a few words." for i in range(1, 7)]
+EXPECTED = [f"段落{i}: 【译】{p}" for i, p in enumerate(PARAGRAPHS, start=1)]
+
+
+def with_server(server, coroutine):
+    async def run():
+        await server.start()
+        try:
+            return await coroutine(server)
+        finally:
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+async def read_stream(translator, server, paragraphs):
+    content = "\n\n".join(f"段落{i}: {p}" for i, p in enumerate(paragraphs, start=1))
+    async with aiohttp.ClientSession() as session:
+        async with session.post(server.url, json={"messages": [{"role": "user", "content": content}],
+                                                  "stream": True}) as response:
+            return await translator.read_streamed_completion(response)
+
+
+class CutFirstStream(StubDeepSeekServer):
+    """第一个流式请求发送cut_after行完整译文和下一行的一部分后结束（没有[DONE]），之后的请求正常返回"""
+
+    def __init__(self, cut_after, **options):
+        super().__init__(latency=0, **options)
+        self.cut_after = cut_after
+        self.requested = []
+
+    def translate_lines(self, content):
+        self.requested.append([text for _, text in parse_marked_paragraphs(content)])
+        return super().translate_lines(content)
+
+    async def stream_lines(self, request, lines, truncated):
+        if len(self.requested) > 1:
+            return await super().stream_lines(request, lines, truncated)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        text = "\n".join(lines[:self.cut_after]) + "\n" + lines[self.cut_after][:12]
+        await self.send_event(response, {"choices": [{"delta": {"content": text}}]})
+        return response
+
+
+def test_on_paragraph_fires_once_per_line_in_order(translator):
+    received = []
+
+    async def run(server):
+        return await translator.translate_with_deepseek_async(
+            PARAGRAPHS, "stub-key", server.url, "stub-model", raw_output=True, stream=True,
+            on_paragraph=lambda index, text: received.append((index, text)))
+
+    text = with_server(StubDeepSeekServer(latency=0, chunk_chars=7), run)
+    assert text.splitlines() == EXPECTED
+    assert received == [(i, f"【译】{p}") for i, p in enumerate(PARAGRAPHS)]
+
+
+def test_cut_stream_keeps_only_complete_lines(translator):
+    for seed in range(8):
+        server = StubDeepSeekServer(latency=0, stream_cut_rate=1.0, seed=seed)
+        text, finished = with_server(server, lambda server: read_stream(translator, server, PARAGRAPHS))
+        lines = text.splitlines()
+        assert not finished
+        assert lines == EXPECTED[:len(lines)]
+
+
+def test_length_limited_stream_keeps_only_complete_lines(translator):
+    server = StubDeepSeekServer(latency=0, max_output_tokens=70)
+    text, finished = with_server(server, lambda server: read_stream(translator, server, PARAGRAPHS))
+    lines = text.splitlines()
+    assert not finished
+    assert 0 < len(lines) < len(PARAGRAPHS)
+    assert lines == EXPECTED[:len(lines)]
+
+
+def test_cut_stream_rerequests_only_missing_tail(translator):
+    tracker = translator.ProgressTracker()
+
+    async def run(server):
+        session = translator.create_http_session(1)
+        dead_letters = []
+        try:
+            text = await translator.translate_batch_async(
+                PARAGRAPHS, "stub-key", server.url, "stub-model", asyncio.Semaphore(1),
+                {'batch_index': 0, 'start_index': 0}, tracker, session, dead_letters=dead_letters, stream=True)
+        finally:
+            await session.close()
+        return text, dead_letters
+
+    server = CutFirstStream(cut_after=3)
+    text, dead_letters = with_server(server, run)
+    assert text.splitlines() == [f"【译】{p}" for p in PARAGRAPHS]
+    assert not dead_letters
+    assert server.requested == [PARAGRAPHS, PARAGRAPHS[3:]]
+    assert tracker.summary['alignment_rerequested'] == 3
+
+
+def test_cut_stream_is_not_a_limiter_success(translator):
+    limiter = translator.AdaptiveConcurrencyLimiter(8, min_limit=1, max_limit=10, decrease_cooldown=60)
+
+    async def run(server):
+        return await translator.translate_with_deepseek_async(
+            PARAGRAPHS, "stub-key", server.url, "stub-model", retries=1, limiter=limiter,
+            raw_output=True, stream=True)
+
+    text = with_server(CutFirstStream(cut_after=3), run)
+    assert text.splitlines() == EXPECTED[:3]
+    assert limiter.limit == 4
+
+
+def test_cut_stream_without_raw_output_is_retried(translator):
+    async def run(server):
+        return await translator.translate_with_deepseek_async(
+            PARAGRAPHS, "stub-key", server.url, "stub-model", retries=2, delay=0, stream=True)
+
+    server = CutFirstStream(cut_after=3)
+    text = with_server(server, run)
+    assert [line for line in text.splitlines() if line] == [f"【译】{p}" for p in PARAGRAPHS]
+    assert server.requested == [PARAGRAPHS, PARAGRAPHS]
+
+    async def run_once(server):
+        return await translator.translate_with_deepseek_async(
+            PARAGRAPHS, "stub-key", server.url, "stub-model", retries=1, stream=True, raise_on_failure=True)
+
+    # 只有一次机会时，截断的译文不能作为完整结果返回
+    with pytest.raises(translator.TranslationAPIError, match="截断"):
+        with_server(CutFirstStream(cut_after=3), run_once)
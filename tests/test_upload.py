@@ -0,0 +1,65 @@
+"""分块上传：服务端生成上传ID，只有发起上传的会话才能续传和完成"""
+import pytest
+
+PDF = b"%PDF-1.4\n" + b"x" * 1000
+
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    import app
+    monkeypatch.setattr(app, "upload_store", app.UploadStore(str(tmp_path)))
+    app.app.config['TESTING'] = True
+    return app
+
+
+def init(client, **data):
+    return client.post('/upload/init', json={'name': 'book.pdf', 'size': len(PDF), **data}).get_json()
+
+
+def put(client, upload_id, offset, body):
+    return client.put(f'/upload/{upload_id}?offset={offset}', data=body)
+
+
+def test_upload_id_is_random_per_init(web):
+    client = web.app.test_client()
+    first, second = init(client), init(client)
+    assert first['upload_id'] != second['upload_id']
+    assert web.UploadStore.valid_id(first['upload_id'])
+
+
+def test_resume_same_session(web):
+    client = web.app.test_client()
+    upload_id = init(client)['upload_id']
+    assert put(client, upload_id, 0, PDF[:400]).get_json()['offset'] == 400
+
+    resumed = init(client, upload_id=upload_id)
+    assert (resumed['upload_id'], resumed['offset']) == (upload_id, 400)
+    done = put(client, upload_id, 400, PDF[400:]).get_json()
+    assert done['filename'] == 'book.pdf' and not done['existing']
+
+
+def test_other_session_cannot_use_upload(web):
+    owner, other = web.app.test_client(), web.app.test_client()
+    upload_id = init(owner)['upload_id']
+    put(owner, upload_id, 0, PDF[:400])
+
+    # 另一会话既不能写入，也不能通过init接手该上传
+    assert put(other, upload_id, 400, PDF[400:]).status_code == 404
+    assert init(other, upload_id=upload_id)['upload_id'] != upload_id
+
+
+def test_size_is_fixed_at_init(web):
+    client = web.app.test_client()
+    upload_id = init(client)['upload_id']
+    # 续传时大小不一致视为另一个文件
+    assert init(client, upload_id=upload_id, size=len(PDF) + 1)['upload_id'] != upload_id
+    response = put(client, upload_id, 0, PDF + b"extra")
+    assert response.status_code == 400
+    assert put(client, upload_id, 0, PDF).status_code == 404
+
+
+def test_completed_content_is_deduplicated(web):
+    first, second = web.app.test_client(), web.app.test_client()
+    put(first, init(first)['upload_id'], 0, PDF)
+    result = put(second, init(second, name='copy.pdf')['upload_id'], 0, PDF).get_json()
+    assert (result['filename'], result['existing']) == ('book.pdf', True)